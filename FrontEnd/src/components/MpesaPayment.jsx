@@ -2,7 +2,7 @@ import React, { useState } from 'react';
 import { Smartphone, CheckCircle, XCircle, Loader } from 'lucide-react';
 import { ordersAPI } from '../services/api';
 
-const MpesaPayment = ({ amount, onSuccess, onCancel, userPhone = '', cartItems = [] }) => {
+const MpesaPayment = ({ amount, onSuccess, onCancel, userPhone = '', cartItems = [], couponCode = null }) => {
   const [phoneNumber, setPhoneNumber] = useState(userPhone);
   const [isProcessing, setIsProcessing] = useState(false);
   const [paymentStatus, setPaymentStatus] = useState(null); // 'success', 'failed', null
@@ -41,7 +41,7 @@ const MpesaPayment = ({ amount, onSuccess, onCancel, userPhone = '', cartItems =
 
     try {
       // Call the real backend checkout endpoint with cart items
-      const response = await ordersAPI.checkout(phoneNumber, cartItems);
+      const response = await ordersAPI.checkout(phoneNumber, cartItems, couponCode);
       console.log('Checkout response:', response.data);
       
       setMpesaResponse(response.data);
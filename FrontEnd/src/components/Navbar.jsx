@@ -1,8 +1,8 @@
-import React, { useState } from 'react';
+import React, { useState, useRef } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { useSelector } from 'react-redux';
 import { Search, ShoppingBag, User, Heart, Menu, X } from 'lucide-react';
-import { products } from '../services/fakeData';
+import { productsAPI } from '../services/api';
 
 const Navbar = () => {
   const [isOpen, setIsOpen] = useState(false);
@@ -14,16 +14,21 @@ const Navbar = () => {
   const { isAuthenticated, user } = useSelector((state) => state.auth);
   const navigate = useNavigate();
 
-  const handleSearchChange = (e) => {
+  const latestQuery = useRef('');
+
+  const handleSearchChange = async (e) => {
     const value = e.target.value;
     setSearchTerm(value);
+    latestQuery.current = value;
     
     if (value.trim()) {
-      const filtered = products.filter(product => 
-        product.name.toLowerCase().includes(value.toLowerCase()) ||
-        product.category.toLowerCase().includes(value.toLowerCase())
-      ).slice(0, 5);
-      setSuggestions(filtered);
+      try {
+        const response = await productsAPI.suggest(value, 5);
+        // Ignore answers to keystrokes that have since been superseded
+        if (latestQuery.current === value) setSuggestions(response.data);
+      } catch (error) {
+        setSuggestions([]);
+      }
     } else {
       setSuggestions([]);
     }
@@ -134,7 +139,7 @@ const Navbar = () => {
                     <img src={product.image} alt={product.name} className="w-10 h-10 object-cover rounded-lg" />
                     <div>
                       <p className="font-medium text-gray-900 text-sm">{product.name}</p>
-                      <p className="text-xs text-gray-500">{product.category} • Kshs. {product.price.toLocaleString()}</p>
+                      <p className="text-xs text-gray-500">{product.category || 'Beauty'} • Kshs. {product.price.toLocaleString()}</p>
                     </div>
                   </button>
                 ))}
@@ -3,7 +3,7 @@ import {
   TrendingUp, TrendingDown, DollarSign, Package, Users, 
   ShoppingCart, Eye, Calendar, BarChart3, PieChart, Download, FileText, Loader2
 } from 'lucide-react';
-import { productsAPI, ordersAPI, usersAPI } from '../../services/api';
+import { productsAPI, usersAPI, analyticsAPI } from '../../services/api';
 
 const AnalyticsReports = () => {
   const [timeRange, setTimeRange] = useState('30d');
@@ -15,29 +15,68 @@ const AnalyticsReports = () => {
     revenue: 0,
     orders: 0,
     users: 0,
-    products: 0
+    products: 0,
+    revenueChange: null,
+    ordersChange: null,
+    categories: []
   });
 
   useEffect(() => {
     fetchAnalyticsData();
-  }, []);
+  }, [timeRange]);
+
+  const RANGE_DAYS = { '7d': 7, '30d': 30, '90d': 90, '1y': 365 };
+  const CATEGORY_NAMES = { 1: 'Skincare', 2: 'Haircare', 3: 'Makeup' };
+
+  const sumSeries = (series) => series.reduce(
+    (totals, point) => ({ revenue: totals.revenue + point.revenue, orders: totals.orders + point.orders }),
+    { revenue: 0, orders: 0 }
+  );
+
+  const percentChange = (current, previous) =>
+    previous ? ((current - previous) / previous) * 100 : null;
 
   const fetchAnalyticsData = async () => {
+    // Current range and the one before it, both answered from the daily rollups
+    const days = RANGE_DAYS[timeRange];
+    const end = new Date();
+    const start = new Date(end.getTime() - days * 86400000);
+    const previousStart = new Date(start.getTime() - days * 86400000);
     try {
-      const [productsRes, ordersRes, usersRes] = await Promise.all([
+      const [productsRes, usersRes, currentRes, previousRes, categoriesRes] = await Promise.all([
         productsAPI.getAll(),
-        ordersAPI.getAllOrders(),
-        usersAPI.getAll()
+        usersAPI.count(),
+        analyticsAPI.sales({ start: start.toISOString(), end: end.toISOString() }),
+        analyticsAPI.sales({ start: previousStart.toISOString(), end: start.toISOString() }),
+        analyticsAPI.sales({ start: start.toISOString(), end: end.toISOString(), group_by: 'category' })
       ]);
 
-      const orders = ordersRes.data;
-      const totalRevenue = orders.reduce((sum, order) => sum + (order.total_amount || 0), 0);
+      const current = sumSeries(currentRes.data.series);
+      const previous = sumSeries(previousRes.data.series);
+      const byCategory = {};
+      categoriesRes.data.series.forEach((point) => {
+        const entry = byCategory[point.category_id] || { revenue: 0, orders: 0 };
+        entry.revenue += point.revenue;
+        entry.orders += point.orders;
+        byCategory[point.category_id] = entry;
+      });
+      const categoryRevenue = Object.values(byCategory).reduce((sum, c) => sum + c.revenue, 0);
 
       setAnalyticsData({
-        revenue: totalRevenue,
-        orders: orders.length,
-        users: usersRes.data.length,
-        products: productsRes.data.length
+        revenue: current.revenue,
+        orders: current.orders,
+        users: usersRes.data.count,
+        products: productsRes.data.length,
+        revenueChange: percentChange(current.revenue, previous.revenue),
+        ordersChange: percentChange(current.orders, previous.orders),
+        categories: Object.entries(byCategory)
+          .map(([id, c]) => ({
+            category: CATEGORY_NAMES[id] || `Category ${id}`,
+            sales: c.orders,
+            revenue: Math.round(c.revenue),
+            percentage: categoryRevenue ? Math.round((c.revenue / categoryRevenue) * 100) : 0
+          }))
+          .sort((a, b) => b.revenue - a.revenue)
       });
     } catch (error) {
       console.error('Failed to fetch analytics data:', error);
@@ -46,20 +85,19 @@ const AnalyticsReports = () => {
     }
   };
 
+  const formatChange = (change) =>
+    change === null ? null : `${change >= 0 ? '+' : ''}${change.toFixed(1)}%`;
+
   const overviewStats = [
-    { name: 'Total Revenue', value: `Kshs. ${analyticsData.revenue.toLocaleString()}`, change: '+15.3%', trend: 'up', icon: DollarSign, color: 'bg-green-500' },
-    { name: 'Total Orders', value: analyticsData.orders.toString(), change: '+23.1%', trend: 'up', icon: ShoppingCart, color: 'bg-blue-500' },
-    { name: 'Total Products', value: analyticsData.products.toString(), change: '+8.7%', trend: 'up', icon: Package, color: 'bg-purple-500' },
-    { name: 'Total Users', value: analyticsData.users.toString(), change: '+12.1%', trend: 'up', icon: Users, color: 'bg-pink-500' }
+    { name: 'Total Revenue', value: `Kshs. ${analyticsData.revenue.toLocaleString()}`, change: formatChange(analyticsData.revenueChange), trend: analyticsData.revenueChange < 0 ? 'down' : 'up', icon: DollarSign, color: 'bg-green-500' },
+    { name: 'Total Orders', value: analyticsData.orders.toString(), change: formatChange(analyticsData.ordersChange), trend: analyticsData.ordersChange < 0 ? 'down' : 'up', icon: ShoppingCart, color: 'bg-blue-500' },
+    { name: 'Total Products', value: analyticsData.products.toString(), change: null, trend: 'up', icon: Package, color: 'bg-purple-500' },
+    { name: 'Total Users', value: analyticsData.users.toString(), change: null, trend: 'up', icon: Users, color: 'bg-pink-500' }
   ];
 
   const topProducts = [];
 
-  const categoryPerformance = [
-    { category: 'Skincare', sales: Math.round(analyticsData.orders * 0.48), revenue: Math.round(analyticsData.revenue * 0.48), percentage: 48 },
-    { category: 'Makeup', sales: Math.round(analyticsData.orders * 0.32), revenue: Math.round(analyticsData.revenue * 0.32), percentage: 32 },
-    { category: 'Haircare', sales: Math.round(analyticsData.orders * 0.20), revenue: Math.round(analyticsData.revenue * 0.20), percentage: 20 }
-  ];
+  const categoryPerformance = analyticsData.categories;
 
   const recentReports = [];
 
@@ -135,12 +173,14 @@ const AnalyticsReports = () => {
                   <div className={`w-12 h-12 ${stat.color} rounded-xl flex items-center justify-center`}>
                     <stat.icon size={24} className="text-white" />
                   </div>
-                  <div className={`flex items-center gap-1 text-sm font-medium ${
-                    stat.trend === 'up' ? 'text-green-600' : 'text-red-600'
-                  }`}>
-                    {stat.trend === 'up' ? <TrendingUp size={16} /> : <TrendingDown size={16} />}
-                    {stat.change}
-                  </div>
+                  {stat.change && (
+                    <div className={`flex items-center gap-1 text-sm font-medium ${
+                      stat.trend === 'up' ? 'text-green-600' : 'text-red-600'
+                    }`}>
+                      {stat.trend === 'up' ? <TrendingUp size={16} /> : <TrendingDown size={16} />}
+                      {stat.change}
+                    </div>
+                  )}
                 </div>
                 <div>
                   <p className="text-2xl font-bold text-gray-900 mb-1">{stat.value}</p>
@@ -10,16 +10,27 @@ const CustomerSupport = () => {
   const [statusFilter, setStatusFilter] = useState('all');
   const [selectedMessage, setSelectedMessage] = useState(null);
   const [messages, setMessages] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [counts, setCounts] = useState({});
   const [isLoading, setIsLoading] = useState(true);
 
+  // The inbox is paginated and filtered on the server; refetch the first
+  // page when the filter or (debounced) search term changes.
   useEffect(() => {
-    fetchMessages();
-  }, []);
+    const timer = setTimeout(() => fetchMessages(), searchTerm ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [statusFilter, searchTerm]);
 
-  const fetchMessages = async () => {
+  const fetchMessages = async (cursor = null) => {
     try {
-      const response = await api.get('/support/');
-      setMessages(response.data);
+      const params = { limit: 50 };
+      if (statusFilter !== 'all') params.status = statusFilter;
+      if (searchTerm) params.q = searchTerm;
+      if (cursor) params.cursor = cursor;
+      const response = await api.get('/support/', { params });
+      setMessages(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+      setNextCursor(response.data.next_cursor);
+      setCounts(response.data.counts);
     } catch (error) {
       console.error('Failed to fetch support messages:', error);
     } finally {
@@ -28,14 +39,7 @@ const CustomerSupport = () => {
   };
 
   const statusOptions = ['all', 'pending', 'resolved', 'closed'];
-  
-  const filteredMessages = messages.filter(message => {
-    const matchesSearch = message.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         message.email.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                         message.subject.toLowerCase().includes(searchTerm.toLowerCase());
-    const matchesStatus = statusFilter === 'all' || message.status === statusFilter;
-    return matchesSearch && matchesStatus;
-  });
+
 
   const getStatusColor = (status) => {
     switch (status) {
@@ -80,8 +84,16 @@ const CustomerSupport = () => {
     window.open(mailtoLink);
   };
 
-  const viewMessage = (message) => {
+  const viewMessage = async (message) => {
     setSelectedMessage(message);
+    if (message.truncated) {
+      try {
+        const response = await api.get(`/support/${message.id}`);
+        setSelectedMessage(response.data);
+      } catch (error) {
+        console.error('Failed to fetch support message:', error);
+      }
+    }
   };
 
   return (
@@ -96,11 +108,11 @@ const CustomerSupport = () => {
         <div className="flex items-center gap-4 text-sm text-gray-500">
           <div className="flex items-center gap-2">
             <div className="w-3 h-3 bg-blue-500 rounded-full"></div>
-            <span>{messages.filter(m => m.status === 'pending').length} Pending</span>
+            <span>{counts.pending || 0} Pending</span>
           </div>
           <div className="flex items-center gap-2">
             <div className="w-3 h-3 bg-green-500 rounded-full"></div>
-            <span>{messages.filter(m => m.status === 'resolved').length} Resolved</span>
+            <span>{counts.resolved || 0} Resolved</span>
           </div>
         </div>
       </div>
@@ -137,14 +149,14 @@ const CustomerSupport = () => {
           {/* Results count */}
           <div className="flex items-center text-sm text-gray-500">
             <MessageSquare size={16} className="mr-2" />
-            {filteredMessages.length} messages
+            {counts[statusFilter] ?? messages.length} messages
           </div>
         </div>
       </div>
 
       {/* Messages List */}
       <div className="space-y-4">
-        {filteredMessages.map((message) => {
+        {messages.map((message) => {
           const TypeIcon = getTypeIcon(message.type);
           return (
             <div key={message.id} className="bg-white rounded-2xl shadow-sm border border-gray-100 p-6">
@@ -193,7 +205,7 @@ const CustomerSupport = () => {
 
               {/* Message Content */}
               <div className="bg-gray-50 rounded-xl p-4 mb-4">
-                <p className="text-gray-700 leading-relaxed">{message.message}</p>
+                <p className="text-gray-700 leading-relaxed">{message.message}{message.truncated && '…'}</p>
               </div>
 
               {/* Contact Info & Actions */}
@@ -224,8 +236,19 @@ const CustomerSupport = () => {
         })}
       </div>
 
+      {nextCursor && (
+        <div className="text-center">
+          <button
+            onClick={() => fetchMessages(nextCursor)}
+            className="px-6 py-2 border border-gray-300 text-gray-700 rounded-xl hover:bg-gray-50 transition-colors text-sm"
+          >
+            Load more
+          </button>
+        </div>
+      )}
+
       {/* Empty State */}
-      {filteredMessages.length === 0 && (
+      {messages.length === 0 && (
         <div className="bg-white rounded-2xl shadow-sm border border-gray-100 p-12 text-center">
           <MessageSquare size={48} className="mx-auto mb-4 text-gray-300" />
           <h3 className="text-lg font-medium text-gray-900 mb-2">No messages found</h3>
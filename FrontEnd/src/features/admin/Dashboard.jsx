@@ -26,20 +26,19 @@ const AdminDashboard = () => {
       const [productsRes, ordersRes, usersRes] = await Promise.all([
         productsAPI.getAll(),
         ordersAPI.getAllOrders(),
-        usersAPI.getAll()
+        usersAPI.count()
       ]);
 
       // Calculate stats
       const products = productsRes.data;
       const orders = ordersRes.data;
-      const users = usersRes.data;
 
       const totalRevenue = orders.reduce((sum, order) => sum + (order.total_amount || 0), 0);
 
       setStats({
         totalProducts: products.length,
         totalOrders: orders.length,
-        totalUsers: users.length,
+        totalUsers: usersRes.data.count,
         totalRevenue: totalRevenue
       });
 
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useSelector, useDispatch } from 'react-redux';
 import { fetchAllOrders } from '../orders/ordersSlice';
+import { useOrderEvents } from '../orders/useOrderEvents';
 import { ordersAPI } from '../../services/api';
 import { 
   Search, Filter, Eye, Package, Truck, CheckCircle, 
@@ -20,6 +21,8 @@ const ManageOrders = () => {
     dispatch(fetchAllOrders());
   }, [dispatch]);
 
+  useOrderEvents('admin', fetchAllOrders);
+
   const statusOptions = ['all', 'Paid', 'Processing', 'Shipped', 'Delivered', 'Cancelled'];
   
   const filteredOrders = orders.filter(order => {
@@ -77,8 +80,8 @@ const ManageOrders = () => {
 
   const updateOrderStatus = async (orderId, newStatus) => {
     try {
+      // The change comes back on the order events stream
       await ordersAPI.updateStatus(orderId, newStatus.toLowerCase());
-      dispatch(fetchAllOrders());
     } catch (error) {
       console.error('Failed to update order status:', error);
     }
@@ -111,6 +114,31 @@ const ManageOrders = () => {
     window.URL.revokeObjectURL(url);
   };
 
+  const exportInvoices = async () => {
+    const params = {};
+    if (dateFilter !== 'all') {
+      const start = new Date();
+      start.setHours(0, 0, 0, 0);
+      if (dateFilter === 'week') start.setDate(start.getDate() - 7);
+      if (dateFilter === 'month') start.setMonth(start.getMonth() - 1);
+      params.start = start.toISOString();
+    }
+    if (statusFilter !== 'all') params.status = statusFilter.toLowerCase();
+    try {
+      const response = await ordersAPI.exportInvoices(params);
+      const url = window.URL.createObjectURL(response.data);
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = `invoices-${new Date().toISOString().split('T')[0]}.zip`;
+      document.body.appendChild(a);
+      a.click();
+      document.body.removeChild(a);
+      window.URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error('Failed to export invoices:', error);
+    }
+  };
+
   const viewOrderDetails = (order) => {
     navigate(`/admin/orders/${order.id}`);
   };
@@ -137,6 +165,13 @@ const ManageOrders = () => {
             <Download size={18} />
             Export Orders
           </button>
+          <button 
+            onClick={exportInvoices}
+            className="flex items-center gap-2 px-4 py-2 border border-gray-300 text-gray-700 rounded-xl font-medium hover:bg-gray-50 transition-colors"
+          >
+            <FileText size={18} />
+            Export Invoices
+          </button>
         </div>
       </div>
 
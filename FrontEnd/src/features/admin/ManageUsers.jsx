@@ -12,17 +12,25 @@ const ManageUsers = () => {
   const [roleFilter, setRoleFilter] = useState('all');
   const [statusFilter, setStatusFilter] = useState('all');
   const [users, setUsers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
   const navigate = useNavigate();
 
+  // Search and role filtering happen on the server, a page at a time
   useEffect(() => {
-    fetchUsers();
-  }, []);
+    const timer = setTimeout(() => fetchUsers(), searchTerm ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [searchTerm, roleFilter]);
 
-  const fetchUsers = async () => {
+  const fetchUsers = async (cursor = null) => {
     try {
-      const response = await usersAPI.getAll();
-      setUsers(response.data);
+      const params = { limit: 50, include_summary: true };
+      if (searchTerm) params.q = searchTerm;
+      if (roleFilter !== 'all') params.is_admin = roleFilter === 'admin';
+      if (cursor) params.cursor = cursor;
+      const response = await usersAPI.getAll(params);
+      setUsers(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Error fetching users:', error);
       showNotification('Failed to load users', 'error');
@@ -34,13 +42,6 @@ const ManageUsers = () => {
   const roles = ['all', 'customer', 'admin'];
   const statuses = ['all', 'active', 'inactive'];
 
-  const filteredUsers = users.filter(user => {
-    const matchesSearch = user.email.toLowerCase().includes(searchTerm.toLowerCase());
-    const userRole = user.is_admin ? 'admin' : 'customer';
-    const matchesRole = roleFilter === 'all' || userRole === roleFilter;
-    return matchesSearch && matchesRole;
-  });
-
   const getRoleColor = (isAdmin) => {
     return isAdmin ? 'bg-red-100 text-red-800' : 'bg-green-100 text-green-800';
   };
@@ -179,7 +180,7 @@ const ManageUsers = () => {
           {/* Results count */}
           <div className="flex items-center text-sm text-gray-500">
             <User size={16} className="mr-2" />
-            {filteredUsers.length} users
+            {users.length}{nextCursor ? '+' : ''} users
           </div>
         </div>
       </div>
@@ -199,7 +200,7 @@ const ManageUsers = () => {
               </tr>
             </thead>
             <tbody className="divide-y divide-gray-200">
-              {filteredUsers.map((user) => (
+              {users.map((user) => (
                 <tr key={user.id} className="hover:bg-gray-50">
                   
                   {/* User Info */}
@@ -237,14 +238,17 @@ const ManageUsers = () => {
                   {/* Activity */}
                   <td className="py-4 px-6">
                     <div className="text-sm">
-                      <p className="text-gray-900">-</p>
+                      <p className="text-gray-900">
+                        {user.last_order_at ? `Last order ${new Date(user.last_order_at).toLocaleDateString()}` : '-'}
+                      </p>
                     </div>
                   </td>
 
                   {/* Orders */}
                   <td className="py-4 px-6">
                     <div className="text-sm">
-                      <p className="text-gray-500">-</p>
+                      <p className="text-gray-900">{user.order_count || 0} orders</p>
+                      <p className="text-gray-500">Kshs. {(user.lifetime_spend || 0).toLocaleString()}</p>
                     </div>
                   </td>
 
@@ -356,8 +360,19 @@ const ManageUsers = () => {
         </div>
       )}
 
+      {nextCursor && (
+        <div className="text-center">
+          <button
+            onClick={() => fetchUsers(nextCursor)}
+            className="px-6 py-2 border border-gray-300 text-gray-700 rounded-xl hover:bg-gray-50 transition-colors text-sm"
+          >
+            Load more
+          </button>
+        </div>
+      )}
+
       {/* Empty State */}
-      {filteredUsers.length === 0 && (
+      {users.length === 0 && (
         <div className="bg-white rounded-2xl shadow-sm border border-gray-100 p-12 text-center">
           <User size={48} className="mx-auto mb-4 text-gray-300" />
           <h3 className="text-lg font-medium text-gray-900 mb-2">No users found</h3>
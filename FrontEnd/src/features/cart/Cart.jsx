@@ -1,13 +1,17 @@
-import React from 'react';
+import React, { useState } from 'react';
 import { useSelector, useDispatch } from 'react-redux';
 import { useNavigate } from 'react-router-dom';
-import { addItemToCart, removeItemFromCart, deleteItem } from './cartSlice';
+import { addItemToCart, removeItemFromCart, deleteItem, setCouponCode } from './cartSlice';
+import { useCartQuote } from './useCartQuote';
 import { Trash2, Plus, Minus, ArrowRight } from 'lucide-react';
 
 const Cart = () => {
-  const { items, totalAmount } = useSelector((state) => state.cart);
+  const { items, totalAmount, couponCode } = useSelector((state) => state.cart);
   const dispatch = useDispatch();
   const navigate = useNavigate();
+  const [couponInput, setCouponInput] = useState(couponCode || '');
+  const quote = useCartQuote(items, couponCode);
+  const quotedLines = Object.fromEntries((quote?.items || []).map((line) => [line.id, line]));
 
   if (items.length === 0) {
     return (
@@ -45,7 +49,10 @@ const Cart = () => {
               </div>
 
               <div className="text-right">
-                <p className="font-bold text-lg mb-2">Kshs. {item.totalPrice.toLocaleString()}</p>
+                <p className="font-bold text-lg mb-2">Kshs. {(quotedLines[item.id]?.totalPrice ?? item.totalPrice).toLocaleString()}</p>
+                {quotedLines[item.id]?.promotion && (
+                  <p className="text-xs text-pink-600 mb-1">{quotedLines[item.id].promotion}</p>
+                )}
                 <button onClick={() => dispatch(deleteItem(item.id))} className="text-red-400 hover:text-red-600 p-2">
                   <Trash2 size={18} />
                 </button>
@@ -61,16 +68,38 @@ const Cart = () => {
             <div className="space-y-4 mb-6 border-b border-gray-200 pb-6">
               <div className="flex justify-between text-gray-600">
                 <span>Subtotal</span>
-                <span>Kshs. {totalAmount.toLocaleString()}</span>
+                <span>Kshs. {(quote?.subtotal ?? totalAmount).toLocaleString()}</span>
               </div>
+              {quote?.discount > 0 && (
+                <div className="flex justify-between text-pink-600">
+                  <span>Discounts{quote.coupon ? ` (${quote.coupon})` : ''}</span>
+                  <span>- Kshs. {quote.discount.toLocaleString()}</span>
+                </div>
+              )}
               <div className="flex justify-between text-gray-600">
                 <span>Shipping</span>
                 <span>Free</span>
               </div>
             </div>
-            <div className="flex justify-between font-bold text-xl mb-8">
+            <form
+              onSubmit={(e) => {
+                e.preventDefault();
+                dispatch(setCouponCode(couponInput.trim()));
+              }}
+              className="flex gap-2 mb-2"
+            >
+              <input
+                value={couponInput}
+                onChange={(e) => setCouponInput(e.target.value)}
+                placeholder="Coupon code"
+                className="flex-grow border border-gray-200 rounded-full px-4 py-2 text-sm"
+              />
+              <button type="submit" className="text-sm font-bold text-pink-600 px-3">Apply</button>
+            </form>
+            {quote?.couponError && <p className="text-xs text-red-500 mb-4">{quote.couponError}</p>}
+            <div className="flex justify-between font-bold text-xl mb-8 mt-6">
               <span>Total</span>
-              <span>Kshs. {totalAmount.toLocaleString()}</span>
+              <span>Kshs. {(quote?.total ?? totalAmount).toLocaleString()}</span>
             </div>
             <button 
               onClick={() => navigate('/checkout')}
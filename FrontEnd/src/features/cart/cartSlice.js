@@ -4,6 +4,7 @@ const initialState = {
   items: [],
   totalQuantity: 0,
   totalAmount: 0,
+  couponCode: null,
   notification: {
     isVisible: false,
     message: ''
@@ -71,6 +72,10 @@ const cartSlice = createSlice({
       state.items = [];
       state.totalQuantity = 0;
       state.totalAmount = 0;
+      state.couponCode = null;
+    },
+    setCouponCode(state, action) {
+      state.couponCode = action.payload || null;
     },
     hideNotification(state) {
       state.notification.isVisible = false;
@@ -81,9 +86,10 @@ const cartSlice = createSlice({
       state.items = [];
       state.totalQuantity = 0;
       state.totalAmount = 0;
+      state.couponCode = null;
     });
   },
 });
 
-export const { addItemToCart, removeItemFromCart, deleteItem, clearCart, hideNotification } = cartSlice.actions;
+export const { addItemToCart, removeItemFromCart, deleteItem, clearCart, setCouponCode, hideNotification } = cartSlice.actions;
 export default cartSlice.reducer;
\ No newline at end of file
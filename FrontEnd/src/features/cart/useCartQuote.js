@@ -0,0 +1,25 @@
+import { useEffect, useState } from 'react';
+import { cartAPI } from '../../services/api';
+
+// Price the cart on the server, promotions and coupon included. The quote
+// is null until it arrives (or if the request fails); callers then fall
+// back to the list-price totals kept in the cart slice.
+export const useCartQuote = (items, couponCode) => {
+  const [quote, setQuote] = useState(null);
+
+  useEffect(() => {
+    if (items.length === 0) {
+      setQuote(null);
+      return undefined;
+    }
+    let cancelled = false;
+    cartAPI.quote(items, couponCode)
+      .then((response) => !cancelled && setQuote(response.data))
+      .catch(() => !cancelled && setQuote(null));
+    return () => {
+      cancelled = true;
+    };
+  }, [items, couponCode]);
+
+  return quote;
+};
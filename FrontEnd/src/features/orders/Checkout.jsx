@@ -6,9 +6,13 @@ import { createOrder } from './ordersSlice';
 import { Loader2, Phone, CreditCard } from 'lucide-react';
 import Notification from '../../components/Notification';
 import MpesaPayment from '../../components/MpesaPayment';
+import { useCartQuote } from '../cart/useCartQuote';
 
 const Checkout = () => {
-  const { items, totalAmount } = useSelector((state) => state.cart);
+  const { items, totalAmount: listTotal, couponCode } = useSelector((state) => state.cart);
+  // The server prices the order; show its total, discounts included
+  const quote = useCartQuote(items, couponCode);
+  const totalAmount = quote?.total ?? listTotal;
   const dispatch = useDispatch();
   const navigate = useNavigate();
   const [isProcessing, setIsProcessing] = useState(false);
@@ -76,7 +80,8 @@ const Checkout = () => {
       customer: formData,
       items: items,
       total: totalAmount,
-      paymentMethod: paymentMethod
+      paymentMethod: paymentMethod,
+      couponCode: couponCode
     };
 
     try {
@@ -224,6 +229,12 @@ const Checkout = () => {
               </div>
             ))}
           </div>
+          {quote?.discount > 0 && (
+            <div className="flex justify-between text-sm text-pink-600 mb-2">
+              <span>Discounts{quote.coupon ? ` (${quote.coupon})` : ''}</span>
+              <span>- Kshs. {quote.discount.toLocaleString()}</span>
+            </div>
+          )}
           <div className="border-t border-gray-200 pt-4 flex justify-between font-bold text-lg">
             <span>Total</span>
             <span>Kshs. {totalAmount.toLocaleString()}</span>
@@ -238,6 +249,7 @@ const Checkout = () => {
             <MpesaPayment
               amount={totalAmount}
               cartItems={items}
+              couponCode={couponCode}
               onSuccess={handleMpesaSuccess}
               onCancel={() => setShowMpesaModal(false)}
             />
@@ -2,6 +2,7 @@ import React, { useEffect } from 'react';
 import { useSelector, useDispatch } from 'react-redux';
 import { useNavigate } from 'react-router-dom';
 import { fetchUserOrders } from './ordersSlice';
+import { useOrderEvents } from './useOrderEvents';
 import { Package, Eye, Calendar, CreditCard } from 'lucide-react';
 
 const OrderHistory = () => {
@@ -13,6 +14,9 @@ const OrderHistory = () => {
     dispatch(fetchUserOrders());
   }, [dispatch]);
 
+  // e.g. an M-Pesa payment landing while the page is open
+  useOrderEvents('mine', fetchUserOrders);
+
   if (isLoading) {
     return (
       <div className="max-w-4xl mx-auto px-6 py-12 text-center">
@@ -67,6 +67,17 @@ const ordersSlice = createSlice({
     setCurrentOrder(state, action) {
       state.currentOrder = action.payload;
     },
+    // Status/payment event pushed by /orders/events
+    orderUpdated(state, action) {
+      const { id, status } = action.payload;
+      const order = state.orders.find((o) => o.id === id);
+      if (order) {
+        order.status = status;
+      }
+      if (state.currentOrder?.id === id) {
+        state.currentOrder.status = status;
+      }
+    },
   },
   extraReducers: (builder) => {
     builder
@@ -110,5 +121,5 @@ const ordersSlice = createSlice({
   },
 });
 
-export const { clearOrders, setCurrentOrder } = ordersSlice.actions;
+export const { clearOrders, setCurrentOrder, orderUpdated } = ordersSlice.actions;
 export default ordersSlice.reducer;
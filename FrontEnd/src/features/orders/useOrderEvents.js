@@ -0,0 +1,30 @@
+import { useEffect } from 'react';
+import { useDispatch } from 'react-redux';
+import { ordersAPI } from '../../services/api';
+import { orderUpdated } from './ordersSlice';
+
+// Apply order status and payment changes pushed by the backend; `refetch`
+// reloads the list when the stream (re)connects or asks for a resync.
+export const useOrderEvents = (scope, refetch) => {
+  const dispatch = useDispatch();
+
+  useEffect(() => {
+    if (!localStorage.getItem('token') || typeof EventSource === 'undefined') {
+      return undefined;
+    }
+    const source = new EventSource(ordersAPI.eventsUrl(scope));
+    const onUpdate = (e) => dispatch(orderUpdated(JSON.parse(e.data)));
+    let connectedBefore = false;
+    source.addEventListener('order_status', onUpdate);
+    source.addEventListener('payment', onUpdate);
+    source.addEventListener('resync', () => dispatch(refetch()));
+    source.onopen = () => {
+      // Changes made while disconnected were not pushed
+      if (connectedBefore) {
+        dispatch(refetch());
+      }
+      connectedBefore = true;
+    };
+    return () => source.close();
+  }, [dispatch, scope, refetch]);
+};
@@ -19,14 +19,25 @@ const ProductDetails = () => {
   const [qty, setQty] = useState(1);
   const [isLiked, setIsLiked] = useState(false);
   const [reviews, setReviews] = useState([]);
+  const [related, setRelated] = useState([]);
   const [newReview, setNewReview] = useState({ rating: 5, comment: "", name: "" });
   const [showReviewForm, setShowReviewForm] = useState(false);
 
   useEffect(() => {
     dispatch(fetchProductById(id));
     fetchReviews();
+    fetchRelated();
   }, [dispatch, id]);
 
+  const fetchRelated = async () => {
+    try {
+      const response = await axios.get(`${API_BASE_URL}/products/${id}/related`);
+      setRelated(response.data);
+    } catch (error) {
+      setRelated([]);
+    }
+  };
+
   const fetchReviews = async () => {
     try {
       const response = await axios.get(`${API_BASE_URL}/reviews/product/${id}`);
@@ -155,6 +166,28 @@ const ProductDetails = () => {
         </div>
       </div>
 
+      {/* --- Frequently Bought Together --- */}
+      {related.length > 0 && (
+        <div className="border-t border-gray-100 pt-16 mb-16">
+          <h2 className="text-2xl font-serif text-gray-900 mb-8">Frequently Bought Together</h2>
+          <div className="grid grid-cols-2 md:grid-cols-4 gap-6">
+            {related.slice(0, 4).map((item) => (
+              <button
+                key={item.id}
+                onClick={() => navigate(`/product/${item.id}`)}
+                className="text-left group"
+              >
+                <div className="aspect-square bg-gray-50 rounded-xl overflow-hidden mb-3">
+                  <img src={item.image} alt={item.name} className="w-full h-full object-cover group-hover:scale-105 transition-transform" />
+                </div>
+                <p className="text-sm font-medium text-gray-900">{item.name}</p>
+                <p className="text-sm text-gray-500">Kshs. {item.price.toLocaleString()}</p>
+              </button>
+            ))}
+          </div>
+        </div>
+      )}
+
       {/* --- BOTTOM SECTION: Reviews & Community --- */}
       <div className="border-t border-gray-100 pt-16">
         <div className="flex justify-between items-center mb-10">
@@ -27,6 +27,7 @@ export const authAPI = {
 export const productsAPI = {
   getAll: (params) => api.get('/products', { params }),
   getById: (id) => api.get(`/products/${id}`),
+  suggest: (q, limit = 8) => api.get('/products/suggest', { params: { q, limit } }),
   create: (productData) => api.post('/products/', productData),
   update: (id, productData) => api.put(`/products/${id}`, productData),
   delete: (id) => api.delete(`/products/${id}`),
@@ -38,27 +39,45 @@ export const cartAPI = {
   updateItem: (itemId, quantity) => api.put(`/cart/${itemId}`, { quantity }),
   removeItem: (itemId) => api.delete(`/cart/${itemId}`),
   clearCart: () => api.delete('/cart/'),
+  // Server-side prices, promotions and coupon for a cart kept in the browser
+  quote: (items, couponCode) => api.post('/cart/quote', {
+    items: items.map(({ id, name, quantity }) => ({ id, name, quantity })),
+    coupon_code: couponCode || null,
+  }),
 };
 
 export const ordersAPI = {
   create: (orderData) => api.post('/orders/', orderData),
-  checkout: (phoneNumber, cartItems) => api.post('/orders/checkout', { 
+  checkout: (phoneNumber, cartItems, couponCode) => api.post('/orders/checkout', { 
     phone_number: phoneNumber,
-    cart_items: cartItems 
+    cart_items: cartItems,
+    coupon_code: couponCode || null
   }),
   getUserOrders: () => api.get('/orders/'),
   getAllOrders: () => api.get('/orders/all'),
   getById: (orderId) => api.get(`/orders/${orderId}`),
   updateStatus: (orderId, status) => api.put(`/orders/${orderId}/status`, { status }),
+  // Admin: ZIP of invoice PDFs plus manifest.csv for a date range
+  exportInvoices: (params = {}) => api.get('/orders/invoices/export', { params, responseType: 'blob' }),
+  // EventSource cannot send headers, so the token goes in the query string
+  eventsUrl: (scope = 'mine') => {
+    const params = new URLSearchParams({ scope, token: localStorage.getItem('token') || '' });
+    return `${API_BASE_URL}/orders/events?${params}`;
+  },
 };
 
 export const usersAPI = {
-  getAll: () => api.get('/users/'),
+  getAll: (params = {}) => api.get('/users/', { params }),
+  count: () => api.get('/users/count'),
   create: (userData) => api.post('/users/', userData),
   update: (userId, userData) => api.put(`/users/${userId}`, userData),
   delete: (userId) => api.delete(`/users/${userId}`),
 };
 
+export const analyticsAPI = {
+  sales: (params = {}) => api.get('/analytics/sales', { params }),
+};
+
 export const reviewsAPI = {
   getByProduct: (productId) => api.get(`/reviews/product/${productId}`),
   create: (reviewData) => api.post('/reviews/', reviewData),
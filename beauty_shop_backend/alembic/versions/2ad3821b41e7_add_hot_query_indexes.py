@@ -0,0 +1,52 @@
+"""add hot query indexes
+
+Revision ID: 2ad3821b41e7
+Revises: 3a125e75349d
+Create Date: 2026-10-19 09:12:41.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2ad3821b41e7'
+down_revision: Union[str, Sequence[str], None] = '3a125e75349d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns). orders.invoice_number is already covered by
+# the index backing its unique constraint.
+INDEXES = [
+    ('ix_orders_user_id_created_at', 'orders', ['user_id', 'created_at']),
+    ('ix_orders_created_at', 'orders', ['created_at']),
+    ('ix_cart_items_user_id', 'cart_items', ['user_id']),
+    ('ix_cart_items_product_id', 'cart_items', ['product_id']),
+    ('ix_products_category_id', 'products', ['category_id']),
+    ('ix_reviews_product_id', 'reviews', ['product_id']),
+    ('ix_support_messages_created_at', 'support_messages', ['created_at']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction block, and avoids locking
+    # the tables against writes while the indexes build.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                postgresql_concurrently=True, if_exists=True,
+            )
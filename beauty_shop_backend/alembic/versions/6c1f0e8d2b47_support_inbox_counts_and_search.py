@@ -0,0 +1,60 @@
+"""support inbox counts and search indexes
+
+Revision ID: 6c1f0e8d2b47
+Revises: 2ad3821b41e7
+Create Date: 2026-10-19 14:05:12.381920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c1f0e8d2b47'
+down_revision: Union[str, Sequence[str], None] = '2ad3821b41e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with SEARCH_VECTOR in app/services/support_service.py
+SEARCH_VECTOR = "to_tsvector('english', subject || ' ' || message)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'support_status_counts',
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('status'),
+    )
+    # Seed the counters from the existing messages
+    op.execute(
+        "INSERT INTO support_status_counts (status, count) "
+        "SELECT COALESCE(status, 'pending'), COUNT(*) FROM support_messages "
+        "GROUP BY COALESCE(status, 'pending')"
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_support_messages_status_created_at', 'support_messages', ['status', 'created_at'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        if op.get_bind().dialect.name == 'postgresql':
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_support_messages_search "
+                f"ON support_messages USING gin ({SEARCH_VECTOR})"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        if op.get_bind().dialect.name == 'postgresql':
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_support_messages_search")
+        op.drop_index(
+            'ix_support_messages_status_created_at', table_name='support_messages',
+            postgresql_concurrently=True, if_exists=True,
+        )
+    op.drop_table('support_status_counts')
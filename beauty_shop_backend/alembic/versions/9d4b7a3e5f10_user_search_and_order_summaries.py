@@ -0,0 +1,60 @@
+"""user search indexes and order summaries
+
+Revision ID: 9d4b7a3e5f10
+Revises: 6c1f0e8d2b47
+Create Date: 2026-10-19 15:22:47.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b7a3e5f10'
+down_revision: Union[str, Sequence[str], None] = '6c1f0e8d2b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_order_summaries',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('lifetime_spend', sa.Float(), nullable=False),
+        sa.Column('last_order_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    # One-off backfill; from here on insert_order keeps the rows current
+    op.execute(
+        "INSERT INTO user_order_summaries (user_id, order_count, lifetime_spend, last_order_at) "
+        "SELECT user_id, COUNT(*), COALESCE(SUM(total_amount), 0), MAX(created_at) "
+        "FROM orders WHERE user_id IS NOT NULL GROUP BY user_id"
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        with op.get_context().autocommit_block():
+            # Prefix search: lower(email) LIKE 'ab%'
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_lower_pattern "
+                "ON users (lower(email) text_pattern_ops)"
+            )
+            # Substring search: email ILIKE '%abc%'
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_trgm "
+                "ON users USING gin (email gin_trgm_ops)"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_email_trgm")
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_email_lower_pattern")
+    op.drop_table('user_order_summaries')
@@ -0,0 +1,38 @@
+"""orders status created_at index
+
+Revision ID: a4d7e2f9c318
+Revises: f2c8d4a61b57
+Create Date: 2026-10-20 00:41:17.385204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d7e2f9c318'
+down_revision: Union[str, Sequence[str], None] = 'f2c8d4a61b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # For the payment reconciler's scan of pending orders. Built
+    # CONCURRENTLY so checkouts keep writing orders meanwhile.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_orders_status_created_at', 'orders', ['status', 'created_at'], unique=False,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_orders_status_created_at', table_name='orders',
+            postgresql_concurrently=True, if_exists=True,
+        )
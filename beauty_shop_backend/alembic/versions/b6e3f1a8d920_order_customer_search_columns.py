@@ -0,0 +1,61 @@
+"""order customer search columns
+
+Revision ID: b6e3f1a8d920
+Revises: a4d7e2f9c318
+Create Date: 2026-10-20 01:26:53.710448
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e3f1a8d920'
+down_revision: Union[str, Sequence[str], None] = 'a4d7e2f9c318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Substring search (LIKE/ILIKE '%term%') on each column, see
+# order_service.search_orders
+TRIGRAM_INDEXES = [
+    ('ix_orders_customer_email_trgm', 'customer_email'),
+    ('ix_orders_customer_name_trgm', 'customer_name'),
+    ('ix_orders_phone_trgm', 'phone'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('customer_email', sa.String(), nullable=True))
+    op.add_column('orders', sa.Column('customer_name', sa.String(), nullable=True))
+    op.add_column('orders', sa.Column('phone', sa.String(), nullable=True))
+    # Existing orders are filled with `python backfill_order_customers.py`,
+    # in batches and with the same parsing as the write path
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        with op.get_context().autocommit_block():
+            # Prefix search for short terms: customer_email LIKE 'ab%'
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_customer_email_pattern "
+                "ON orders (customer_email text_pattern_ops)"
+            )
+            for name, column in TRIGRAM_INDEXES:
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                    f"ON orders USING gin ({column} gin_trgm_ops)"
+                )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, _ in reversed(TRIGRAM_INDEXES):
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_orders_customer_email_pattern")
+    op.drop_column('orders', 'phone')
+    op.drop_column('orders', 'customer_name')
+    op.drop_column('orders', 'customer_email')
@@ -0,0 +1,40 @@
+"""sales rollups
+
+Revision ID: c3d9a6e0f812
+Revises: b8e1f47c2a90
+Create Date: 2026-10-19 18:03:27.551903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d9a6e0f812'
+down_revision: Union[str, Sequence[str], None] = 'b8e1f47c2a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sales_rollups',
+        sa.Column('granularity', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('granularity', 'bucket_start', 'category_id', 'status'),
+    )
+    # Filled from existing orders with `python rebuild_sales_rollups.py`,
+    # which needs the same category matching as the write path
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sales_rollups')
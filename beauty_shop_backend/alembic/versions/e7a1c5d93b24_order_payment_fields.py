@@ -0,0 +1,32 @@
+"""order payment fields
+
+Revision ID: e7a1c5d93b24
+Revises: d5f2b8c4e731
+Create Date: 2026-10-19 22:40:05.117392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a1c5d93b24'
+down_revision: Union[str, Sequence[str], None] = 'd5f2b8c4e731'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('checkout_request_id', sa.String(), nullable=True))
+    op.add_column('orders', sa.Column('payment_reference', sa.String(), nullable=True))
+    op.create_unique_constraint('uq_orders_checkout_request_id', 'orders', ['checkout_request_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_orders_checkout_request_id', 'orders', type_='unique')
+    op.drop_column('orders', 'payment_reference')
+    op.drop_column('orders', 'checkout_request_id')
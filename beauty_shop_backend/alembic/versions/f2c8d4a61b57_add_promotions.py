@@ -0,0 +1,49 @@
+"""add promotions
+
+Revision ID: f2c8d4a61b57
+Revises: e7a1c5d93b24
+Create Date: 2026-10-19 23:55:41.602118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8d4a61b57'
+down_revision: Union[str, Sequence[str], None] = 'e7a1c5d93b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'promotions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('percent_off', sa.Float(), nullable=True),
+        sa.Column('amount_off', sa.Float(), nullable=True),
+        sa.Column('product_id', sa.Integer(), nullable=True),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('min_quantity', sa.Integer(), nullable=True),
+        sa.Column('bundle_price', sa.Float(), nullable=True),
+        sa.Column('code', sa.String(), nullable=True),
+        sa.Column('min_subtotal', sa.Float(), nullable=True),
+        sa.Column('starts_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('ends_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('code'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('promotions')
@@ -0,0 +1,4 @@
+from dotenv import load_dotenv
+
+# Load environment variables from .env once, before any app module reads them
+load_dotenv()
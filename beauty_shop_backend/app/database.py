@@ -1,11 +1,8 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-
-# Load environment variables (for local development)
-load_dotenv()
 
 # 1. Get the URL from Render's environment variables. 
 # 2. If it's not there, fall back to your local localhost string.
@@ -31,4 +28,13 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def dialect_insert(db):
+    """Return the dialect's insert() for upserts (INSERT ... ON CONFLICT).
+
+    Postgres and SQLite share the on_conflict_do_update() API, but it lives
+    on each dialect's own insert construct."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
\ No newline at end of file
@@ -1,18 +1,35 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import auth, products, orders, cart, users, reviews, support
+from app.routes import auth, products, orders, cart, users, reviews, support, images, analytics, promotions
 from app.database import engine
 from app.models import Base
-from dotenv import load_dotenv
+from app.services import order_events
+from app.utils.compression import CompressionMiddleware
+from app.utils.instrumentation import PerformanceMiddleware, install_query_hooks
+from app.utils.metrics import install_pool_hooks, metrics_payload
+from app.utils.warmup import run_warmups
 import os
 
-# Load environment variables from .env file
-load_dotenv()
 
-# Create all database tables on startup
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema is managed by Alembic (`alembic upgrade head`); create_all is
+    # only a convenience for throwaway local databases.
+    if os.getenv("AUTO_CREATE_TABLES") == "1":
+        await run_in_threadpool(Base.metadata.create_all, bind=engine)
+    # Prime the DB pool, caches and PDF renderer before reporting ready
+    await run_in_threadpool(run_warmups)
+    # Order events from other workers arrive via Postgres LISTEN/NOTIFY
+    order_events.start_listener()
+    app.state.ready = True
+    yield
+    await run_in_threadpool(order_events.stop_listener)
 
-app = FastAPI(title="Project 8: Beauty Shop API")
+
+app = FastAPI(title="Project 8: Beauty Shop API", lifespan=lifespan)
+app.state.ready = False
 
 # CORS Configuration - Must be before routes
 # Note: allow_credentials=True cannot be used with allow_origins=["*"]
@@ -29,6 +46,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for JSON responses above COMPRESSION_MIN_SIZE; inside the
+# timing middleware so Server-Timing includes compression time
+app.add_middleware(CompressionMiddleware)
+
+# Per-request latency and SQL query counting (Server-Timing header).
+# Added last so it wraps every other middleware.
+if os.getenv("PERF_INSTRUMENTATION", "1") == "1":
+    install_query_hooks()
+    install_pool_hooks()
+    app.add_middleware(PerformanceMiddleware)
+
 # These assume that in your routes/__init__.py, you have:
 # from .orders import router as orders
 app.include_router(auth, prefix="/api/auth", tags=["Authentication"])
@@ -38,7 +66,23 @@ app.include_router(cart, prefix="/api/cart", tags=["Cart"])
 app.include_router(users, prefix="/api/users", tags=["Users"])
 app.include_router(reviews, prefix="/api/reviews", tags=["Reviews"])
 app.include_router(support, prefix="/api/support", tags=["Support"])
+app.include_router(images, prefix="/api/images", tags=["Images"])
+app.include_router(analytics, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(promotions, prefix="/api/promotions", tags=["Promotions"])
 
 @app.get("/")
 async def root():
-    return {"message": "Beauty Shop Backend is Active"}
\ No newline at end of file
+    return {"message": "Beauty Shop Backend is Active"}
+
+@app.get("/health", include_in_schema=False)
+async def health():
+    """Readiness probe: 503 until the startup warm-up has finished."""
+    if not app.state.ready:
+        return Response(status_code=503)
+    return {"status": "ready"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (aggregated across workers in multiprocess mode)."""
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
\ No newline at end of file
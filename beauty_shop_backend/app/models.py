@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -18,6 +18,14 @@ class User(Base):
     orders = relationship("Order", back_populates="owner")
     cart_items = relationship("CartItem", back_populates="user")
 
+class UserOrderSummary(Base):
+    """Per-user order aggregates, updated by insert_order as orders are placed."""
+    __tablename__ = "user_order_summaries"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    lifetime_spend = Column(Float, nullable=False, default=0)
+    last_order_at = Column(DateTime(timezone=True), nullable=True)
+
 class Category(Base):
     __tablename__ = "categories"
     id = Column(Integer, primary_key=True, index=True)
@@ -32,7 +40,7 @@ class Product(Base):
     description = Column(String)
     price = Column(Float)
     stock_quantity = Column(Integer, default=0)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     image = Column(String, nullable=True)
     rating = Column(Float, default=4.5)
     is_new = Column(Boolean, default=False)
@@ -42,8 +50,8 @@ class Product(Base):
 class CartItem(Base):
     __tablename__ = "cart_items"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     quantity = Column(Integer, default=1)
 
     user = relationship("User", back_populates="cart_items")
@@ -51,11 +59,17 @@ class CartItem(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    # Per-customer history is filtered by user and sorted newest first; the
+    # payment reconciler scans pending orders oldest first
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     total_amount = Column(Float)
     status = Column(String, default="pending") 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     invoice_number = Column(String, unique=True)
     billing_address = Column(String, default="123 Beauty Lane, Nairobi")
@@ -63,6 +77,16 @@ class Order(Base):
     public_id = Column(String, unique=True, index=True, nullable=True)
     customer_json = Column(Text, nullable=True)
     items_json = Column(Text, nullable=True)
+    # M-Pesa STK Push: the CheckoutRequestID the payment callback refers to,
+    # and the receipt number once paid
+    checkout_request_id = Column(String, unique=True, nullable=True)
+    payment_reference = Column(String, nullable=True)
+    # Copied out of customer_json by insert_order for admin search (see
+    # order_service.search_orders): lower-cased email, "first last", and
+    # the phone in 2547... form
+    customer_email = Column(String, nullable=True)
+    customer_name = Column(String, nullable=True)
+    phone = Column(String, nullable=True)
     owner = relationship("User", back_populates="orders")
 
     def set_customer(self, customer_obj):
@@ -80,7 +104,7 @@ class Order(Base):
 class Review(Base):
     __tablename__ = "reviews"
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     user_name = Column(String, default="Anonymous")
     rating = Column(Integer)
@@ -89,10 +113,105 @@ class Review(Base):
 
 class SupportMessage(Base):
     __tablename__ = "support_messages"
+    __table_args__ = (Index("ix_support_messages_status_created_at", "status", "created_at"),)
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     email = Column(String, nullable=False)
     subject = Column(String, nullable=False)
     message = Column(Text, nullable=False)
     status = Column(String, default="pending")  # pending, resolved, closed
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class SupportStatusCount(Base):
+    """Number of support messages per status, kept up to date by the write path."""
+    __tablename__ = "support_status_counts"
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class CacheVersion(Base):
+    """Version counters bumped on writes, so every worker can tell when its
+    in-memory caches (e.g. the product catalog) are stale."""
+    __tablename__ = "cache_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class JobCheckpoint(Base):
+    """How far an incremental background job has got, e.g. the last order id it processed."""
+    __tablename__ = "job_checkpoints"
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ProductPairCount(Base):
+    """Number of orders containing both products (stored in both directions)."""
+    __tablename__ = "product_pair_counts"
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    related_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class RelatedProduct(Base):
+    """Top products bought together with each product, rebuilt from ProductPairCount."""
+    __tablename__ = "related_products"
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    related_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    count = Column(Integer, nullable=False)
+
+class SalesRollup(Base):
+    """Sales per UTC hour or day, category (0 = whole orders) and order status.
+    Kept current by the order write path; see app/services/rollup_service.py."""
+    __tablename__ = "sales_rollups"
+    granularity = Column(String, primary_key=True)  # hour, day
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    category_id = Column(Integer, primary_key=True)
+    status = Column(String, primary_key=True)
+    revenue = Column(Float, nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+
+class Job(Base):
+    """A unit of background work, run by worker.py; see app/services/job_queue.py."""
+    __tablename__ = "jobs"
+    # The claim query: due jobs by status, oldest run_at first
+    __table_args__ = (Index("ix_jobs_status_run_at", "status", "run_at"),)
+    id = Column(Integer, primary_key=True)
+    task = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}")
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    # Set for jobs that must be queued at most once, e.g. one periodic run per interval
+    unique_key = Column(String, unique=True, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+class Promotion(Base):
+    """A discount rule, compiled into the price book; see app/services/pricing.py.
+
+    kind is one of:
+      percentage  percent_off on product_id
+      category    percent_off on every product in category_id
+      bundle      min_quantity units of product_id for bundle_price
+      coupon      percent_off or amount_off on the whole cart, for code,
+                  once the cart reaches min_subtotal
+    """
+    __tablename__ = "promotions"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    kind = Column(String, nullable=False)
+    percent_off = Column(Float, nullable=True)
+    amount_off = Column(Float, nullable=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=True)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=True)
+    min_quantity = Column(Integer, nullable=True)
+    bundle_price = Column(Float, nullable=True)
+    code = Column(String, unique=True, nullable=True)  # stored upper case
+    min_subtotal = Column(Float, nullable=True)
+    starts_at = Column(DateTime(timezone=True), nullable=True)
+    ends_at = Column(DateTime(timezone=True), nullable=True)
+    active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.database import get_db
+from app.models import User
+from app.routes.auth import get_current_user
+from app.services import rollup_service
+
+router = APIRouter()
+
+# Longest range per request, so an hourly query stays a few thousand rows
+MAX_BUCKETS = {"hour": 24 * 93, "day": 366 * 5}
+
+@router.get("/sales")
+def get_sales(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = "day",
+    group_by: Optional[str] = None,
+    status: Optional[str] = None,
+    category_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Admin: revenue, orders, units and average basket per hour or day in [start, end).
+    Defaults to the last 30 days. Answered from the sales rollups only."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if granularity not in rollup_service.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {rollup_service.GRANULARITIES}")
+    if group_by is not None and group_by not in rollup_service.GROUPINGS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {rollup_service.GROUPINGS}")
+    # Naive timestamps are taken as UTC
+    end = rollup_service.as_utc(end) if end else datetime.now(timezone.utc)
+    start = rollup_service.as_utc(start) if start else end - timedelta(days=30)
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start) / step > MAX_BUCKETS[granularity]:
+        raise HTTPException(status_code=400, detail=f"Range too long for {granularity} granularity")
+
+    series = rollup_service.sales_series(
+        db, start=start, end=end, granularity=granularity,
+        group_by=group_by, status=status, category_id=category_id,
+    )
+    return ORJSONResponse({
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "series": series,
+    })
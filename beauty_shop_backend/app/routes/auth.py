@@ -24,11 +24,18 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     """
     Decodes the JWT token to identify the user for protected routes like Cart and Orders.
     """
+    return user_from_token(token, db)
+
+
+def user_from_token(token: str, db: Session):
+    """Return the user a JWT access token belongs to, or raise 401."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if not token:
+        raise credentials_exception
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from typing import Optional
 from app.database import get_db
 from app.models import CartItem, Product, User
-from app.schemas import CartItemCreate
+from app.schemas import CartItemCreate, CartQuoteRequest
 from app.routes.auth import get_current_user
+from app.services.pricing import price_book
 
 router = APIRouter()
 
@@ -43,6 +46,24 @@ def view_cart(
     cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
     return cart_items
 
+@router.get("/quote")
+def quote_cart(
+    coupon: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Price the saved cart as checkout would, promotions and coupon included."""
+    lines = db.execute(
+        select(CartItem.product_id, CartItem.quantity).where(CartItem.user_id == current_user.id)
+    ).all()
+    return price_book.current(db).price_cart(lines, coupon)
+
+@router.post("/quote")
+def quote_items(payload: CartQuoteRequest, db: Session = Depends(get_db)):
+    """Price a cart kept by the client (no login needed to browse)."""
+    book = price_book.current(db)
+    return book.price_cart(book.lines([item.model_dump() for item in payload.items]), payload.coupon_code)
+
 @router.put("/{item_id}")
 def update_cart_item(
     item_id: int,
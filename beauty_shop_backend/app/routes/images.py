@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.database import get_db
+from app.models import Product, User
+from app.routes.auth import get_current_user
+from app.services import image_service
+from app.services.catalog_cache import bump_catalog_version, catalog_written
+from app.services.image_service import ImageError
+from app.services.tasks import generate_image_variants
+
+router = APIRouter()
+
+# Variants are content-addressed, so browsers and CDNs may keep them forever
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+class ImageIngestRequest(BaseModel):
+    url: str
+    product_id: Optional[int] = None
+
+
+def _image_response(request: Request, image_hash: str):
+    urls = {
+        size: str(request.url_for("get_image_variant", image_hash=image_hash, size=size))
+        for size in image_service.VARIANT_WIDTHS
+    }
+    return {"hash": image_hash, "urls": urls}
+
+
+@router.post("/")
+async def upload_image(
+    request: Request,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Admin upload. Variants are rendered by the job worker."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    data = await file.read(image_service.MAX_IMAGE_BYTES + 1)
+    try:
+        image_hash = image_service.store_original(data)
+    except ImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    generate_image_variants.enqueue(db, image_hash=image_hash)
+    db.commit()
+    return _image_response(request, image_hash)
+
+
+@router.post("/ingest")
+def ingest_image(
+    payload: ImageIngestRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Admin: ingest an image by URL, optionally pointing a product at its card variant."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        image_hash = image_service.store_original(image_service.fetch_remote(payload.url))
+    except ImageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    generate_image_variants.enqueue(db, image_hash=image_hash)
+    db.commit()
+
+    response = _image_response(request, image_hash)
+    if payload.product_id is not None:
+        product = db.query(Product).filter(Product.id == payload.product_id).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        product.image = response["urls"]["card"]
+        version = bump_catalog_version(db)
+        db.commit()
+        catalog_written(db, payload.product_id, version)
+    return response
+
+
+@router.get("/{image_hash}/{size}", name="get_image_variant")
+def get_image_variant(image_hash: str, size: str, request: Request):
+    """Serve a resized variant, WebP when the browser accepts it."""
+    if not image_service.is_valid_hash(image_hash) or size not in image_service.VARIANT_WIDTHS:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not image_service.has_original(image_hash):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    # Normally pre-rendered after ingest; render now if that has not finished
+    path = image_service.render_variant(image_hash, size, fmt)
+    return FileResponse(
+        path,
+        media_type=f"image/{fmt}",
+        headers={"Cache-Control": IMMUTABLE_CACHE, "Vary": "Accept"},
+    )
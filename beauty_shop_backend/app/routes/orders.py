@@ -1,24 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, ORJSONResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
 from pydantic import BaseModel  # Added for Option A
+from typing import List, Optional
 from app.database import get_db
 from app.models import User, Order, CartItem
-from app.routes.auth import get_current_user
-from app.utils.mpesa import initiate_stk_push
-from app.utils.invoice import generate_invoice_pdf
-from app.utils.email import send_invoice_email
-from app.schemas import OrderCreate, OrderDetailResponse
-from app.services.order_service import create_order_record, fetch_order_by_public_id
-import uuid, time
+from app.routes.auth import get_current_user, user_from_token
+from app.utils.mpesa import daraja_retry_after, initiate_stk_push
+from app.utils.invoice import invoice_key
+from app.schemas import CartQuoteItem, OrderCreate, OrderDetailResponse
+from app.services.order_service import (
+    create_order_record, fetch_order_by_public_id, insert_order, list_order_summaries, search_orders,
+)
+from app.services import invoice_export, order_events, payment_service, pricing, rollup_service
+from app.services.tasks import render_invoice, send_invoice
+from app.services.id_service import new_order_ids
+from app.services.blob_storage import get_storage
 import json
+import math
+from datetime import datetime, timedelta, timezone
+import orjson
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Comment lines sent on idle event streams so proxies keep them open
+EVENTS_KEEPALIVE_SECONDS = 15
+
 # 1. Define the schema to fetch phone number and cart items from the request body
 class CheckoutRequest(BaseModel):
     phone_number: str
-    cart_items: list = []  # Optional: items from frontend cart
+    cart_items: List[CartQuoteItem] = []  # Optional: items from frontend cart
+    coupon_code: Optional[str] = None
 
 router = APIRouter()
 
@@ -26,7 +41,6 @@ router = APIRouter()
 @router.post("/", response_model=OrderDetailResponse)
 def create_order(
     payload: OrderCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -34,29 +48,19 @@ def create_order(
     Public endpoint used by frontend to create an order.
     Returns an order object shaped like the frontend expects.
     """
-    # create order record and return structured response
-    order_obj = create_order_record(db, payload)
-    
-    # Associate order with authenticated user
-    order_obj.user_id = current_user.id
-    db.commit()
-    db.refresh(order_obj)
-
-    # Generate PDF and send email in background
+    # create the order, owner included, and queue its invoice email in one transaction
     try:
-        pdf_path = generate_invoice_pdf(order_obj.invoice_number or order_obj.public_id, order_obj.total_amount, (order_obj.get_customer() or {}).get('email'), order_obj.get_items())
-        background_tasks.add_task(send_invoice_email, recipient_email=(order_obj.get_customer() or {}).get('email'), invoice_no=order_obj.invoice_number or order_obj.public_id, pdf_path=pdf_path)
-    except Exception as e:
-        print(f"Invoice generation/email error: {e}")
-        pass
+        order = create_order_record(db, payload, user_id=current_user.id, jobs=[send_invoice])
+    except pricing.PricingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     resp = {
-        "id": order_obj.public_id,
-        "createdAt": order_obj.created_at,
-        "customer": order_obj.get_customer(),
-        "items": order_obj.get_items(),
-        "total": order_obj.total_amount,
-        "status": order_obj.status
+        "id": order["public_id"],
+        "createdAt": order["created_at"],
+        "customer": order["customer"],
+        "items": order["items"],
+        "total": order["total_amount"],
+        "status": order["status"]
     }
     return resp
 
@@ -64,30 +68,102 @@ def create_order(
 @router.get("/all", response_model=list)
 def get_all_orders(db: Session = Depends(get_db)):
     """Admin endpoint to fetch all orders."""
-    orders = db.query(Order).order_by(Order.created_at.desc()).all()
-    return [{
-        "id": order.public_id or order.id,
-        "invoice_number": order.invoice_number or f"ORD-{order.id}",
-        "total_amount": order.total_amount,
-        "status": order.status,
-        "created_at": order.created_at,
-        "customer_json": order.customer_json,
-        "items_json": order.items_json
-    } for order in orders]
+    return ORJSONResponse(list_order_summaries(db))
 
 @router.get("/", response_model=list)
 def get_user_orders(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Get orders for the authenticated user."""
-    orders = db.query(Order).filter(Order.user_id == current_user.id).order_by(Order.created_at.desc()).all()
-    return [{
-        "id": order.public_id or order.id,
-        "invoice_number": order.invoice_number or f"ORD-{order.id}",
-        "total_amount": order.total_amount,
-        "status": order.status,
-        "created_at": order.created_at,
-        "customer_json": order.customer_json,
-        "items_json": order.items_json
-    } for order in orders]
+    return ORJSONResponse(list_order_summaries(db, user_id=current_user.id))
+
+@router.get("/search")
+def search_order_list(
+    q: Optional[str] = Query(None, max_length=100),
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Admin: page through orders newest first, searching by customer email, name or phone."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        page = search_orders(db, q=q, status=status, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse(page)
+
+@router.get("/events")
+async def order_events_stream(
+    request: Request,
+    scope: str = Query("mine", pattern="^(mine|admin)$"),
+    token: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Server-sent events for order status and payment changes.
+    scope=mine streams the caller's orders, scope=admin (admins only) all
+    orders. Browsers' EventSource cannot send an Authorization header, so
+    the access token may also be passed as ?token=.
+    """
+    if token is None:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    user = await run_in_threadpool(user_from_token, token, db)
+    if scope == "admin" and not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    channels = [order_events.ADMIN_CHANNEL] if scope == "admin" else [order_events.user_channel(user.id)]
+    # Don't hold a pooled connection for the life of the stream
+    await run_in_threadpool(db.close)
+    return StreamingResponse(
+        _event_stream(channels),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _event_stream(channels):
+    subscription = order_events.broker.subscribe(channels)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            event = await subscription.get(EVENTS_KEEPALIVE_SECONDS)
+            if event is None:
+                yield b": keep-alive\n\n"
+                continue
+            data = {key: value for key, value in event.items() if key != "user_id"}
+            yield b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+    finally:
+        order_events.broker.unsubscribe(subscription)
+
+
+@router.get("/invoices/export")
+def export_invoices(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Admin: download a ZIP of the invoice PDFs of orders created in
+    [start, end), optionally only those with the given status (any case), plus a
+    manifest.csv with each order's total. Defaults to the last 30 days.
+    Streamed as it is built (see app/services/invoice_export.py).
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    # Naive timestamps are taken as UTC
+    end = rollup_service.as_utc(end) if end else datetime.now(timezone.utc)
+    start = rollup_service.as_utc(start) if start else end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    filename = f"invoices_{start:%Y%m%d}-{end:%Y%m%d}.zip"
+    return StreamingResponse(
+        invoice_export.stream_invoice_zip(db, start, end, status),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @router.get("/{order_id}", response_model=OrderDetailResponse)
 def get_order(order_id: str, db: Session = Depends(get_db)):
@@ -105,94 +181,134 @@ def get_order(order_id: str, db: Session = Depends(get_db)):
         "status": order_obj.status
     }
 
+@router.get("/{order_id}/invoice")
+def download_invoice(
+    order_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Download the invoice PDF for an order (supports Range requests)."""
+    order_obj = fetch_order_by_public_id(db, order_id)
+    if not order_obj or not order_obj.invoice_number:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    # Only the customer who placed the order or an admin; rendering is not free
+    if order_obj.user_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+
+    storage = get_storage()
+    key = invoice_key(order_obj.invoice_number)
+    if not storage.exists(key):
+        # Not rendered by the worker yet, or removed by retention cleanup
+        render_invoice(order_obj)
+
+    local_path = storage.local_path(key)
+    if local_path:
+        # Streamed from disk in chunks; Starlette handles Range/If-Range
+        return FileResponse(local_path, media_type="application/pdf",
+                            filename=f"Invoice_{order_obj.invoice_number}.pdf",
+                            content_disposition_type="inline")
+    # Let the client fetch straight from the bucket, which also serves ranges
+    return RedirectResponse(storage.presigned_url(key), status_code=307)
+
 @router.put("/{order_id}/status")
-def update_order_status(order_id: int, payload: dict, db: Session = Depends(get_db)):
-    """Update order status."""
-    order = db.query(Order).filter(Order.id == order_id).first()
+def update_order_status(order_id: str, payload: dict, db: Session = Depends(get_db)):
+    """Update order status (by numeric id or the public id shown in order listings)."""
+    if order_id.isdigit():
+        order = db.query(Order).filter(Order.id == int(order_id)).first()
+    else:
+        order = fetch_order_by_public_id(db, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    old_status = order.status
     order.status = payload.get('status', order.status)
+    rollup_service.move_order_status(db, order, old_status, order.status)
+    if order.status != old_status:
+        order_events.emit(db, order_events.order_event(order, previous_status=old_status))
     db.commit()
     return {"message": "Order status updated", "status": order.status}
 
 @router.post("/checkout")
 def checkout(
     payload: CheckoutRequest,
-    background_tasks: BackgroundTasks, 
     db: Session = Depends(get_db), 
     current_user: User = Depends(get_current_user)
 ):
     # 1. Get Phone Number from the Request
     user_phone = payload.phone_number 
 
-    # 2. Try to get cart items from database first, then from payload
-    cart_items_db = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-    
-    items_for_pdf = []
-    total = 0
+    # 2. Try to get cart items from database first, then from payload.
+    # Only product ids and quantities are taken from either; prices come
+    # from the server's price book.
+    cart_items_db = db.execute(
+        select(CartItem.product_id, CartItem.quantity).where(CartItem.user_id == current_user.id)
+    ).all()
     
     if cart_items_db:
         # Use database cart
-        for item in cart_items_db:
-            items_for_pdf.append({
-                "name": item.product.name,
-                "quantity": item.quantity,
-                "price": item.product.price
-            })
-            total += item.product.price * item.quantity
+        items = [{"id": item.product_id, "quantity": item.quantity} for item in cart_items_db]
     elif payload.cart_items:
-        # Use frontend cart from payload (items already have all details)
-        for item in payload.cart_items:
-            quantity = item.get('quantity', 1)
-            price = float(item.get('price', 0))
-            items_for_pdf.append({
-                "name": item.get('name'),
-                "quantity": quantity,
-                "price": price
-            })
-            total += price * quantity
+        # Use frontend cart from payload
+        items = [item.model_dump() for item in payload.cart_items]
     else:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
+    try:
+        quote = pricing.price_order(db, items, payload.coupon_code)
+    except pricing.PricingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items_for_pdf = quote["items"]
+    total = quote["total"]
+    
     if not items_for_pdf:
         raise HTTPException(status_code=400, detail="Cart is empty")
 
-    # 3. Generate invoice number
-    invoice_no = f"INV-{uuid.uuid4().hex[:6].upper()}"
-    
-    # 4. Save Order (don't clear database cart if using frontend cart)
-    new_order = Order(
-        user_id=current_user.id,
-        total_amount=total,
-        invoice_number=invoice_no,
-        status="pending",
-        public_id=str(uuid.uuid4())
-    )
+    # Fail fast, before an order is created, while M-Pesa is known to be down
+    retry_after = daraja_retry_after()
+    if retry_after:
+        raise HTTPException(
+            status_code=503,
+            detail="M-Pesa is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    # 3. Generate order and invoice numbers (time-sortable, collision-free)
+    public_id, invoice_no = new_order_ids()
     
-    # Store customer and items data for order confirmation page
+    # 4. Save Order (don't clear database cart if using frontend cart).
+    # Customer and items data are stored for the order confirmation page;
+    # read from current_user now, as the commit below expires it. The name
+    # is the profile's, left empty rather than made up when there is none.
     customer_data = {
-        "firstName": current_user.email.split('@')[0],
-        "lastName": "",
+        "firstName": current_user.first_name or "",
+        "lastName": current_user.last_name or "",
         "email": current_user.email,
-        "address": "",
+        "phone": user_phone,
+        "address": current_user.address or "",
         "city": "",
         "zip": ""
     }
-    new_order.set_customer(customer_data)
-    new_order.set_items(items_for_pdf)
-    
-    db.add(new_order)
+    new_order = insert_order(
+        db,
+        user_id=current_user.id,
+        total=total,
+        status="pending",
+        customer=customer_data,
+        items=items_for_pdf,
+        public_id=public_id,
+        invoice_number=invoice_no,
+        categories=quote["categories"],
+    )
     
-    # Only clear database cart if it was used
+    # Only clear database cart if it was used; same transaction as the order
     if cart_items_db:
-        db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
+        db.execute(delete(CartItem).where(CartItem.user_id == current_user.id))
+
+    # 5. The worker renders the PDF invoice and emails it; queued with the
+    # order so it is neither lost nor sent for an order that rolled back
+    send_invoice.enqueue(db, order_id=new_order["id"])
     
     db.commit()
-    db.refresh(new_order)
-
-    # 5. Generate PDF Invoice
-    pdf_path = generate_invoice_pdf(invoice_no, total, current_user.email, items_for_pdf)
 
     # 6. M-Pesa Trigger using the dynamic phone number
     try:
@@ -204,17 +320,18 @@ def checkout(
     except Exception as e:
         mpesa_response = {"error": "M-Pesa Service Unavailable", "details": str(e)}
 
-    # 7. Send Email in Background
-    background_tasks.add_task(
-        send_invoice_email, 
-        recipient_email=current_user.email, 
-        invoice_no=invoice_no, 
-        pdf_path=pdf_path
-    )
+    # The payment callback finds the order by the STK Push's CheckoutRequestID
+    if isinstance(mpesa_response, dict) and mpesa_response.get("CheckoutRequestID"):
+        db.execute(
+            update(Order)
+            .where(Order.id == new_order["id"])
+            .values(checkout_request_id=mpesa_response["CheckoutRequestID"])
+        )
+        db.commit()
 
     return {
         "message": "Checkout initiated.",
-        "order_id": new_order.public_id,
+        "order_id": new_order["public_id"],
         "order_details": {
             "invoice": invoice_no, 
             "total": total,
@@ -259,23 +376,20 @@ async def mpesa_callback(request: Request, db: Session = Depends(get_db)):
             elif name == "Amount":
                 amount = value
         
-        # Find order by invoice number from AccountReference
+        # Find the order by the CheckoutRequestID stored at checkout
         merchant_request_id = callback_data.get("Body", {}).get("stkCallback", {}).get("MerchantRequestID")
         checkout_request_id = callback_data.get("Body", {}).get("stkCallback", {}).get("CheckoutRequestID")
         
+        # Marks the order paid or failed and notifies the order event streams
+        await run_in_threadpool(
+            payment_service.record_payment_result,
+            db, checkout_request_id, result_code, result_desc, mpesa_receipt,
+        )
+        
         if result_code == 0:
             # Payment successful
             logger.info(f"Payment SUCCESS - Receipt: {mpesa_receipt}, Phone: {phone_number}, Amount: {amount}")
             
-            # TODO: Update order status in database
-            # You can store mpesa_receipt, update status to 'paid', etc.
-            # Example:
-            # order = db.query(Order).filter(Order.invoice_number == account_ref).first()
-            # if order:
-            #     order.status = "paid"
-            #     order.payment_reference = mpesa_receipt
-            #     db.commit()
-            
             return {
                 "ResultCode": 0,
                 "ResultDesc": "Success"
@@ -298,7 +412,7 @@ async def mpesa_callback(request: Request, db: Session = Depends(get_db)):
         }
 
 @router.post("/mpesa/callback")
-async def mpesa_callback(payload: dict):
+async def mpesa_callback(payload: dict, db: Session = Depends(get_db)):
     """
     M-Pesa callback endpoint.
     Safaricom sends payment confirmation here.
@@ -310,15 +424,17 @@ async def mpesa_callback(payload: dict):
         logger.info(f"M-Pesa Callback received: {json.dumps(payload, indent=2)}")
         
         # Extract callback data
-        result_code = payload.get("Body", {}).get("stkCallback", {}).get("ResultCode")
-        result_desc = payload.get("Body", {}).get("stkCallback", {}).get("ResultDesc")
+        result = payment_service.parse_stk_callback(payload)
+        result_code = result["result_code"]
+        result_desc = result["result_desc"]
+        await run_in_threadpool(
+            payment_service.record_payment_result,
+            db, result["checkout_request_id"], result_code, result_desc, result["receipt"],
+        )
         
         if result_code == 0:
             # Payment successful
             logger.info(f"Payment successful: {result_desc}")
-            # TODO: Update order status in database
-            # merchant_request_id = payload.get("Body", {}).get("stkCallback", {}).get("MerchantRequestID")
-            # checkout_request_id = payload.get("Body", {}).get("stkCallback", {}).get("CheckoutRequestID")
         else:
             # Payment failed or cancelled
             logger.warning(f"Payment failed: {result_desc}")
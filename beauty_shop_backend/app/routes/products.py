@@ -1,52 +1,160 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+import orjson
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List, Optional  # <--- Added Optional here
+from typing import List, Optional, Union  # <--- Added Optional here
 from app.database import get_db
 from app.models import Product, Category
-from app.schemas import ProductSchema
+from app.schemas import ProductBatchRequest, ProductFacetsResponse, ProductSchema
+from app.services import recommendation_service
+from app.services.catalog_cache import RELATED, bump_catalog_version, catalog_cache, catalog_written
+from app.services.facet_index import PRODUCT_COLUMNS, facet_index
+from app.services.suggest_index import suggest_index
+from app.utils.compression import PrecompressedBody
 
 router = APIRouter()
 
-@router.get("/", response_model=List[ProductSchema])
+MAX_BATCH_GET = 100
+MAX_BATCH_POST = 1000
+
+@router.get("/", response_model=Union[List[ProductSchema], ProductFacetsResponse])
 def get_products(
+    request: Request,
     category_id: Optional[int] = None, 
     search: Optional[str] = None, 
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    is_new: Optional[bool] = None,
+    in_stock: Optional[bool] = None,
+    facets: bool = False,
     db: Session = Depends(get_db)
 ):
-    query = db.query(Product)
+    """List products. Price, rating, is_new and in_stock filters (and
+    facets=true, which returns {"items", "facets"} with per-facet counts)
+    are evaluated on the in-memory columnar catalog."""
+    filters = dict(min_price=min_price, max_price=max_price, min_rating=min_rating, is_new=is_new, in_stock=in_stock)
+    if facets or any(value is not None for value in filters.values()):
+        rows, counts = facet_index.current(db).query(
+            category_id=category_id, search=search, facets=facets, **filters
+        )
+        items = [_product_dict(row) for row in rows]
+        return ORJSONResponse({"items": items, "facets": counts} if facets else items)
+    if search:
+        # Searches are too varied to cache; compressed by the middleware
+        return ORJSONResponse(_list_products(db, category_id, search))
+    # The unfiltered and per-category listings are identical for every
+    # visitor: serialize and compress them once per catalog version
+    body = catalog_cache.get(
+        db, ("products", category_id or None),
+        lambda: PrecompressedBody(orjson.dumps(_list_products(db, category_id, None))),
+    )
+    return body.response(request)
+
+
+@router.get("/categories")
+def get_categories(request: Request, db: Session = Depends(get_db)):
+    def build():
+        rows = db.execute(select(Category.id, Category.name).order_by(Category.id)).all()
+        return PrecompressedBody(orjson.dumps([{"id": row.id, "name": row.name} for row in rows]))
+    return catalog_cache.get(db, ("categories",), build).response(request)
+
+
+@router.get("/batch")
+def get_products_batch(ids: str = Query(..., max_length=2000), db: Session = Depends(get_db)):
+    """Look up several products at once: ?ids=1,2,3 (up to MAX_BATCH_GET ids)."""
+    try:
+        product_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    return _batch_lookup(db, product_ids, MAX_BATCH_GET)
+
+
+@router.post("/batch")
+def post_products_batch(payload: ProductBatchRequest, db: Session = Depends(get_db)):
+    """Same as GET /batch, for lists too long for a URL (up to MAX_BATCH_POST ids)."""
+    return _batch_lookup(db, payload.ids, MAX_BATCH_POST)
+
+
+def _batch_lookup(db, product_ids, max_ids):
+    product_ids = list(dict.fromkeys(product_ids))  # de-duplicated, request order kept
+    if len(product_ids) > max_ids:
+        raise HTTPException(status_code=400, detail=f"At most {max_ids} ids per request")
+    if facet_index.is_current(db):
+        # The columnar snapshot already holds every product row
+        found = facet_index.lookup(product_ids)
+    else:
+        # Same rows as the listing (and the snapshot)
+        query = select(*PRODUCT_COLUMNS).where(
+            Product.id.in_(product_ids),
+            Product.name.isnot(None),
+            Product.price.isnot(None),
+            Product.category_id.isnot(None),
+        )
+        found = {row.id: row for row in db.execute(query).all()} if product_ids else {}
+    return ORJSONResponse({
+        "items": [_product_dict(found[i]) for i in product_ids if i in found],
+        "missing": [i for i in product_ids if i not in found],
+    })
+
+
+@router.get("/suggest")
+def suggest_products(
+    q: str = Query("", max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+    db: Session = Depends(get_db),
+):
+    """Autocomplete: products whose name (or category) has a word starting
+    with q, best rated first. Served from an in-memory index."""
+    return ORJSONResponse(suggest_index.current(db).search(q, limit))
+
+
+def _list_products(db, category_id, search) -> list:
+    # Select plain columns instead of ORM instances: nothing here needs the
+    # identity map, and the dicts below are already in the response shape.
+    query = select(
+        Product.id,
+        Product.name,
+        Product.description,
+        Product.price,
+        Product.category_id,
+        Product.stock_quantity,
+        Product.image,
+        Product.rating,
+        Product.is_new,
+    )
     # Filter out products with NULL required fields
-    query = query.filter(
+    query = query.where(
         Product.name.isnot(None),
         Product.price.isnot(None),
         Product.category_id.isnot(None)
     )
     if category_id:
-        query = query.filter(Product.category_id == category_id)
+        query = query.where(Product.category_id == category_id)
     if search:
-        query = query.filter(Product.name.ilike(f"%{search}%"))
+        query = query.where(Product.name.ilike(f"%{search}%"))
     
-    products = query.all()
+    rows = db.execute(query).all()
+    return [_product_dict(p) for p in rows]
+
+
+def _product_dict(p) -> dict:
     category_map = {1: 'Skincare', 2: 'Haircare', 3: 'Makeup'}
-    
-    result = []
-    for p in products:
-        product_dict = {
-            'id': p.id,
-            'name': p.name,
-            'description': p.description,
-            'price': p.price,
-            'category_id': p.category_id,
-            'category': category_map.get(p.category_id, 'Unknown'),
-            'stock_quantity': p.stock_quantity,
-            'stock': p.stock_quantity,
-            'image': p.image,
-            'rating': p.rating,
-            'is_new': p.is_new,
-            'isNew': p.is_new
-        }
-        result.append(product_dict)
-    
-    return result
+    return {
+        'id': p.id,
+        'name': p.name,
+        'description': p.description,
+        'price': p.price,
+        'category_id': p.category_id,
+        'category': category_map.get(p.category_id, 'Unknown'),
+        'stock_quantity': p.stock_quantity,
+        'stock': p.stock_quantity,
+        'image': p.image,
+        'rating': p.rating,
+        'is_new': p.is_new,
+        'isNew': p.is_new
+    }
 
 
 @router.post("/", response_model=ProductSchema)
@@ -62,8 +170,10 @@ def create_product(payload: dict, db: Session = Depends(get_db)):
         is_new=payload.get('is_new', False)
     )
     db.add(new)
+    version = bump_catalog_version(db)
     db.commit()
     db.refresh(new)
+    catalog_written(db, new.id, version)
     
     category_map = {1: 'Skincare', 2: 'Haircare', 3: 'Makeup'}
     return {
@@ -105,6 +215,19 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
     }
 
 
+@router.get("/{product_id}/related")
+def get_related_products(product_id: int, request: Request, db: Session = Depends(get_db)):
+    """Products most often bought together with this one (see recommendation_service)."""
+    def build():
+        rows = recommendation_service.related_products(db, product_id)
+        if not rows and db.get(Product, product_id) is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        related = [dict(_product_dict(row), bought_together=row.count) for row in rows]
+        return PrecompressedBody(orjson.dumps(related))
+    # Refreshes bump the related-products version, which drops these entries
+    return catalog_cache.get(db, ("related", product_id), build, also=(RELATED,)).response(request)
+
+
 @router.put("/{product_id}", response_model=ProductSchema)
 def update_product(product_id: int, payload: dict, db: Session = Depends(get_db)):
     prod = db.query(Product).filter(Product.id == product_id).first()
@@ -113,8 +236,10 @@ def update_product(product_id: int, payload: dict, db: Session = Depends(get_db)
     for k, v in payload.items():
         if hasattr(prod, k) and v is not None:
             setattr(prod, k, v)
+    version = bump_catalog_version(db)
     db.commit()
     db.refresh(prod)
+    catalog_written(db, product_id, version)
     return prod
 
 
@@ -124,5 +249,7 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
     if not prod:
         raise HTTPException(status_code=404, detail="Product not found")
     db.delete(prod)
+    version = bump_catalog_version(db)
     db.commit()
+    catalog_written(db, product_id, version)
     return {"message": "Product deleted"}
\ No newline at end of file
@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models import Category, Product, Promotion, User
+from app.routes.auth import get_current_user
+from app.schemas import PromotionCreate
+from app.services import pricing
+from app.services.catalog_cache import bump_catalog_version
+from app.services.rollup_service import as_utc
+
+router = APIRouter()
+
+# Fields each kind of promotion needs (see app/models.py Promotion)
+REQUIRED = {
+    pricing.PERCENTAGE: ("product_id", "percent_off"),
+    pricing.CATEGORY: ("category_id", "percent_off"),
+    pricing.BUNDLE: ("product_id", "min_quantity", "bundle_price"),
+    pricing.COUPON: ("code",),
+}
+
+
+def _promotion_dict(row) -> dict:
+    return {column.name: getattr(row, column.name) for column in Promotion.__table__.columns}
+
+
+@router.get("/")
+def list_promotions(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Admin: every promotion, including inactive and expired ones, newest first."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    rows = db.execute(select(Promotion.__table__).order_by(Promotion.id.desc())).all()
+    return ORJSONResponse([_promotion_dict(row) for row in rows])
+
+
+@router.post("/")
+def create_promotion(
+    payload: PromotionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if payload.kind not in REQUIRED:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {pricing.KINDS}")
+    missing = [field for field in REQUIRED[payload.kind] if getattr(payload, field) is None]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"A {payload.kind} promotion needs {', '.join(missing)}")
+    if payload.kind == pricing.COUPON and (payload.percent_off is None) == (payload.amount_off is None):
+        raise HTTPException(status_code=400, detail="A coupon needs either percent_off or amount_off")
+    # Naive timestamps are taken as UTC
+    values = payload.model_dump()
+    for field in ("starts_at", "ends_at"):
+        if values[field] is not None:
+            values[field] = as_utc(values[field])
+    if values["starts_at"] and values["ends_at"] and values["starts_at"] >= values["ends_at"]:
+        raise HTTPException(status_code=400, detail="starts_at must be before ends_at")
+    if payload.product_id is not None and db.get(Product, payload.product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if payload.category_id is not None and db.get(Category, payload.category_id) is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    if values["code"] is not None:
+        values["code"] = values["code"].strip().upper()
+        taken = db.execute(select(Promotion.id).where(Promotion.code == values["code"])).first()
+        if taken:
+            raise HTTPException(status_code=400, detail="Coupon code already exists")
+
+    row = db.execute(insert(Promotion).values(**values).returning(*Promotion.__table__.columns)).one()
+    # Every worker recompiles its price book
+    bump_catalog_version(db)
+    db.commit()
+    return ORJSONResponse(_promotion_dict(row))
+
+
+@router.delete("/{promotion_id}")
+def delete_promotion(
+    promotion_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    deleted = db.execute(delete(Promotion).where(Promotion.id == promotion_id)).rowcount
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Promotion not found")
+    bump_catalog_version(db)
+    db.commit()
+    return {"message": "Promotion deleted"}
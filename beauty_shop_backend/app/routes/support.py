@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from app.database import get_db
-from app.models import SupportMessage
-from datetime import datetime
+from app.models import SupportMessage, User
+from app.routes.auth import get_current_user
+from app.services import support_service
+from typing import Optional
 
 router = APIRouter()
 
@@ -16,39 +20,74 @@ class SupportMessageCreate(BaseModel):
 @router.post("/")
 def create_support_message(payload: SupportMessageCreate, db: Session = Depends(get_db)):
     """Create a new support message from contact form"""
-    new_message = SupportMessage(
+    message_id = support_service.create_message(
+        db,
         name=payload.name,
         email=payload.email,
         subject=payload.subject,
         message=payload.message,
-        status="pending"
     )
-    db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
-    return {"message": "Support message received", "id": new_message.id}
+    return {"message": "Support message received", "id": message_id}
 
 @router.get("/")
-def get_all_support_messages(db: Session = Depends(get_db)):
-    """Get all support messages for admin"""
-    messages = db.query(SupportMessage).order_by(SupportMessage.created_at.desc()).all()
-    return [{
-        "id": msg.id,
-        "name": msg.name,
-        "email": msg.email,
-        "subject": msg.subject,
-        "message": msg.message,
-        "status": msg.status,
-        "created_at": msg.created_at
-    } for msg in messages]
+def get_all_support_messages(
+    status: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get a page of support messages for admin, newest first.
+    Message bodies are truncated; fetch /{message_id} for the full text."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        page = support_service.list_messages(
+            db, status=None if status == "all" else status, q=q, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse(page)
+
+@router.get("/{message_id}")
+def get_support_message(message_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Admin: get one support message with its full body"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    query = select(
+        SupportMessage.id,
+        SupportMessage.name,
+        SupportMessage.email,
+        SupportMessage.subject,
+        SupportMessage.message,
+        SupportMessage.status,
+        SupportMessage.created_at,
+    ).where(SupportMessage.id == message_id)
+    msg = db.execute(query).first()
+    if not msg:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return ORJSONResponse(dict(msg._mapping))
 
 @router.put("/{message_id}/status")
-def update_message_status(message_id: int, payload: dict, db: Session = Depends(get_db)):
-    """Update support message status"""
-    message = db.query(SupportMessage).filter(SupportMessage.id == message_id).first()
-    if not message:
+def update_message_status(
+    message_id: int,
+    payload: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Admin: update support message status"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    status = payload.get('status')
+    if status is not None and status not in support_service.STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid status")
+
+    if status is None:
+        current = db.execute(select(SupportMessage.status).where(SupportMessage.id == message_id)).first()
+        new_status = current.status if current else None
+    else:
+        new_status = support_service.set_message_status(db, message_id, status)
+    if new_status is None:
         raise HTTPException(status_code=404, detail="Message not found")
-    
-    message.status = payload.get('status', message.status)
-    db.commit()
-    return {"message": "Status updated", "status": message.status}
+    return {"message": "Status updated", "status": new_status}
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import User
-from typing import List, Optional
+from app.models import User, UserOrderSummary
+from app.routes.auth import get_current_user
+from app.services import user_service
+from typing import Optional
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -24,10 +28,33 @@ class UserUpdate(BaseModel):
     email: Optional[str] = None
     is_admin: Optional[bool] = None
 
-@router.get("/", response_model=List[UserResponse])
-def get_all_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    return [{"id": u.id, "email": u.email, "is_admin": u.is_admin} for u in users]
+@router.get("/")
+def get_all_users(
+    q: Optional[str] = Query(None, max_length=100),
+    is_admin: Optional[bool] = None,
+    include_summary: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Admin: page through users by id, optionally searching by email.
+    include_summary adds order_count, lifetime_spend and last_order_at."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        page = user_service.list_users(
+            db, q=q, is_admin=is_admin, include_summary=include_summary, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse(page)
+
+@router.get("/count")
+def get_user_count(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return {"count": user_service.count_users(db)}
 
 @router.post("/", response_model=UserResponse)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -68,6 +95,8 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # SQLite does not enforce the ON DELETE CASCADE
+    db.execute(delete(UserOrderSummary).where(UserOrderSummary.user_id == user_id))
     db.delete(db_user)
     db.commit()
     return {"message": "User deleted successfully"}
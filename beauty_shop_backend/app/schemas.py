@@ -34,11 +34,28 @@ class ProductSchema(BaseModel):
     isNew: Optional[bool] = None
     class Config: from_attributes = True
 
+class ProductFacetsResponse(BaseModel):
+    """The product listing with facets=true."""
+    items: List[ProductSchema]
+    facets: dict
+
+class ProductBatchRequest(BaseModel):
+    ids: List[int]
+
 # Cart
 class CartItemCreate(BaseModel):
     product_id: int
     quantity: int = 1
 
+class CartQuoteItem(BaseModel):
+    id: Optional[int] = None  # product id
+    name: Optional[str] = None  # matched when there is no id
+    quantity: int = 1
+
+class CartQuoteRequest(BaseModel):
+    items: List[CartQuoteItem] = Field(..., max_length=500)
+    coupon_code: Optional[str] = None
+
 class CartItemResponse(BaseModel):
     id: int
     product_id: int
@@ -57,6 +74,7 @@ class OrderResponse(BaseModel):
 
 # Frontend-shaped order models
 class OrderItem(BaseModel):
+    id: Optional[int] = None  # product id, used for recommendations
     name: str
     quantity: int
     price: float
@@ -73,10 +91,11 @@ class CustomerInfo(BaseModel):
 class OrderCreate(BaseModel):
     customer: CustomerInfo
     items: List[OrderItem]
-    total: float
+    total: Optional[float] = None  # ignored; the server prices the order
     paymentMethod: Optional[str] = None
     mpesaPhone: Optional[str] = None
     transactionId: Optional[str] = None
+    couponCode: Optional[str] = None
 
 class OrderDetailResponse(BaseModel):
     id: str
@@ -113,6 +132,22 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Promotions (see app/services/pricing.py)
+class PromotionCreate(BaseModel):
+    name: str
+    kind: str
+    percent_off: Optional[float] = Field(None, gt=0, le=100)
+    amount_off: Optional[float] = Field(None, gt=0)
+    product_id: Optional[int] = None
+    category_id: Optional[int] = None
+    min_quantity: Optional[int] = Field(None, ge=2)
+    bundle_price: Optional[float] = Field(None, ge=0)
+    code: Optional[str] = None
+    min_subtotal: Optional[float] = Field(None, ge=0)
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+    active: bool = True
+
 # User / Auth
 class UserProfile(BaseModel):
     id: int
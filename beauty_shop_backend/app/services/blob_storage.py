@@ -0,0 +1,321 @@
+"""
+Blob storage for generated files (invoice PDFs).
+
+Files are addressed by a key such as ``invoices/invoice_INV-123.pdf`` and
+live either on the local filesystem or in an S3-compatible bucket (AWS S3,
+Cloudflare R2, MinIO), selected with BLOB_STORAGE=local|s3. Using a bucket
+lets any instance read a file another instance wrote, which the local disk
+on Render cannot guarantee.
+
+Both backends stream: writes go through a file object and reads come back
+as an iterator of chunks, so a PDF is never held twice in memory.
+
+S3 settings: S3_ENDPOINT_URL, S3_BUCKET, S3_REGION, S3_ACCESS_KEY_ID and
+S3_SECRET_ACCESS_KEY. Requests are signed with AWS Signature V4 and use
+path-style URLs, which every S3-compatible service accepts.
+"""
+import os
+import hmac
+import time
+import hashlib
+import logging
+import tempfile
+import mimetypes
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+class BlobNotFound(FileNotFoundError):
+    """Raised when reading a key that does not exist."""
+
+
+class BlobStorage(ABC):
+    """Interface shared by the storage backends."""
+
+    @abstractmethod
+    def open_write(self, key: str):
+        """Context manager yielding a binary file object; the blob is
+        published when the block exits without an error."""
+        ...
+
+    @abstractmethod
+    def iter_read(self, key: str, chunk_size: int = CHUNK_SIZE):
+        """Yield the blob's content in chunks. Raises BlobNotFound."""
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def list(self, prefix: str):
+        """Yield (key, last_modified_timestamp) for keys under prefix."""
+        ...
+
+    def local_path(self, key: str):
+        """Filesystem path of the blob when it is stored locally, else None."""
+        return None
+
+    def presigned_url(self, key: str, expires_in: int = 300):
+        """Time-limited URL a client can download from directly, if supported."""
+        return None
+
+    def read_bytes(self, key: str) -> bytes:
+        return b"".join(self.iter_read(key))
+
+    def cleanup(self, prefix: str, max_age_seconds: float) -> int:
+        """Delete blobs under prefix older than max_age_seconds. Returns the count."""
+        cutoff = time.time() - max_age_seconds
+        expired = [key for key, modified in self.list(prefix) if modified < cutoff]
+        for key in expired:
+            self.delete(key)
+        if expired:
+            logger.info(f"Removed {len(expired)} blobs older than {max_age_seconds:.0f}s under {prefix}")
+        return len(expired)
+
+
+class LocalBlobStorage(BlobStorage):
+    """Files under a root directory (relative roots follow the working directory)."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        parts = key.split("/")
+        if not key or any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.root, *parts)
+
+    @contextmanager
+    def open_write(self, key: str):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file and rename, so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                yield f
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def iter_read(self, key: str, chunk_size: int = CHUNK_SIZE):
+        try:
+            f = open(self._path(key), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(key)
+        with f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix: str):
+        directory, _, name_prefix = prefix.rpartition("/")
+        base = os.path.join(self.root, *directory.split("/")) if directory else self.root
+        try:
+            entries = list(os.scandir(base))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if not entry.name.startswith(name_prefix) or entry.name.endswith(".tmp"):
+                continue
+            key = f"{directory}/{entry.name}" if directory else entry.name
+            if entry.is_dir():
+                yield from self.list(key + "/")
+            else:
+                yield key, entry.stat().st_mtime
+
+    def local_path(self, key: str):
+        path = self._path(key)
+        return path if os.path.isfile(path) else None
+
+
+class S3BlobStorage(BlobStorage):
+    """S3-compatible bucket accessed over its REST API."""
+
+    def __init__(self, endpoint_url: str, bucket: str, access_key: str, secret_key: str, region: str = "us-east-1"):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests  # imported on first use to keep app startup fast
+            self._session = requests.Session()
+        return self._session
+
+    # --- AWS Signature V4 ---
+
+    def _signing_key(self, date: str) -> bytes:
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (date, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        return key
+
+    def _signature(self, method, path, query, headers, payload_hash, amz_date):
+        canonical_query = "&".join(
+            f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in sorted(query.items())
+        )
+        signed_headers = ";".join(sorted(headers))
+        canonical_headers = "".join(f"{name}:{headers[name].strip()}\n" for name in sorted(headers))
+        canonical_request = "\n".join(
+            [method, path, canonical_query, canonical_headers, signed_headers, payload_hash]
+        )
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+        signature = hmac.new(self._signing_key(amz_date[:8]), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return canonical_query, scope, signed_headers, signature
+
+    def _object_path(self, key: str = "") -> str:
+        return quote(f"/{self.bucket}/{key}" if key else f"/{self.bucket}", safe="/-_.~")
+
+    def _request(self, method, key="", query=None, headers=None, data=None,
+                 payload_hash=EMPTY_SHA256, stream=False):
+        amz_date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = self._object_path(key)
+        signed = {
+            "host": urlsplit(self.endpoint_url).netloc,
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": payload_hash,
+        }
+        canonical_query, scope, signed_headers, signature = self._signature(
+            method, path, query or {}, signed, payload_hash, amz_date
+        )
+        all_headers = dict(headers or {}, **signed)
+        all_headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        url = self.endpoint_url + path + (f"?{canonical_query}" if canonical_query else "")
+        return self.session.request(method, url, headers=all_headers, data=data, stream=stream, timeout=30)
+
+    # --- Operations ---
+
+    @contextmanager
+    def open_write(self, key: str):
+        # Spool to memory, spilling to disk for large files, so the upload
+        # can be sent with a Content-Length and a signed payload hash
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+            yield spool
+            spool.seek(0)
+            digest = hashlib.sha256()
+            while chunk := spool.read(CHUNK_SIZE):
+                digest.update(chunk)
+            size = spool.tell()
+            spool.seek(0)
+            content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+            response = self._request(
+                "PUT", key, data=spool, payload_hash=digest.hexdigest(),
+                headers={"Content-Length": str(size), "Content-Type": content_type},
+            )
+            response.raise_for_status()
+
+    def iter_read(self, key: str, chunk_size: int = CHUNK_SIZE):
+        response = self._request("GET", key, stream=True)
+        with response:
+            if response.status_code == 404:
+                raise BlobNotFound(key)
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size)
+
+    def exists(self, key: str) -> bool:
+        response = self._request("HEAD", key)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        return True
+
+    def delete(self, key: str):
+        response = self._request("DELETE", key)
+        if response.status_code != 404:
+            response.raise_for_status()
+
+    def list(self, prefix: str):
+        import xml.etree.ElementTree as ET
+
+        def name(element):
+            return element.tag.rsplit("}", 1)[-1]  # drop the XML namespace
+
+        query = {"list-type": "2", "prefix": prefix}
+        while True:
+            response = self._request("GET", query=query)
+            response.raise_for_status()
+            token = None
+            for element in ET.fromstring(response.content):
+                if name(element) == "Contents":
+                    fields = {name(child): child.text for child in element}
+                    modified = datetime.fromisoformat(fields["LastModified"].replace("Z", "+00:00"))
+                    yield fields["Key"], modified.timestamp()
+                elif name(element) == "NextContinuationToken":
+                    token = element.text
+            if not token:
+                return
+            query = dict(query, **{"continuation-token": token})
+
+    def presigned_url(self, key: str, expires_in: int = 300):
+        amz_date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = self._object_path(key)
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{scope}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires_in),
+            "X-Amz-SignedHeaders": "host",
+        }
+        canonical_query, _, _, signature = self._signature(
+            "GET", path, query, {"host": urlsplit(self.endpoint_url).netloc}, "UNSIGNED-PAYLOAD", amz_date
+        )
+        return f"{self.endpoint_url}{path}?{canonical_query}&X-Amz-Signature={signature}"
+
+
+_storage = None
+
+
+def get_storage() -> BlobStorage:
+    """Return the configured storage backend (created once per process)."""
+    global _storage
+    if _storage is None:
+        backend = os.getenv("BLOB_STORAGE", "local")
+        if backend == "s3":
+            _storage = S3BlobStorage(
+                endpoint_url=os.getenv("S3_ENDPOINT_URL", "https://s3.amazonaws.com"),
+                bucket=os.environ["S3_BUCKET"],
+                access_key=os.environ["S3_ACCESS_KEY_ID"],
+                secret_key=os.environ["S3_SECRET_ACCESS_KEY"],
+                region=os.getenv("S3_REGION", "us-east-1"),
+            )
+        elif backend == "local":
+            # Defaults to the working directory, where invoices/ always lived
+            _storage = LocalBlobStorage(os.getenv("BLOB_STORAGE_DIR", "."))
+        else:
+            raise ValueError(f"Unknown BLOB_STORAGE backend: {backend}")
+    return _storage
@@ -0,0 +1,173 @@
+"""
+Per-worker cache of catalog responses, invalidated by a shared version.
+
+Product and category writes call bump_catalog_version() in their own
+transaction, which increments the "catalog" row of cache_versions. Each
+worker re-reads that row at most every CATALOG_VERSION_CHECK_INTERVAL
+seconds, so a write made through any worker is seen everywhere within that
+interval, and a cached entry is rebuilt only once per catalog version.
+Entries also expire after CATALOG_CACHE_MAX_AGE seconds, which bounds how
+long writes made outside the API (seed scripts, manual SQL) stay hidden.
+
+Data derived from orders rather than the catalog keeps its own version
+row, so refreshing it does not invalidate the rest of the catalog. Related
+products are cached under both the catalog version and RELATED's, and
+bump_related_version() moves only the latter.
+
+In-memory indexes over the catalog subclass CatalogIndex and follow the
+same version: a write made through this worker is applied to them
+incrementally (catalog_written), any other change triggers a rebuild.
+"""
+import os
+import time
+import threading
+from abc import ABC, abstractmethod
+from sqlalchemy import select
+from app.database import dialect_insert
+from app.models import CacheVersion
+
+CATALOG = "catalog"
+RELATED = "related_products"
+VERSION_CHECK_INTERVAL = float(os.getenv("CATALOG_VERSION_CHECK_INTERVAL", 1.0))
+MAX_AGE = float(os.getenv("CATALOG_CACHE_MAX_AGE", 300))
+
+
+class CatalogCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (version, built_at, value)
+        self._versions = {}  # version row name -> (version, checked_at)
+
+    def version(self, db, name=CATALOG) -> int:
+        """Current version of a cache_versions row, read from the database at most once per interval."""
+        now = time.monotonic()
+        cached = self._versions.get(name)
+        if cached is None or now - cached[1] >= VERSION_CHECK_INTERVAL:
+            version = db.execute(
+                select(CacheVersion.version).where(CacheVersion.name == name)
+            ).scalar() or 0
+            with self._lock:
+                self._versions[name] = (version, now)
+            return version
+        return cached[0]
+
+    def get(self, db, key, build, also=()):
+        """Return the cached value for key, calling build() if it is stale.
+
+        also names further version rows the value depends on, besides the
+        catalog's.
+        """
+        version = self.version(db)
+        if also:
+            version = (version, *(self.version(db, name) for name in also))
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry[0] == version and now - entry[1] < MAX_AGE:
+            return entry[2]
+        value = build()
+        with self._lock:
+            self._entries[key] = (version, now, value)
+        return value
+
+    def invalidate(self):
+        """Drop local entries and re-read the version on next use."""
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def forget_version(self, name):
+        """Re-read one version row on next use, keeping the entries."""
+        with self._lock:
+            self._versions.pop(name, None)
+
+    def clear(self):
+        """Forget everything, including index state (after the catalog was
+        replaced wholesale, e.g. between tests)."""
+        self.invalidate()
+        for index in _indexes:
+            index.version = None
+
+
+catalog_cache = CatalogCache()
+
+
+class CatalogIndex(ABC):
+    """Base for in-memory structures derived from the products table.
+
+    Subclasses implement rebuild(db), which loads everything, and
+    update(db, product_id), which refreshes one product (or drops it if it
+    no longer exists).
+    """
+
+    def __init__(self):
+        self.version = None
+        self._lock = threading.RLock()
+        _indexes.append(self)
+
+    @abstractmethod
+    def rebuild(self, db):
+        ...
+
+    @abstractmethod
+    def update(self, db, product_id: int):
+        ...
+
+    def current(self, db):
+        """Return self, rebuilt first if the catalog changed behind our back."""
+        version = catalog_cache.version(db)
+        if self.version != version:
+            with self._lock:
+                if self.version != version:
+                    self.rebuild(db)
+                    self.version = version
+        return self
+
+    def is_current(self, db) -> bool:
+        """Whether the index matches the catalog, without rebuilding it."""
+        return self.version is not None and self.version == catalog_cache.version(db)
+
+    def written(self, db, product_id: int, version: int):
+        with self._lock:
+            # Only when ours is the next version; otherwise another worker
+            # wrote too and current() will rebuild
+            if self.version is not None and self.version == version - 1:
+                self.update(db, product_id)
+                self.version = version
+
+
+_indexes = []
+
+
+def _bump(db, name) -> int:
+    stmt = dialect_insert(db)(CacheVersion).values(name=name, version=1)
+    return db.execute(stmt.on_conflict_do_update(
+        index_elements=[CacheVersion.name],
+        set_={"version": CacheVersion.version + 1},
+    ).returning(CacheVersion.version)).scalar_one()
+
+
+def bump_catalog_version(db) -> int:
+    """Mark the catalog as changed (in the caller's transaction).
+
+    Returns the new version, to pass to catalog_written after the commit.
+    """
+    version = _bump(db, CATALOG)
+    catalog_cache.invalidate()
+    return version
+
+
+def bump_related_version(db) -> int:
+    """Mark related products as changed (in the caller's transaction).
+
+    Leaves the catalog version, and so the other cached responses and the
+    in-memory indexes, alone.
+    """
+    version = _bump(db, RELATED)
+    catalog_cache.forget_version(RELATED)
+    return version
+
+
+def catalog_written(db, product_id: int, version: int):
+    """Apply a committed write of one product to this worker's indexes."""
+    for index in _indexes:
+        index.written(db, product_id, version)
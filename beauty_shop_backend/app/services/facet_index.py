@@ -0,0 +1,165 @@
+"""
+Faceted product filtering over an in-memory columnar copy of the catalog.
+
+Each filterable attribute is a NumPy array with one slot per product, so
+a filter is one vectorized comparison producing a boolean mask, and a
+filter combination is the AND of the masks. Facet counts follow the usual
+rule that a facet ignores its own filter (choosing "Skincare" still shows
+how many Makeup products would match), so each count is the AND of the
+other masks followed by a bincount or sum.
+
+Deleted products are masked out until the next rebuild; new products are
+appended, which keeps the arrays in id order like the SQL listing.
+"""
+import numpy as np
+from sqlalchemy import select
+from app.models import Product
+from app.services.catalog_cache import CatalogIndex
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended.
+# A bucket counts min <= price <= max, the same bounds as the min_price and
+# max_price filters, so a price on an edge is counted in both its buckets.
+PRICE_BUCKETS = (500, 1000, 2500, 5000)
+RATING_THRESHOLDS = (4.5, 4.0, 3.0)
+
+PRODUCT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.price,
+    Product.category_id,
+    Product.stock_quantity,
+    Product.image,
+    Product.rating,
+    Product.is_new,
+)
+
+
+def _valid(row) -> bool:
+    # Same rows as the SQL listing
+    return row.name is not None and row.price is not None and row.category_id is not None
+
+
+class FacetIndex(CatalogIndex):
+    def __init__(self):
+        super().__init__()
+        self._set_rows([])
+
+    def rebuild(self, db):
+        rows = db.execute(select(*PRODUCT_COLUMNS).order_by(Product.id)).all()
+        self._set_rows([row for row in rows if _valid(row)])
+
+    def _set_rows(self, rows):
+        with self._lock:
+            self.rows = list(rows)
+            self.positions = {row.id: i for i, row in enumerate(rows)}
+            self.alive = np.ones(len(rows), dtype=bool)
+            self.price = np.array([row.price for row in rows], dtype=np.float64)
+            self.rating = np.array([row.rating or 0 for row in rows], dtype=np.float64)
+            self.category = np.array([row.category_id for row in rows], dtype=np.int64)
+            self.stock = np.array([row.stock_quantity or 0 for row in rows], dtype=np.int64)
+            self.is_new = np.array([bool(row.is_new) for row in rows], dtype=bool)
+            self.names = np.array([row.name.lower() for row in rows], dtype=str)
+
+    def update(self, db, product_id):
+        row = db.execute(select(*PRODUCT_COLUMNS).where(Product.id == product_id)).first()
+        with self._lock:
+            i = self.positions.get(product_id)
+            if row is None or not _valid(row):
+                if i is not None:
+                    self.alive[i] = False
+                return
+            if i is None:
+                # New ids are the largest, so appending keeps id order
+                self._append(row)
+                return
+            self.rows[i] = row
+            self.alive[i] = True
+            self.price[i] = row.price
+            self.rating[i] = row.rating or 0
+            self.category[i] = row.category_id
+            self.stock[i] = row.stock_quantity or 0
+            self.is_new[i] = bool(row.is_new)
+            name = row.name.lower()
+            if len(name) > self.names.dtype.itemsize // 4:
+                # Fixed-width strings: widen rather than truncate
+                self.names = self.names.astype(f"<U{len(name)}")
+            self.names[i] = name
+
+    def _append(self, row):
+        self.positions[row.id] = len(self.rows)
+        self.rows.append(row)
+        self.alive = np.append(self.alive, True)
+        self.price = np.append(self.price, row.price)
+        self.rating = np.append(self.rating, row.rating or 0)
+        self.category = np.append(self.category, row.category_id)
+        self.stock = np.append(self.stock, row.stock_quantity or 0)
+        self.is_new = np.append(self.is_new, bool(row.is_new))
+        self.names = np.append(self.names, row.name.lower())
+
+    def lookup(self, ids) -> dict:
+        """Return {id: row} for the given ids that are in the snapshot."""
+        with self._lock:
+            positions = ((product_id, self.positions.get(product_id)) for product_id in ids)
+            return {product_id: self.rows[i] for product_id, i in positions if i is not None and self.alive[i]}
+
+    def query(self, *, category_id=None, search=None, min_price=None, max_price=None,
+              min_rating=None, is_new=None, in_stock=None, facets=False):
+        """Return (rows, facet_counts) for a filter combination.
+
+        facet_counts is None unless facets is true.
+        """
+        with self._lock:
+            everything = self.alive
+            masks = {}
+            if category_id:
+                masks["category"] = self.category == category_id
+            if search:
+                masks["search"] = np.char.find(self.names, search.lower()) >= 0
+            if min_price is not None or max_price is not None:
+                price = np.ones_like(everything)
+                if min_price is not None:
+                    price &= self.price >= min_price
+                if max_price is not None:
+                    price &= self.price <= max_price
+                masks["price"] = price
+            if min_rating is not None:
+                masks["rating"] = self.rating >= min_rating
+            if is_new is not None:
+                masks["is_new"] = self.is_new == is_new
+            if in_stock is not None:
+                masks["in_stock"] = (self.stock > 0) == in_stock
+
+            def combined(skip=None):
+                mask = everything.copy()
+                for name, m in masks.items():
+                    if name != skip:
+                        mask &= m
+                return mask
+
+            selected = combined()
+            rows = [self.rows[i] for i in np.flatnonzero(selected)]
+            if not facets:
+                return rows, None
+
+            by_category = combined("category")
+            categories, counts = np.unique(self.category[by_category], return_counts=True)
+            by_price = np.sort(self.price[combined("price")])
+            lows = np.searchsorted(by_price, (0,) + PRICE_BUCKETS, side="left")
+            highs = np.searchsorted(by_price, PRICE_BUCKETS + (np.inf,), side="right")
+            price_counts = highs - lows
+            by_rating = self.rating[combined("rating")]
+            return rows, {
+                "total": int(selected.sum()),
+                "category": {int(c): int(n) for c, n in zip(categories, counts)},
+                "price": [
+                    {"min": lo, "max": hi, "count": int(n)}
+                    for lo, hi, n in zip((0,) + PRICE_BUCKETS, PRICE_BUCKETS + (None,), price_counts)
+                ],
+                "rating": {str(t): int((by_rating >= t).sum()) for t in RATING_THRESHOLDS},
+                "is_new": int(self.is_new[combined("is_new")].sum()),
+                "in_stock": int((self.stock[combined("in_stock")] > 0).sum()),
+            }
+
+
+facet_index = FacetIndex()
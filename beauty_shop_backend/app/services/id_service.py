@@ -0,0 +1,70 @@
+"""
+Collision-free, time-sortable identifiers for orders and invoices.
+
+IDs are ULID-shaped: 128 bits written as 26 Crockford base32 characters,
+so they sort lexicographically in creation order and new rows always land
+at the right-hand edge of the B-tree index. Layout:
+
+    48 bits  milliseconds since the Unix epoch
+    16 bits  worker id (WORKER_ID env var, or random per process)
+    64 bits  per-worker sequence, randomly seeded and incremented within
+             the same millisecond so IDs from one worker never repeat
+"""
+import os
+import time
+import secrets
+import threading
+
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_SEQUENCE_MASK = (1 << 64) - 1
+
+_lock = threading.Lock()
+_worker_id = 0
+_last_ms = -1
+_sequence = 0
+
+
+def _reset_worker():
+    """Pick this process's worker id and clear the sequence state."""
+    global _worker_id, _last_ms, _sequence
+    configured = os.getenv("WORKER_ID")
+    _worker_id = int(configured) & 0xFFFF if configured else secrets.randbits(16)
+    _last_ms = -1
+    _sequence = 0
+
+
+_reset_worker()
+# Forked workers (gunicorn) must not inherit the parent's id and sequence
+os.register_at_fork(after_in_child=_reset_worker)
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(26):
+        chars.append(_ALPHABET[value & 0x1F])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def generate_id() -> str:
+    """Return a new 26-character, monotonically increasing ID."""
+    global _last_ms, _sequence
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _sequence = secrets.randbits(63)  # leave headroom to increment
+        else:
+            # Same millisecond (or clock went backwards): keep the last
+            # timestamp and bump the sequence so ordering is preserved
+            _sequence = (_sequence + 1) & _SEQUENCE_MASK
+            if _sequence == 0:
+                _last_ms += 1
+        value = (_last_ms << 80) | (_worker_id << 64) | _sequence
+    return _encode(value)
+
+
+def new_order_ids():
+    """Return (public_id, invoice_number) for a new order, sharing one ID."""
+    uid = generate_id()
+    return f"ORD-{uid}", f"INV-{uid}"
@@ -0,0 +1,171 @@
+"""
+Product image ingest and resized variant cache.
+
+Originals are stored once under IMAGE_CACHE_DIR/<sha256>/ (content
+addressed, so re-uploading the same picture is free), and fixed-width
+JPEG and WebP variants are rendered next to them with Pillow. Because a
+hash never changes content, variants can be served with immutable cache
+headers.
+"""
+import os
+import re
+import socket
+import hashlib
+import logging
+import tempfile
+import ipaddress
+from urllib.parse import urljoin, urlsplit
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = os.getenv(
+    "IMAGE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "media", "images"),
+)
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", 10 * 1024 * 1024))
+MAX_REDIRECTS = 5
+
+# Variant name -> target width in pixels (height keeps the aspect ratio)
+VARIANT_WIDTHS = {"thumb": 160, "card": 480, "full": 1200}
+FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True})}
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ImageError(ValueError):
+    """Raised for images that cannot be ingested or rendered."""
+
+
+def is_valid_hash(image_hash: str) -> bool:
+    return bool(_HASH_RE.match(image_hash))
+
+
+def _image_dir(image_hash: str) -> str:
+    return os.path.join(IMAGE_CACHE_DIR, image_hash)
+
+
+def _original_path(image_hash: str) -> str:
+    return os.path.join(_image_dir(image_hash), "original")
+
+
+def variant_path(image_hash: str, size: str, fmt: str) -> str:
+    return os.path.join(_image_dir(image_hash), f"{size}.{fmt}")
+
+
+def _atomic_write(path: str, writer):
+    """Write via a temp file and rename, so readers never see partial files."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def store_original(data: bytes) -> str:
+    """Validate and store an uploaded image. Returns its content hash."""
+    from PIL import Image, UnidentifiedImageError
+    from io import BytesIO
+
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ImageError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.verify()
+    except (UnidentifiedImageError, OSError) as e:
+        raise ImageError(f"Not a valid image: {e}")
+
+    image_hash = hashlib.sha256(data).hexdigest()
+    if not os.path.exists(_original_path(image_hash)):
+        _atomic_write(_original_path(image_hash), lambda f: f.write(data))
+    return image_hash
+
+
+def _check_public_url(url: str):
+    """Refuse URLs that are not http(s) or whose host resolves to a non-public address.
+
+    Keeps ingest from reaching the internal network or the cloud metadata
+    service (loopback, private, link-local and reserved ranges).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ImageError("Only http(s) image URLs can be ingested")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError):
+        raise ImageError("Could not download image")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            logger.warning(f"Image ingest refused {url}: {parts.hostname} resolves to {address}")
+            raise ImageError("Image URL must point to a public host")
+
+
+def fetch_remote(url: str) -> bytes:
+    """Download an image by URL (e.g. an existing Unsplash product image).
+
+    Redirects are followed by hand so every hop is checked like the first.
+    """
+    import requests  # imported on first use to keep app startup fast
+
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            _check_public_url(url)
+            with requests.get(url, stream=True, timeout=15, allow_redirects=False) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers["location"])
+                    continue
+                response.raise_for_status()
+                chunks, size = [], 0
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > MAX_IMAGE_BYTES:
+                        raise ImageError(f"Image is larger than {MAX_IMAGE_BYTES} bytes")
+                    chunks.append(chunk)
+                return b"".join(chunks)
+    except requests.exceptions.RequestException as e:
+        # The details stay in the log; they can describe hosts the caller cannot see
+        logger.warning(f"Image ingest of {url} failed: {e}")
+        raise ImageError("Could not download image")
+    raise ImageError("Too many redirects")
+
+
+def has_original(image_hash: str) -> bool:
+    return os.path.exists(_original_path(image_hash))
+
+
+def render_variant(image_hash: str, size: str, fmt: str) -> str:
+    """Render one variant if it is not cached yet. Returns its path."""
+    from PIL import Image, ImageOps
+
+    path = variant_path(image_hash, size, fmt)
+    if os.path.exists(path):
+        return path
+
+    pil_format, options = FORMATS[fmt]
+    width = VARIANT_WIDTHS[size]
+    with Image.open(_original_path(image_hash)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA") or fmt == "jpeg":
+            img = img.convert("RGB")
+        if img.width > width:
+            img.thumbnail((width, width * 10), Image.LANCZOS)
+        _atomic_write(path, lambda f: img.save(f, pil_format, **options))
+    return path
+
+
+def generate_variants(image_hash: str):
+    """Render every size/format variant (run in the background after ingest)."""
+    for size in VARIANT_WIDTHS:
+        for fmt in FORMATS:
+            try:
+                render_variant(image_hash, size, fmt)
+            except Exception as e:
+                logger.error(f"Failed to render {size}.{fmt} for image {image_hash}: {e}")
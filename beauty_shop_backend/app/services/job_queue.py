@@ -0,0 +1,294 @@
+"""
+Durable background jobs.
+
+Jobs are rows in the jobs table, so they survive restarts and can be
+queued in the same transaction as the data they act on (an order and its
+invoice email commit or roll back together). Web workers only enqueue;
+worker.py claims due jobs and runs them in a thread pool.
+
+Claiming is one UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED)
+on Postgres, so any number of worker processes can poll the same table
+without handing out a job twice. SQLite ignores FOR UPDATE, but it runs
+the whole UPDATE under its single write lock, which gives the same
+guarantee for tests and local use.
+
+A failed job is retried with exponential backoff until it has made
+max_attempts attempts, then kept with status "dead" for inspection (see
+retry_dead_jobs). A job whose worker died mid-run is handed out again once
+its lease expires. Tasks declared with every=<seconds> are queued once per
+interval by whichever worker gets there first.
+"""
+import os
+import json
+import random
+import signal
+import socket
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, delete, or_, select, update
+from app.database import SessionLocal, dialect_insert
+from app.models import Job
+from app.utils.metrics import JOB_LATENCY
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, DEAD = "queued", "running", "done", "dead"
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", 10))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", 3600))
+# A running job not finished within this long is assumed lost with its worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 600))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", 4))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+# Finished jobs are purged after this many days; dead ones are kept
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", 7))
+
+TASKS = {}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Task:
+    def __init__(self, fn, name, max_attempts, every):
+        self.fn = fn
+        self.name = name
+        self.max_attempts = max_attempts
+        self.every = every
+
+    def __call__(self, db, **payload):
+        return self.fn(db, **payload)
+
+    def enqueue(self, db, *, run_at=None, delay=None, unique_key=None, **payload):
+        """Queue a run in the caller's transaction (nothing happens until it commits)."""
+        return enqueue(db, self.name, payload, run_at=run_at, delay=delay,
+                       unique_key=unique_key, max_attempts=self.max_attempts)
+
+
+def task(name, *, max_attempts=None, every=None):
+    """Register fn(db, **payload) as a job task.
+
+    every (seconds) also schedules it periodically. The payload must be
+    JSON-serializable. The task commits its own work; raising makes the
+    job retry.
+    """
+    def decorator(fn):
+        TASKS[name] = Task(fn, name, max_attempts or JOB_MAX_ATTEMPTS, every)
+        return TASKS[name]
+    return decorator
+
+
+def enqueue(db, task_name, payload=None, *, run_at=None, delay=None, unique_key=None, max_attempts=None):
+    """Insert a job without committing.
+
+    With unique_key, a job already queued under that key wins and nothing
+    is inserted.
+    """
+    if run_at is None:
+        run_at = _now() + timedelta(seconds=delay or 0)
+    values = {
+        "task": task_name,
+        "payload": json.dumps(payload or {}),
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts or JOB_MAX_ATTEMPTS,
+        "run_at": run_at,
+        "unique_key": unique_key,
+    }
+    stmt = dialect_insert(db)(Job).values(**values)
+    if unique_key is not None:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Job.unique_key])
+    db.execute(stmt)
+
+
+def backoff(attempts: int) -> float:
+    """Seconds to wait before retry number `attempts`, with jitter."""
+    delay = min(JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), JOB_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim(db, worker_id: str, limit: int) -> list:
+    """Lock up to limit due jobs for worker_id and commit. Returns their rows."""
+    now = _now()
+    expired = now - timedelta(seconds=JOB_LEASE_SECONDS)
+    # Lost jobs that used up their attempts are not handed out again
+    db.execute(
+        update(Job)
+        .where(Job.status == RUNNING, Job.locked_at < expired, Job.attempts >= Job.max_attempts)
+        .values(status=DEAD, last_error="Lease expired", locked_by=None, finished_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    due = (
+        select(Job.id)
+        .where(or_(
+            and_(Job.status == QUEUED, Job.run_at <= now),
+            and_(Job.status == RUNNING, Job.locked_at < expired),
+        ))
+        .order_by(Job.run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(Job)
+        .where(Job.id.in_(due))
+        .values(status=RUNNING, locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id, Job.task, Job.payload, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return rows
+
+
+def _finish(db, job, worker_id, error=None):
+    now = _now()
+    if error is None:
+        values = {"status": DONE, "finished_at": now, "last_error": None}
+    elif job.attempts >= job.max_attempts:
+        values = {"status": DEAD, "finished_at": now, "last_error": error}
+    else:
+        values = {"status": QUEUED, "run_at": now + timedelta(seconds=backoff(job.attempts)), "last_error": error}
+    # Only if the lease is still ours; otherwise another worker has the job now
+    db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.locked_by == worker_id)
+        .values(locked_by=None, locked_at=None, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return values["status"]
+
+
+def run_job(job, worker_id: str, session_factory=SessionLocal) -> str:
+    """Run one claimed job in its own session. Returns its new status."""
+    start = time.perf_counter()
+    with session_factory() as db:
+        error = None
+        task_ = TASKS.get(job.task)
+        try:
+            if task_ is None:
+                raise LookupError(f"Unknown task {job.task!r}")
+            task_(db, **json.loads(job.payload))
+        except Exception as e:
+            db.rollback()
+            error = f"{type(e).__name__}: {e}"
+            logger.warning(f"Job {job.id} ({job.task}) attempt {job.attempts} failed: {error}")
+        status = _finish(db, job, worker_id, error)
+    if status == DEAD:
+        logger.error(f"Job {job.id} ({job.task}) dead after {job.attempts} attempts: {error}")
+    JOB_LATENCY.labels(task=job.task, outcome=status).observe(time.perf_counter() - start)
+    return status
+
+
+def schedule_periodic(db, now=None, scheduled=None) -> int:
+    """Queue the current interval's run of every periodic task and commit.
+
+    scheduled ({task: interval number}) remembers what this process has
+    already queued, to skip the insert until the next interval. Returns
+    the number of tasks considered.
+    """
+    now = now or _now()
+    count = 0
+    for task_ in TASKS.values():
+        if not task_.every:
+            continue
+        slot = int(now.timestamp() // task_.every)
+        if scheduled is not None and scheduled.get(task_.name) == slot:
+            continue
+        task_.enqueue(
+            db,
+            run_at=datetime.fromtimestamp(slot * task_.every, timezone.utc),
+            unique_key=f"{task_.name}:{slot}",
+        )
+        if scheduled is not None:
+            scheduled[task_.name] = slot
+        count += 1
+    db.commit()
+    return count
+
+
+def run_pending(session_factory=SessionLocal, worker_id=None, limit=100) -> int:
+    """Claim and run due jobs in this thread until none are left. Returns the count."""
+    worker_id = worker_id or _worker_id()
+    count = 0
+    while True:
+        with session_factory() as db:
+            jobs = claim(db, worker_id, limit)
+        if not jobs:
+            return count
+        for job in jobs:
+            run_job(job, worker_id, session_factory)
+        count += len(jobs)
+
+
+def retry_dead_jobs(db, task_name=None) -> int:
+    """Give dead jobs a fresh set of attempts and commit. Returns the count."""
+    query = (
+        update(Job)
+        .where(Job.status == DEAD)
+        .values(status=QUEUED, attempts=0, run_at=_now(), finished_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    if task_name is not None:
+        query = query.where(Job.task == task_name)
+    count = db.execute(query).rowcount
+    db.commit()
+    return count
+
+
+def purge_finished_jobs(db, max_age_days=None) -> int:
+    days = JOB_RETENTION_DAYS if max_age_days is None else max_age_days
+    cutoff = _now() - timedelta(days=days)
+    count = db.execute(
+        delete(Job).where(Job.status == DONE, Job.finished_at < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return count
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class Worker:
+    """Polls for due jobs and runs up to `concurrency` of them at a time."""
+
+    def __init__(self, concurrency=JOB_WORKER_CONCURRENCY, poll_interval=JOB_POLL_INTERVAL,
+                 session_factory=SessionLocal):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.session_factory = session_factory
+        self.worker_id = _worker_id()
+        self.stopping = threading.Event()
+        self._scheduled = {}
+
+    def stop(self, *_):
+        self.stopping.set()
+
+    def run(self):
+        """Run until SIGTERM/SIGINT, then let the running jobs finish."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info(f"Worker {self.worker_id}: {self.concurrency} threads, tasks: {', '.join(sorted(TASKS))}")
+        in_flight = set()
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="job") as pool:
+            while not self.stopping.is_set():
+                in_flight = {f for f in in_flight if not f.done()}
+                claimed = []
+                try:
+                    with self.session_factory() as db:
+                        schedule_periodic(db, scheduled=self._scheduled)
+                        if len(in_flight) < self.concurrency:
+                            claimed = claim(db, self.worker_id, self.concurrency - len(in_flight))
+                except Exception as e:
+                    logger.error(f"Worker {self.worker_id}: polling failed: {e}")
+                for job in claimed:
+                    in_flight.add(pool.submit(run_job, job, self.worker_id, self.session_factory))
+                if not claimed:
+                    self.stopping.wait(self.poll_interval)
+        logger.info(f"Worker {self.worker_id} stopped")
@@ -0,0 +1,204 @@
+"""
+Order status and payment events for the /api/orders/events stream.
+
+Writers call emit(db, event) inside the transaction that changes the
+order; the event is delivered only if that transaction commits. Every
+event goes to the "admin" channel and to "user:<owner id>".
+
+On Postgres, emit() issues pg_notify(), which the database delivers on
+commit to every worker LISTENing on ORDER_EVENTS_CHANNEL, including the
+one that emitted it; each worker runs one listener thread (start_listener)
+and fans notifications out to its own subscribers. On other databases
+(SQLite in tests and local single-process runs) events are published to
+the local subscribers right after commit.
+
+Streams carry deltas only. A subscriber that falls MAX_QUEUED events
+behind gets a "resync" event and should refetch.
+"""
+import os
+import json
+import asyncio
+import logging
+import selectors
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import event as sa_event, func, select
+from sqlalchemy.orm import Session
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+ORDER_EVENTS_CHANNEL = "order_events"
+ADMIN_CHANNEL = "admin"
+MAX_QUEUED = int(os.getenv("ORDER_EVENTS_MAX_QUEUED", 100))
+_PENDING = "pending_order_events"
+
+
+def user_channel(user_id) -> str:
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """One stream's queue, fed from any thread via its event loop."""
+
+    def __init__(self, channels, loop):
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(MAX_QUEUED)
+        self.overflowed = False
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """Return the next event, {"type": "resync"} after an overflow, or None on timeout."""
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return {"type": "resync"}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class OrderEventBroker:
+    """In-process fan-out of events to the subscriptions of their channels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = defaultdict(set)
+
+    def subscribe(self, channels) -> Subscription:
+        subscription = Subscription(tuple(channels), asyncio.get_running_loop())
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._channels[channel].discard(subscription)
+                if not self._channels[channel]:
+                    del self._channels[channel]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({s for subs in self._channels.values() for s in subs})
+
+    def publish(self, event):
+        """Deliver event to the admin channel and its owner's channel (thread-safe)."""
+        channels = [ADMIN_CHANNEL]
+        if event.get("user_id") is not None:
+            channels.append(user_channel(event["user_id"]))
+        with self._lock:
+            targets = {s for channel in channels for s in self._channels.get(channel, ())}
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:  # loop closed under a stream being torn down
+                pass
+
+
+broker = OrderEventBroker()
+
+
+def _is_postgres(db) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def emit(db, event):
+    """Queue an event for delivery when db's transaction commits."""
+    if _is_postgres(db):
+        db.execute(select(func.pg_notify(ORDER_EVENTS_CHANNEL, json.dumps(event, default=str))))
+    else:
+        db.connection()  # in a transaction, so a rollback discards the event
+        db.info.setdefault(_PENDING, []).append(event)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    for event in session.info.pop(_PENDING, ()):
+        broker.publish(event)
+
+
+@sa_event.listens_for(Session, "after_soft_rollback")
+def _drop_pending(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+
+
+class _Listener(threading.Thread):
+    """LISTENs on a dedicated connection and publishes what arrives."""
+
+    def __init__(self):
+        super().__init__(name="order-events-listener", daemon=True)
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error(f"Order events listener failed, reconnecting: {e}")
+                self.stopping.wait(1)
+
+    def _listen(self):
+        connection = engine.raw_connection()
+        try:
+            dbapi = connection.driver_connection
+            dbapi.autocommit = True
+            with dbapi.cursor() as cursor:
+                cursor.execute(f"LISTEN {ORDER_EVENTS_CHANNEL}")
+            selector = selectors.DefaultSelector()
+            selector.register(dbapi, selectors.EVENT_READ)
+            while not self.stopping.is_set():
+                # Wake up now and then to notice stop()
+                if not selector.select(timeout=5):
+                    continue
+                dbapi.poll()
+                while dbapi.notifies:
+                    notify = dbapi.notifies.pop(0)
+                    try:
+                        broker.publish(json.loads(notify.payload))
+                    except ValueError:
+                        logger.warning(f"Ignoring malformed order event: {notify.payload[:200]}")
+        finally:
+            connection.invalidate()  # it was switched to autocommit; never pool it again
+
+
+_listener = None
+
+
+def start_listener():
+    """Start this worker's LISTEN thread (Postgres only; idempotent)."""
+    global _listener
+    if engine.dialect.name != "postgresql" or _listener is not None:
+        return
+    _listener = _Listener()
+    _listener.start()
+
+
+def stop_listener(timeout=6):
+    global _listener
+    if _listener is not None:
+        _listener.stopping.set()
+        _listener.join(timeout)
+        _listener = None
+
+
+def order_event(order, type_="order_status", **extra) -> dict:
+    """Build the event for an Order row (public id, as in the order listings)."""
+    return {
+        "type": type_,
+        "id": order.public_id or order.id,
+        "user_id": order.user_id,
+        "status": order.status,
+        "at": datetime.now(timezone.utc).isoformat(),
+        **extra,
+    }
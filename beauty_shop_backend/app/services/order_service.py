@@ -1,47 +1,254 @@
-import time
+import re
 import json
-from app.models import Order
+from sqlalchemy import func, insert, or_, select, tuple_, update
+from app.database import dialect_insert
+from app.models import Order, UserOrderSummary
+from app.services import pricing, rollup_service
+from app.services.id_service import new_order_ids
+from app.utils.helpers import normalize_phone
+from app.utils.pagination import decode_cursor, encode_cursor, parse_timestamp_key, timestamp_key
+from app.utils.search import MIN_SUBSTRING_SEARCH, escape_like
 
+BACKFILL_BATCH_SIZE = 1000
+_PHONE_QUERY = re.compile(r"\+?\d+")
 
-def create_order_record(db, payload):
-    """Create and persist an Order from frontend-shaped payload.
-    Returns the Order ORM object.
+
+def customer_columns(customer) -> dict:
+    """The searchable customer_email, customer_name and phone of a customer dict."""
+    customer = customer or {}
+    email = (customer.get("email") or "").strip().lower()
+    name = " ".join(
+        part.strip() for part in (customer.get("firstName"), customer.get("lastName")) if part and part.strip()
+    )
+    return {
+        "customer_email": email or None,
+        "customer_name": name or None,
+        "phone": normalize_phone(customer.get("phone") or customer.get("mpesaPhone")),
+    }
+
+
+def insert_order(db, *, user_id, total, status, customer, items, public_id=None, invoice_number=None,
+                 categories=None):
+    """Insert a complete order row in one statement, without committing.
+
+    Uses INSERT ... RETURNING to read back the generated id and the server
+    default created_at, so no refresh query is needed. The caller owns the
+    transaction and can batch more statements (e.g. clearing the cart)
+    before a single commit. Also folds the order into the owner's
+    UserOrderSummary row and the sales rollups (categories is passed on to
+    rollup_service.add_order). Returns the order as a plain dict.
     """
-    public_id = f"ORD-{int(time.time() * 1000)}"
+    if public_id is None:
+        public_id, invoice_number = new_order_ids()
+    values = {
+        "user_id": user_id,
+        "public_id": public_id,
+        "invoice_number": invoice_number,
+        "total_amount": total,
+        "status": status,
+        "customer_json": json.dumps(customer),
+        "items_json": json.dumps(items),
+        **customer_columns(customer),
+    }
+    row = db.execute(
+        insert(Order).values(**values).returning(Order.id, Order.created_at)
+    ).one()
+    if user_id is not None:
+        _add_to_user_summary(db, user_id, total, row.created_at)
+    rollup_service.add_order(
+        db, created_at=row.created_at, status=status, items=items, total=total, categories=categories,
+    )
+    return {
+        "id": row.id,
+        "created_at": row.created_at,
+        "public_id": public_id,
+        "invoice_number": invoice_number,
+        "total_amount": total,
+        "status": status,
+        "user_id": user_id,
+        "customer": customer,
+        "items": items,
+    }
+
+
+def _add_to_user_summary(db, user_id, total, created_at):
+    stmt = dialect_insert(db)(UserOrderSummary).values(
+        user_id=user_id, order_count=1, lifetime_spend=total or 0, last_order_at=created_at,
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserOrderSummary.user_id],
+        set_={
+            "order_count": UserOrderSummary.order_count + 1,
+            "lifetime_spend": UserOrderSummary.lifetime_spend + stmt.excluded.lifetime_spend,
+            "last_order_at": stmt.excluded.last_order_at,
+        },
+    ))
 
+
+def create_order_record(db, payload, user_id=None, jobs=()):
+    """Create and persist an Order from frontend-shaped payload, priced
+    server-side (see app/services/pricing.py).
+    The owner is written with the row, in a single transaction, together
+    with a run of each background task in jobs (called with order_id).
+    Returns the order as a dict (see insert_order).
+    """
     # Set status based on payment method
     status = 'Paid' if payload.paymentMethod == 'mpesa' else 'Processing'
 
-    new_order = Order(
-        public_id=public_id,
-        total_amount=payload.total,
-        status=status,
-        invoice_number=f"INV-{public_id[-8:]}"
-    )
     # store customer json with payment info
-    customer_data = payload.customer.dict()
+    customer_data = payload.customer.model_dump()
     customer_data['paymentMethod'] = payload.paymentMethod
     if payload.paymentMethod == 'mpesa' and hasattr(payload, 'mpesaPhone'):
         customer_data['mpesaPhone'] = payload.mpesaPhone
     if hasattr(payload, 'transactionId'):
         customer_data['transactionId'] = payload.transactionId
-    
-    new_order.set_customer(customer_data)
-
-    # ensure items include totalPrice
-    items = []
-    for it in payload.items:
-        item = it.dict()
-        if 'totalPrice' not in item or item['totalPrice'] is None:
-            item['totalPrice'] = item.get('price', 0) * item.get('quantity', 1)
-        items.append(item)
-    new_order.set_items(items)
-
-    db.add(new_order)
+
+    # Prices, discounts and the total come from the price book; the
+    # client's are ignored (raises pricing.PricingError)
+    quote = pricing.price_order(db, [it.model_dump() for it in payload.items], payload.couponCode)
+    if quote['coupon']:
+        customer_data['coupon'] = quote['coupon']
+
+    order = insert_order(
+        db,
+        user_id=user_id,
+        total=quote['total'],
+        status=status,
+        customer=customer_data,
+        items=quote['items'],
+        categories=quote['categories'],
+    )
+    for job in jobs:
+        job.enqueue(db, order_id=order["id"])
     db.commit()
-    db.refresh(new_order)
-    return new_order
+    return order
 
 
 def fetch_order_by_public_id(db, public_id: str):
     return db.query(Order).filter(Order.public_id == public_id).first()
+
+
+def list_order_summaries(db, user_id=None):
+    """Return order list rows as plain dicts, newest first.
+
+    Selects only the listed columns as Core rows so large listings do not
+    load ORM instances into the session. Pass ``user_id`` to restrict the
+    listing to one customer.
+    """
+    query = select(
+        Order.id,
+        Order.public_id,
+        Order.invoice_number,
+        Order.total_amount,
+        Order.status,
+        Order.created_at,
+        Order.customer_json,
+        Order.items_json,
+    )
+    if user_id is not None:
+        query = query.where(Order.user_id == user_id)
+    query = query.order_by(Order.created_at.desc())
+
+    return [{
+        "id": row.public_id or row.id,
+        "invoice_number": row.invoice_number or f"ORD-{row.id}",
+        "total_amount": row.total_amount,
+        "status": row.status,
+        "created_at": row.created_at,
+        "customer_json": row.customer_json,
+        "items_json": row.items_json
+    } for row in db.execute(query)]
+
+
+def backfill_customer_columns(db, batch_size=BACKFILL_BATCH_SIZE) -> int:
+    """Fill the customer columns of orders written before they existed.
+
+    Walks the orders by id and commits after every batch, so the table is
+    never locked for long. Safe to run again. Returns the number of orders
+    filled.
+    """
+    last_id, filled = 0, 0
+    while True:
+        rows = db.execute(
+            select(Order.id, Order.customer_json)
+            .where(Order.id > last_id, Order.customer_email.is_(None), Order.customer_json.isnot(None))
+            .order_by(Order.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return filled
+        values = [{"id": row.id, **customer_columns(json.loads(row.customer_json))} for row in rows]
+        # ORM bulk UPDATE by primary key: one executemany per batch
+        db.execute(update(Order), values)
+        db.commit()
+        filled += len(values)
+        last_id = rows[-1].id
+
+
+def _customer_search(db, q: str):
+    term = q.strip().lower()
+    if len(term) < MIN_SUBSTRING_SEARCH:
+        # Too short for the trigram indexes; prefix of the email only
+        return Order.customer_email.like(escape_like(term) + "%", escape="\\")
+    pattern = "%" + escape_like(term) + "%"
+    if db.get_bind().dialect.name == "postgresql":
+        name = Order.customer_name.ilike(pattern, escape="\\")
+    else:
+        name = func.lower(Order.customer_name).like(pattern, escape="\\")
+    clauses = [Order.customer_email.like(pattern, escape="\\"), name]
+    if _PHONE_QUERY.fullmatch(term):
+        clauses.append(Order.phone.like("%" + escape_like(normalize_phone(term)) + "%", escape="\\"))
+    return or_(*clauses)
+
+
+def search_orders(db, *, q=None, status=None, cursor=None, limit=50) -> dict:
+    """Return one page of orders matching a customer search, newest first.
+
+    q matches the customer's email, name or phone: a prefix of the email
+    for one or two characters, a substring of any of them from three on
+    (served by the trigram indexes on Postgres). Phone numbers may be
+    given as 07... or 254.... status matches in any case. Raises
+    ValueError for a malformed cursor.
+    """
+    sort_key = timestamp_key(db, Order.created_at)
+    query = select(
+        Order.id,
+        Order.public_id,
+        Order.invoice_number,
+        Order.total_amount,
+        Order.status,
+        Order.created_at,
+        Order.customer_email,
+        Order.customer_name,
+        Order.phone,
+        sort_key.label("sort_key"),
+    ).order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
+
+    if q and q.strip():
+        query = query.where(_customer_search(db, q))
+    if status:
+        query = query.where(func.lower(Order.status) == status.lower())
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, 2)
+        try:
+            after = tuple_(parse_timestamp_key(db, created_at), int(last_id))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        query = query.where(tuple_(sort_key, Order.id) < after)
+
+    rows = db.execute(query).all()
+    page = rows[:limit]
+    items = [{
+        "id": row.public_id or row.id,
+        "invoice_number": row.invoice_number or f"ORD-{row.id}",
+        "total_amount": row.total_amount,
+        "status": row.status,
+        "created_at": row.created_at,
+        "customer_email": row.customer_email,
+        "customer_name": row.customer_name,
+        "phone": row.phone,
+    } for row in page]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(page[-1].sort_key, page[-1].id)
+    return {"items": items, "next_cursor": next_cursor}
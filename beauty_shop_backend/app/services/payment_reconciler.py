@@ -0,0 +1,149 @@
+"""
+Reconciliation of M-Pesa payments whose callback never arrived.
+
+Checkout leaves an order pending until Daraja's callback settles it. When
+a callback is lost, the reconciler finds out instead. It selects orders
+still pending RECONCILE_AFTER_SECONDS after their STK Push, oldest first
+(through ix_orders_status_created_at), and asks the STK Push Query API
+about each. Orders Daraja has an outcome for are settled in batches with
+payment_service.settle_payments. Orders Daraja still has no outcome for
+once they are PAYMENT_EXPIRE_AFTER_SECONDS old are marked expired. Orders
+without a CheckoutRequestID never reached M-Pesa (the STK Push failed or the
+breaker refused it): there is nothing to ask Daraja, so they are marked
+expired once PAYMENT_EXPIRE_AFTER_SECONDS old.
+
+Queries run RECONCILE_CONCURRENCY at a time, at most RECONCILE_RATE per
+second, through the M-Pesa circuit breaker and bulkhead. A run stops as
+soon as the breaker refuses a query and leaves the rest for the next run;
+nothing expires while Daraja is down. The same goes for error answers
+such as a rejected access token: only orders Daraja says are still being
+processed, or does not know, ever expire. It runs as the periodic
+reconcile_payments task (app/services/tasks.py).
+"""
+import os
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, tuple_
+from app.models import Order
+from app.services.payment_service import EXPIRED, PAID, PAYMENT_FAILED, PENDING, settle_payments
+from app.services.rollup_service import as_utc
+from app.utils import mpesa
+from app.utils.circuit_breaker import RateLimiter
+from app.utils.metrics import PAYMENTS_RECONCILED
+from app.utils.pagination import timestamp_key
+
+logger = logging.getLogger(__name__)
+
+# Callbacks normally arrive within a minute of the STK Push
+RECONCILE_AFTER_SECONDS = float(os.getenv("PAYMENT_RECONCILE_AFTER_SECONDS", 120))
+PAYMENT_EXPIRE_AFTER_SECONDS = float(os.getenv("PAYMENT_EXPIRE_AFTER_SECONDS", 3600))
+RECONCILE_CONCURRENCY = int(os.getenv("PAYMENT_RECONCILE_CONCURRENCY", 4))
+# STK Push Query calls per second, well under Daraja's per-app quota
+RECONCILE_RATE = float(os.getenv("PAYMENT_RECONCILE_RATE", 5))
+RECONCILE_BATCH_SIZE = int(os.getenv("PAYMENT_RECONCILE_BATCH_SIZE", 100))
+# Keeps a run within its job lease (JOB_LEASE_SECONDS) at RECONCILE_RATE
+RECONCILE_MAX_PER_RUN = int(os.getenv("PAYMENT_RECONCILE_MAX_PER_RUN", 1500))
+
+UNAVAILABLE = "unavailable"
+
+
+def _stale_pending(db, before, after, limit):
+    sort_key = timestamp_key(db, Order.created_at)
+    query = (
+        select(Order.id, Order.created_at, Order.checkout_request_id, sort_key.label("sort_key"))
+        .where(Order.status == PENDING, Order.created_at < before, Order.checkout_request_id.isnot(None))
+        .order_by(Order.created_at, Order.id)
+        .limit(limit)
+    )
+    if after is not None:
+        query = query.where(tuple_(sort_key, Order.id) > tuple_(*after))
+    return db.execute(query).all()
+
+
+def _unsent_pending(db, before, limit):
+    return db.execute(
+        select(Order.id)
+        .where(Order.status == PENDING, Order.created_at < before, Order.checkout_request_id.is_(None))
+        .order_by(Order.created_at, Order.id)
+        .limit(limit)
+    ).scalars().all()
+
+
+def _query(limiter, checkout_request_id):
+    if mpesa.daraja_retry_after():
+        return None  # the breaker is open; don't wait on the limiter for nothing
+    limiter.wait()
+    return mpesa.query_stk_push(checkout_request_id)
+
+
+def _outcome(result, created_at, expire_before):
+    """(new status, result code, result desc) for an order, PENDING to leave it, or None if it could not be checked.
+
+    Error answers (Daraja down, a rejected access token or credentials, an
+    invalid request) say nothing about the payment: they never expire an
+    order.
+    """
+    if result is None or result.get("errorCode"):
+        return None
+    code = result.get("ResultCode")
+    if code is not None and code != "":
+        try:
+            code = int(code)
+        except (TypeError, ValueError):
+            pass
+        return PAID if code == 0 else PAYMENT_FAILED, code, result.get("ResultDesc")
+    if not (result.get("processing") or result.get("unknown_request")):
+        return PENDING, None, None
+    # Still being processed, or Daraja does not know the request
+    if as_utc(created_at) < expire_before:
+        return EXPIRED, None, result.get("ResultDesc") or "No payment received"
+    return PENDING, None, None
+
+
+def reconcile_pending_payments(db, now=None) -> dict:
+    """Check stale pending orders with Daraja and settle those it has an outcome for.
+
+    Commits after every batch. Returns the number of orders per outcome:
+    paid, payment_failed, expired, pending (still waiting) and unavailable
+    (not checked because Daraja was down).
+    """
+    now = now or datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=RECONCILE_AFTER_SECONDS)
+    expire_before = now - timedelta(seconds=PAYMENT_EXPIRE_AFTER_SECONDS)
+    limiter = RateLimiter(RECONCILE_RATE)
+    counts = Counter()
+    # Never sent to M-Pesa, so no callback can come; settle_payments commits
+    while order_ids := _unsent_pending(db, expire_before, RECONCILE_BATCH_SIZE):
+        counts.update(settle_payments(
+            db, {order_id: (EXPIRED, None, "STK Push was never sent") for order_id in order_ids}
+        ))
+    after, checked, down = None, 0, False
+    with ThreadPoolExecutor(RECONCILE_CONCURRENCY, thread_name_prefix="reconcile") as pool:
+        while not down and checked < RECONCILE_MAX_PER_RUN:
+            rows = _stale_pending(db, stale_before, after, min(RECONCILE_BATCH_SIZE, RECONCILE_MAX_PER_RUN - checked))
+            db.commit()  # no transaction held open while Daraja answers
+            if not rows:
+                break
+            after = (rows[-1].sort_key, rows[-1].id)
+            checked += len(rows)
+            results = pool.map(lambda row: _query(limiter, row.checkout_request_id), rows)
+            outcomes = {}
+            for row, result in zip(rows, results):
+                outcome = _outcome(result, row.created_at, expire_before)
+                if outcome is None:
+                    down = True
+                    counts[UNAVAILABLE] += 1
+                elif outcome[0] == PENDING:
+                    counts[PENDING] += 1
+                else:
+                    outcomes[row.id] = outcome
+            # Orders a callback settled meanwhile are not counted
+            counts.update(settle_payments(db, outcomes))
+    for outcome, count in counts.items():
+        PAYMENTS_RECONCILED.labels(outcome=outcome).inc(count)
+    if down:
+        logger.warning("Payment reconciliation stopped early: M-Pesa is unavailable or rejected the query")
+    logger.info(f"Reconciled {checked} pending payments: {dict(counts)}")
+    return dict(counts)
@@ -0,0 +1,105 @@
+"""
+M-Pesa STK Push payment results.
+
+Checkout stores the CheckoutRequestID that Daraja returns for the STK Push
+on the order. The result arrives later on the callback URL and is matched
+back to the order by that id. A pending order becomes "paid" (with the
+M-Pesa receipt as payment_reference) or "payment_failed"; results for an
+order that is no longer pending, such as callback retries, change nothing.
+
+Callbacks can get lost. app/services/payment_reconciler.py asks Daraja
+about orders left pending and settles them with settle_payments, which
+also marks abandoned ones "expired".
+"""
+import logging
+from collections import defaultdict
+from sqlalchemy import update
+from app.models import Order
+from app.services import order_events, rollup_service
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+PAID = "paid"
+PAYMENT_FAILED = "payment_failed"
+EXPIRED = "expired"
+
+
+def parse_stk_callback(body: dict) -> dict:
+    """Pull the fields we use out of a Daraja STK callback body."""
+    callback = (body or {}).get("Body", {}).get("stkCallback", {})
+    metadata = {
+        item.get("Name"): item.get("Value")
+        for item in callback.get("CallbackMetadata", {}).get("Item", [])
+    }
+    return {
+        "checkout_request_id": callback.get("CheckoutRequestID"),
+        "result_code": callback.get("ResultCode"),
+        "result_desc": callback.get("ResultDesc"),
+        "receipt": metadata.get("MpesaReceiptNumber"),
+        "amount": metadata.get("Amount"),
+        "phone": metadata.get("PhoneNumber"),
+    }
+
+
+def record_payment_result(db, checkout_request_id, result_code, result_desc=None, receipt=None):
+    """Settle the pending order for an STK Push and commit. Returns the order, or None if unknown."""
+    if not checkout_request_id:
+        return None
+    order = db.query(Order).filter(Order.checkout_request_id == checkout_request_id).with_for_update().first()
+    if order is None:
+        logger.warning(f"Payment result for unknown CheckoutRequestID {checkout_request_id}")
+        return None
+    if order.status != PENDING:
+        db.rollback()  # releases the row lock
+        return order
+
+    try:
+        paid = int(result_code) == 0
+    except (TypeError, ValueError):
+        paid = False
+    old_status = order.status
+    order.status = PAID if paid else PAYMENT_FAILED
+    if paid and receipt:
+        order.payment_reference = receipt
+    rollup_service.move_order_status(db, order, old_status, order.status)
+    order_events.emit(db, order_events.order_event(
+        order, "payment", previous_status=old_status, result_code=result_code, result_desc=result_desc,
+    ))
+    db.commit()
+    logger.info(f"Order {order.public_id or order.id}: {order.status} ({result_desc})")
+    return order
+
+
+def settle_payments(db, outcomes) -> dict:
+    """Settle many pending orders at once and commit.
+
+    outcomes maps order ids to (new_status, result_code, result_desc).
+    There is one UPDATE per new status, and orders that stopped being
+    pending in the meantime (a late callback got there first) are left
+    alone. Returns {new_status: orders settled}.
+    """
+    by_status = defaultdict(list)
+    for order_id, (status, _, _) in outcomes.items():
+        by_status[status].append(order_id)
+    settled = {}
+    for status, order_ids in by_status.items():
+        moved = db.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids), Order.status == PENDING)
+            .values(status=status)
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if not moved:
+            continue
+        orders = db.query(Order).filter(Order.id.in_(moved)).populate_existing().all()
+        rollup_service.move_orders_status(db, orders, PENDING, status)
+        for order in orders:
+            _, result_code, result_desc = outcomes[order.id]
+            order_events.emit(db, order_events.order_event(
+                order, "payment", previous_status=PENDING, result_code=result_code, result_desc=result_desc,
+            ))
+        settled[status] = len(moved)
+    db.commit()
+    return settled
@@ -0,0 +1,224 @@
+"""
+Server-side cart pricing.
+
+Carts and orders are priced from the price book, never from prices sent by
+the client. The book is a CatalogIndex: rebuild() loads the products and the
+promotions in effect and compiles them into per-product lookup tables, so
+pricing a cart is a dictionary lookup and a little arithmetic per line with
+no queries (see benchmarks/bench_pricing.py).
+
+Promotions do not stack; each line gets its best price:
+- the unit price is the list price less the larger of the product's
+  "percentage" promotion and its category's "category" promotion;
+- a "bundle" sells each full group of min_quantity units for bundle_price
+  (the remainder at the unit price), when that comes out cheaper.
+A "coupon" then comes off the sum of the lines: percent_off of it, or
+amount_off capped at it, once the lines reach min_subtotal.
+
+Promotion writes bump the catalog version, so every worker rebuilds its
+book; promotions with starts_at or ends_at also force a rebuild when the
+next of those moments passes.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import select
+from app.models import Product, Promotion
+from app.services.catalog_cache import CatalogIndex
+from app.services.rollup_service import as_utc
+
+PERCENTAGE, CATEGORY, BUNDLE, COUPON = "percentage", "category", "bundle", "coupon"
+KINDS = (PERCENTAGE, CATEGORY, BUNDLE, COUPON)
+
+_COLUMNS = (Product.id, Product.name, Product.price, Product.category_id)
+
+
+class PricingError(ValueError):
+    """An order that cannot be priced: unknown products, bad quantities or a coupon that does not apply."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _money(amount) -> float:
+    return round(amount, 2)
+
+
+def _better(table, key, percent, name):
+    if percent and percent > table.get(key, (0, None))[0]:
+        table[key] = (percent, name)
+
+
+class PriceBook(CatalogIndex):
+    def __init__(self):
+        super().__init__()
+        self.expires_at = None
+        self._compile([], [], _now())
+
+    def current(self, db):
+        if self.expires_at is not None and _now() >= self.expires_at:
+            self.version = None  # a promotion has started or ended
+        return super().current(db)
+
+    def rebuild(self, db):
+        now = _now()
+        products = db.execute(
+            select(*_COLUMNS).where(Product.name.isnot(None), Product.price.isnot(None))
+        ).all()
+        promotions = db.execute(select(Promotion.__table__).where(Promotion.active.is_(True))).all()
+        self._compile(products, promotions, now)
+
+    def _compile(self, products, promotions, now):
+        product_percent, category_percent, bundles, coupons = {}, {}, {}, {}
+        boundaries = []
+        for promo in promotions:
+            starts_at = promo.starts_at and as_utc(promo.starts_at)
+            ends_at = promo.ends_at and as_utc(promo.ends_at)
+            if starts_at and starts_at > now:
+                boundaries.append(starts_at)
+                continue
+            if ends_at:
+                if ends_at <= now:
+                    continue
+                boundaries.append(ends_at)
+            if promo.kind == PERCENTAGE:
+                _better(product_percent, promo.product_id, promo.percent_off, promo.name)
+            elif promo.kind == CATEGORY:
+                _better(category_percent, promo.category_id, promo.percent_off, promo.name)
+            elif promo.kind == BUNDLE:
+                best = bundles.get(promo.product_id)
+                if best is None or promo.bundle_price / promo.min_quantity < best[1] / best[0]:
+                    bundles[promo.product_id] = (promo.min_quantity, promo.bundle_price, promo.name)
+            elif promo.kind == COUPON:
+                coupons[promo.code.upper()] = (promo.percent_off, promo.amount_off, promo.min_subtotal or 0)
+        with self._lock:
+            self._product_percent, self._category_percent = product_percent, category_percent
+            self._bundles, self._coupons = bundles, coupons
+            self._products, self._by_name = {}, {}
+            for row in products:
+                self._add(row)
+            self.expires_at = min(boundaries, default=None)
+
+    def _add(self, row):
+        percent, promotion = max(
+            self._product_percent.get(row.id, (0, None)),
+            self._category_percent.get(row.category_id, (0, None)),
+            key=lambda entry: entry[0],
+        )
+        unit = _money(row.price * (100 - percent) / 100)
+        self._products[row.id] = (row.name, row.category_id, row.price, unit, promotion if percent else None)
+        self._by_name[row.name] = row.id
+
+    def update(self, db, product_id):
+        row = db.execute(
+            select(*_COLUMNS)
+            .where(Product.id == product_id, Product.name.isnot(None), Product.price.isnot(None))
+        ).first()
+        with self._lock:
+            old = self._products.pop(product_id, None)
+            if old is not None and self._by_name.get(old[0]) == product_id:
+                del self._by_name[old[0]]
+            if row is not None:
+                self._add(row)
+
+    def lines(self, items) -> list:
+        """Turn order-shaped items ({"id", "name", "quantity"}) into price_cart lines.
+
+        Items are matched by product id, or by exact name for older clients
+        that send none; unmatched ones keep their id or name, which
+        price_cart reports as unavailable.
+        """
+        with self._lock:
+            lines = []
+            for item in items:
+                product_id = item.get("id")
+                if product_id not in self._products:
+                    product_id = self._by_name.get(item.get("name"), product_id or item.get("name"))
+                lines.append((product_id, item.get("quantity", 1)))
+            return lines
+
+    def price_cart(self, lines, coupon_code=None) -> dict:
+        """Price (product_id, quantity) lines and an optional coupon code.
+
+        Returns items shaped like order items (id, name, quantity, list
+        price, totalPrice) plus each line's discount and promotion, the
+        subtotal at list prices, the total discount, the coupon applied
+        (or couponError) and the total. Lines for unknown products or with
+        a quantity below 1 are left out and listed in unavailable.
+        """
+        quantities, unavailable = {}, []
+        for product_id, quantity in lines:
+            if isinstance(quantity, int) and quantity >= 1:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            else:
+                unavailable.append(product_id)
+        items, subtotal, net = [], 0.0, 0.0
+        coupon, coupon_discount, error = None, 0.0, None
+        with self._lock:
+            for product_id, quantity in quantities.items():
+                product = self._products.get(product_id)
+                if product is None:
+                    unavailable.append(product_id)
+                    continue
+                name, _, price, unit, promotion = product
+                line = unit * quantity
+                bundle = self._bundles.get(product_id)
+                if bundle is not None and quantity >= bundle[0]:
+                    groups, rest = divmod(quantity, bundle[0])
+                    bundled = groups * bundle[1] + rest * unit
+                    if bundled < line:
+                        line, promotion = bundled, bundle[2]
+                line, gross = _money(line), _money(price * quantity)
+                items.append({
+                    "id": product_id, "name": name, "quantity": quantity, "price": price,
+                    "totalPrice": line, "discount": _money(gross - line),
+                    "promotion": promotion if line < gross else None,
+                })
+                subtotal += gross
+                net += line
+            if coupon_code:
+                code = coupon_code.strip().upper()
+                rule = self._coupons.get(code)
+                if rule is None:
+                    error = "Unknown or expired coupon"
+                elif net < rule[2]:
+                    error = f"Coupon {code} needs a cart of at least {rule[2]:g}"
+                else:
+                    percent_off, amount_off, _ = rule
+                    coupon = code
+                    coupon_discount = _money(net * percent_off / 100 if percent_off else min(amount_off, net))
+        total = _money(net - coupon_discount)
+        subtotal = _money(subtotal)
+        return {
+            "items": items,
+            "subtotal": subtotal,
+            "discount": _money(subtotal - total),
+            "coupon": coupon,
+            "couponDiscount": coupon_discount,
+            "couponError": error,
+            "total": total,
+            "unavailable": unavailable,
+        }
+
+    def categories(self, items):
+        """The (by_id, by_name) category pair rollup_service.add_order takes, for priced items."""
+        with self._lock:
+            return {item["id"]: self._products[item["id"]][1] for item in items if item["id"] in self._products}, {}
+
+
+price_book = PriceBook()
+
+
+def price_order(db, items, coupon_code=None) -> dict:
+    """Price order-shaped items for an order, as price_cart does.
+
+    Raises PricingError instead of leaving anything out. The result also
+    carries the items' categories for insert_order.
+    """
+    book = price_book.current(db)
+    quote = book.price_cart(book.lines(items), coupon_code)
+    if quote["unavailable"]:
+        raise PricingError(f"Unknown products or invalid quantities: {', '.join(map(str, quote['unavailable']))}")
+    if quote["couponError"]:
+        raise PricingError(quote["couponError"])
+    quote["categories"] = book.categories(quote["items"])
+    return quote
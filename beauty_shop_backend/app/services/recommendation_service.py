@@ -0,0 +1,168 @@
+"""
+"Frequently bought together" recommendations.
+
+refresh_related_products() reads the orders placed since its last run (the
+checkpoint is the highest order id seen, kept in job_checkpoints), builds an
+orders x products incidence matrix per batch and gets every pairwise
+co-occurrence count from one sparse product, A.T @ A. The counts are added
+to product_pair_counts, and the top RELATED_TOP_K rows of each product they
+touched are rewritten into related_products, which is all the API reads.
+
+Order items written before product ids were stored carry only a name;
+those are matched to products by exact name.
+"""
+import os
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, func, insert, select
+from app.database import dialect_insert
+from app.models import JobCheckpoint, Order, Product, ProductPairCount, RelatedProduct
+from app.services.catalog_cache import bump_related_version
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "related_products"
+RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", 10))
+BATCH_SIZE = 5000
+# Orders younger than this are left for the next run, so an order whose
+# transaction commits after one with a higher id is not skipped
+SETTLE_SECONDS = 60
+# Rows per multi-row INSERT, well under SQLite's bound-parameter limit
+_WRITE_CHUNK = 1000
+
+
+def _order_products(items_json, ids_by_name) -> set:
+    products = set()
+    for item in json.loads(items_json or "[]"):
+        product_id = item.get("id")
+        if not isinstance(product_id, int):
+            product_id = ids_by_name.get(item.get("name"))
+        if product_id is not None:
+            products.add(product_id)
+    return products
+
+
+def cooccurrence(baskets):
+    """Return (product_ids, related_ids, counts) arrays for all pairs bought together.
+
+    baskets is a list of sets of product ids. Both directions of each pair
+    are returned; a product is never paired with itself.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    rows = np.repeat(np.arange(len(baskets)), [len(b) for b in baskets])
+    cols = np.fromiter((p for b in baskets for p in b), dtype=np.int64, count=len(rows))
+    if not len(cols):
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+    incidence = sparse.csr_matrix(
+        (np.ones(len(cols), dtype=np.int32), (rows, cols)), shape=(len(baskets), cols.max() + 1)
+    )
+    pairs = (incidence.T @ incidence).tocoo()
+    off_diagonal = pairs.row != pairs.col
+    return pairs.row[off_diagonal], pairs.col[off_diagonal], pairs.data[off_diagonal]
+
+
+def _add_pair_counts(db, product_ids, related_ids, counts):
+    rows = [
+        {"product_id": int(p), "related_id": int(r), "count": int(c)}
+        for p, r, c in zip(product_ids, related_ids, counts)
+    ]
+    for start in range(0, len(rows), _WRITE_CHUNK):
+        stmt = dialect_insert(db)(ProductPairCount).values(rows[start:start + _WRITE_CHUNK])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[ProductPairCount.product_id, ProductPairCount.related_id],
+            set_={"count": ProductPairCount.count + stmt.excluded.count},
+        ))
+
+
+def _rebuild_top_k(db, product_ids):
+    """Rewrite related_products for the given products from their pair counts."""
+    product_ids = sorted(product_ids)
+    for start in range(0, len(product_ids), _WRITE_CHUNK):
+        chunk = product_ids[start:start + _WRITE_CHUNK]
+        ranked = select(
+            ProductPairCount.product_id,
+            ProductPairCount.related_id,
+            ProductPairCount.count,
+            func.row_number().over(
+                partition_by=ProductPairCount.product_id,
+                order_by=(ProductPairCount.count.desc(), ProductPairCount.related_id),
+            ).label("rank"),
+        ).where(ProductPairCount.product_id.in_(chunk)).subquery()
+        top = db.execute(select(ranked).where(ranked.c.rank <= RELATED_TOP_K)).all()
+
+        db.execute(delete(RelatedProduct).where(RelatedProduct.product_id.in_(chunk)))
+        if top:
+            db.execute(insert(RelatedProduct), [
+                {"product_id": row.product_id, "rank": row.rank, "related_id": row.related_id, "count": row.count}
+                for row in top
+            ])
+
+
+def refresh_related_products(db, *, batch_size=BATCH_SIZE, settle_seconds=SETTLE_SECONDS) -> int:
+    """Fold orders placed since the last run into the related-products index.
+
+    Each batch is committed together with the checkpoint, so an interrupted
+    run resumes without counting any order twice. Returns the number of
+    orders processed.
+    """
+    last_id = db.execute(select(JobCheckpoint.last_id).where(JobCheckpoint.name == CHECKPOINT)).scalar() or 0
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settle_seconds)
+    upper_id = db.execute(
+        select(func.max(Order.id)).where(Order.id > last_id, Order.created_at <= cutoff)
+    ).scalar()
+    if upper_id is None:
+        return 0
+    ids_by_name = dict(db.execute(select(Product.name, Product.id)).all())
+
+    processed = 0
+    while last_id < upper_id:
+        orders = db.execute(
+            select(Order.id, Order.items_json)
+            .where(Order.id > last_id, Order.id <= upper_id)
+            .order_by(Order.id)
+            .limit(batch_size)
+        ).all()
+        if not orders:
+            break
+        baskets = [_order_products(order.items_json, ids_by_name) for order in orders]
+        product_ids, related_ids, counts = cooccurrence(baskets)
+        if len(counts):
+            _add_pair_counts(db, product_ids, related_ids, counts)
+            _rebuild_top_k(db, set(product_ids.tolist()))
+            bump_related_version(db)
+
+        last_id = orders[-1].id
+        stmt = dialect_insert(db)(JobCheckpoint).values(name=CHECKPOINT, last_id=last_id)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[JobCheckpoint.name],
+            set_={"last_id": last_id, "updated_at": func.now()},
+        ))
+        db.commit()
+        processed += len(orders)
+        logger.info(f"Related products: processed orders up to id {last_id}")
+    return processed
+
+
+def related_products(db, product_id: int) -> list:
+    """Return the stored top products for product_id, most often bought together first."""
+    return db.execute(
+        select(
+            Product.id,
+            Product.name,
+            Product.description,
+            Product.price,
+            Product.category_id,
+            Product.stock_quantity,
+            Product.image,
+            Product.rating,
+            Product.is_new,
+            RelatedProduct.count,
+        )
+        .join(Product, Product.id == RelatedProduct.related_id)
+        .where(RelatedProduct.product_id == product_id)
+        .order_by(RelatedProduct.rank)
+    ).all()
@@ -0,0 +1,224 @@
+"""
+Hourly and daily sales rollups.
+
+sales_rollups holds, per UTC hour and per UTC day, the revenue, order count
+and units sold for each (category, order status). Rows with category_id 0
+(ALL_CATEGORIES) carry whole-order totals; the per-category rows split each
+order by its line items, so an order with items in two categories counts
+once in each of them. Items whose product can no longer be found only
+count towards the whole-order rows.
+
+The write path keeps the rollups current in the same transaction as the
+order: insert_order calls add_order, and status changes call
+move_order_status (move_orders_status for a batch). rebuild_sales_rollups
+recomputes everything from orders, e.g. after products were moved between
+categories.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import delete, func, or_, select
+from app.database import dialect_insert
+from app.models import Order, Product, SalesRollup
+
+GRANULARITIES = ("hour", "day")
+GROUPINGS = ("status", "category")
+ALL_CATEGORIES = 0
+REBUILD_BATCH_SIZE = 5000
+# Rows per multi-row upsert, well under SQLite's bound-parameter limit
+_WRITE_CHUNK = 500
+
+
+def as_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is None:  # SQLite hands back naive UTC values
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its UTC hour or day."""
+    moment = as_utc(moment).replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def product_categories(db, items):
+    """Look up the category of every product in items with one query.
+
+    Returns (by_id, by_name) dicts; items are matched by product id when
+    they have one and by name otherwise.
+    """
+    ids = [item["id"] for item in items if isinstance(item.get("id"), int)]
+    names = [item.get("name") for item in items if not isinstance(item.get("id"), int)]
+    rows = db.execute(
+        select(Product.id, Product.name, Product.category_id)
+        .where(or_(Product.id.in_(ids), Product.name.in_(names)))
+    ).all() if items else []
+    return {row.id: row.category_id for row in rows}, {row.name: row.category_id for row in rows}
+
+
+def _contributions(items, total, categories) -> dict:
+    """Return {category_id: [revenue, units]} for one order."""
+    by_id, by_name = categories
+    totals = {ALL_CATEGORIES: [total or 0, 0]}
+    for item in items:
+        quantity = item.get("quantity") or 0
+        revenue = item.get("totalPrice")
+        if revenue is None:
+            revenue = (item.get("price") or 0) * quantity
+        totals[ALL_CATEGORIES][1] += quantity
+        product_id = item.get("id")
+        category_id = by_id.get(product_id) if isinstance(product_id, int) else by_name.get(item.get("name"))
+        if category_id is not None:
+            line = totals.setdefault(category_id, [0, 0])
+            line[0] += revenue
+            line[1] += quantity
+    return totals
+
+
+def _accumulate(deltas, created_at, status, contributions, sign):
+    for granularity in GRANULARITIES:
+        start = bucket_start(created_at, granularity)
+        for category_id, (revenue, units) in contributions.items():
+            delta = deltas[(granularity, start, category_id, status or "pending")]
+            delta[0] += sign * revenue
+            delta[1] += sign
+            delta[2] += sign * units
+
+
+def _apply(db, deltas):
+    rows = [
+        {
+            "granularity": granularity, "bucket_start": start, "category_id": category_id,
+            "status": status, "revenue": revenue, "order_count": orders, "units": units,
+        }
+        for (granularity, start, category_id, status), (revenue, orders, units) in deltas.items()
+    ]
+    for offset in range(0, len(rows), _WRITE_CHUNK):
+        stmt = dialect_insert(db)(SalesRollup).values(rows[offset:offset + _WRITE_CHUNK])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[SalesRollup.granularity, SalesRollup.bucket_start, SalesRollup.category_id, SalesRollup.status],
+            set_={
+                "revenue": SalesRollup.revenue + stmt.excluded.revenue,
+                "order_count": SalesRollup.order_count + stmt.excluded.order_count,
+                "units": SalesRollup.units + stmt.excluded.units,
+            },
+        ))
+
+
+def add_order(db, *, created_at, status, items, total, categories=None):
+    """Count a new order (in the caller's transaction).
+
+    categories is the (by_id, by_name) pair from product_categories, for
+    callers that already have it; otherwise it is looked up.
+    """
+    if categories is None:
+        categories = product_categories(db, items)
+    deltas = defaultdict(lambda: [0, 0, 0])
+    _accumulate(deltas, created_at, status, _contributions(items, total, categories), 1)
+    _apply(db, deltas)
+
+
+def move_order_status(db, order, old_status, new_status):
+    """Move an order's figures from one status to another (in the caller's transaction)."""
+    move_orders_status(db, [order], old_status, new_status)
+
+
+def move_orders_status(db, orders, old_status, new_status):
+    """move_order_status for many orders, with one category lookup and one upsert."""
+    if (old_status or "pending") == (new_status or "pending") or not orders:
+        return
+    items = [order.get_items() for order in orders]
+    categories = product_categories(db, [item for order_items in items for item in order_items])
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for order, order_items in zip(orders, items):
+        contributions = _contributions(order_items, order.total_amount, categories)
+        _accumulate(deltas, order.created_at, old_status, contributions, -1)
+        _accumulate(deltas, order.created_at, new_status, contributions, 1)
+    _apply(db, deltas)
+
+
+def rebuild_sales_rollups(db, batch_size=REBUILD_BATCH_SIZE) -> int:
+    """Recompute every rollup from the orders table in one transaction.
+
+    Readers keep seeing the old figures until the commit. Returns the
+    number of orders counted.
+    """
+    rows = db.execute(select(Product.id, Product.name, Product.category_id)).all()
+    categories = ({row.id: row.category_id for row in rows}, {row.name: row.category_id for row in rows})
+
+    db.execute(delete(SalesRollup))
+    last_id, counted = 0, 0
+    while True:
+        orders = db.execute(
+            select(Order.id, Order.created_at, Order.status, Order.total_amount, Order.items_json)
+            .where(Order.id > last_id)
+            .order_by(Order.id)
+            .limit(batch_size)
+        ).all()
+        if not orders:
+            break
+        deltas = defaultdict(lambda: [0, 0, 0])
+        for order in orders:
+            if order.created_at is None:
+                continue
+            items = json.loads(order.items_json) if order.items_json else []
+            _accumulate(deltas, order.created_at, order.status,
+                        _contributions(items, order.total_amount, categories), 1)
+            counted += 1
+        _apply(db, deltas)
+        last_id = orders[-1].id
+    db.commit()
+    return counted
+
+
+def sales_series(db, *, start, end, granularity="day", group_by=None, status=None, category_id=None) -> list:
+    """Return rollup rows for buckets in [start, end), oldest first.
+
+    group_by "status" or "category" splits each bucket by that dimension.
+    Without a category filter or category grouping, figures are whole-order
+    totals.
+    """
+    columns = [SalesRollup.bucket_start]
+    if group_by == "status":
+        columns.append(SalesRollup.status)
+    elif group_by == "category":
+        columns.append(SalesRollup.category_id)
+    query = select(
+        *columns,
+        func.sum(SalesRollup.revenue).label("revenue"),
+        func.sum(SalesRollup.order_count).label("orders"),
+        func.sum(SalesRollup.units).label("units"),
+    ).where(
+        SalesRollup.granularity == granularity,
+        SalesRollup.bucket_start >= bucket_start(start, granularity),
+        SalesRollup.bucket_start < as_utc(end),
+    ).group_by(*columns).order_by(*columns)
+
+    if category_id is not None:
+        query = query.where(SalesRollup.category_id == category_id)
+    elif group_by == "category":
+        query = query.where(SalesRollup.category_id != ALL_CATEGORIES)
+    else:
+        query = query.where(SalesRollup.category_id == ALL_CATEGORIES)
+    if status is not None:
+        query = query.where(SalesRollup.status == status)
+
+    series = []
+    for row in db.execute(query).all():
+        point = {"bucket": bucket_start(row.bucket_start, granularity)}
+        if group_by == "status":
+            point["status"] = row.status
+        elif group_by == "category":
+            point["category_id"] = row.category_id
+        point.update(
+            revenue=round(row.revenue or 0, 2),
+            orders=row.orders or 0,
+            units=row.units or 0,
+            average_basket=round(row.revenue / row.orders, 2) if row.orders else 0,
+        )
+        # Buckets whose orders all moved to another status
+        if point["orders"] or point["revenue"]:
+            series.append(point)
+    return series
@@ -0,0 +1,144 @@
+"""
+Product-name autocomplete.
+
+Every product is indexed under its normalized name, each suffix of the name
+starting at a word ("vitamin c serum", "c serum", "serum") and its category
+name, so a query matches the start of any word. The terms live in one
+sorted list of (term, product_id) pairs: the matches for a prefix are a
+contiguous slice found with two binary searches, and the best rated of them
+are picked with a heap.
+
+Prefixes matching many terms (short or common ones) would make that heap
+the slow part, so their results are memoized and kept up to date as
+products change.
+"""
+import re
+import heapq
+import unicodedata
+from bisect import bisect_left, insort
+from sqlalchemy import select
+from app.models import Category, Product
+from app.services.catalog_cache import CatalogIndex
+
+MAX_RESULTS = 20
+# Prefixes matching at least this many terms have their results memoized
+MEMO_MIN_MATCHES = 256
+_COLUMNS = (Product.id, Product.name, Product.rating, Category.name.label("category"), Product.price, Product.image)
+_WORDS = re.compile(r"[^\W_]+")
+_MAX_CHAR = "\U0010ffff"
+
+
+def normalize(text) -> str:
+    """Lowercase, strip accents and punctuation, single-space the words."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(_WORDS.findall(text))
+
+
+def _terms(name, category) -> set:
+    words = normalize(name).split()
+    terms = {" ".join(words[i:]) for i in range(len(words))}
+    category = normalize(category)
+    if category:
+        terms.add(category)
+    return terms
+
+
+def _prefixes(terms) -> set:
+    return {term[:n] for term in terms for n in range(1, len(term) + 1)}
+
+
+class SuggestIndex(CatalogIndex):
+    def __init__(self):
+        super().__init__()
+        self._keys = []       # sorted (term, product_id)
+        self._products = {}   # product_id -> (sort_key, suggestion, terms)
+        self._memo = {}       # common prefix -> best (sort_key, suggestion) first
+
+    def rebuild(self, db):
+        rows = db.execute(
+            select(*_COLUMNS)
+            .outerjoin(Category, Category.id == Product.category_id)
+            .where(Product.name.isnot(None))
+        ).all()
+        self.build(rows)
+
+    def build(self, rows):
+        """Replace the contents with rows of (id, name, rating, category, price, image)."""
+        products, keys = {}, []
+        for row in rows:
+            entry = self._entry(row)
+            products[row.id] = entry
+            keys.extend((term, row.id) for term in entry[2])
+        keys.sort()
+        with self._lock:
+            self._products, self._keys, self._memo = products, keys, {}
+
+    def update(self, db, product_id):
+        row = db.execute(
+            select(*_COLUMNS)
+            .outerjoin(Category, Category.id == Product.category_id)
+            .where(Product.id == product_id, Product.name.isnot(None))
+        ).first()
+        self.remove(product_id)
+        if row is not None:
+            self.add(row)
+
+    @staticmethod
+    def _entry(row):
+        rating = row.rating or 0
+        suggestion = {
+            "id": row.id, "name": row.name, "category": row.category,
+            "rating": rating, "price": row.price, "image": row.image,
+        }
+        return (-rating, row.name, row.id), suggestion, _terms(row.name, row.category)
+
+    def add(self, row):
+        entry = self._entry(row)
+        with self._lock:
+            self._products[row.id] = entry
+            for term in entry[2]:
+                insort(self._keys, (term, row.id))
+            for prefix in _prefixes(entry[2]):
+                best = self._memo.get(prefix)
+                if best is not None and row.id not in {s["id"] for _, s in best}:
+                    insort(best, entry[:2])
+                    del best[MAX_RESULTS:]
+
+    def remove(self, product_id):
+        with self._lock:
+            entry = self._products.pop(product_id, None)
+            if entry is None:
+                return
+            for term in entry[2]:
+                i = bisect_left(self._keys, (term, product_id))
+                del self._keys[i]
+            for prefix in _prefixes(entry[2]):
+                best = self._memo.get(prefix)
+                if best is not None and entry[:2] in best:
+                    # Recomputed on next use, so the runner-up can move in
+                    del self._memo[prefix]
+
+    def _matches(self, prefix):
+        lo = bisect_left(self._keys, (prefix,))
+        hi = bisect_left(self._keys, (prefix + _MAX_CHAR,))
+        return self._keys[lo:hi]
+
+    def search(self, q, limit=8) -> list:
+        """Return up to limit suggestions for q, best rated first."""
+        prefix = normalize(q)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_RESULTS)
+        with self._lock:
+            best = self._memo.get(prefix)
+            if best is None:
+                matches = self._matches(prefix)
+                ids = {product_id for _, product_id in matches}
+                best = heapq.nsmallest(MAX_RESULTS, (self._products[i][:2] for i in ids))
+                if len(matches) >= MEMO_MIN_MATCHES:
+                    self._memo[prefix] = best
+            return [s for _, s in best[:limit]]
+
+
+suggest_index = SuggestIndex()
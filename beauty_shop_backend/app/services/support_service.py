@@ -0,0 +1,141 @@
+"""
+Support inbox queries and the per-status message counters.
+
+The admin inbox is read a page at a time, newest first, using keyset
+pagination over (created_at, id), optionally filtered by status (served
+by ix_support_messages_status_created_at) and by a search query. Counts
+per status come from support_status_counts, which every write below
+keeps in step in the same transaction, so the inbox header never needs
+a COUNT(*) over the whole table.
+"""
+from sqlalchemy import func, or_, select, text, tuple_, update
+from app.database import dialect_insert
+from app.models import SupportMessage, SupportStatusCount
+from app.utils.pagination import decode_cursor, encode_cursor, parse_timestamp_key, timestamp_key
+from app.utils.search import escape_like
+
+STATUSES = ("pending", "resolved", "closed")
+# Characters of the message body returned in list rows
+PREVIEW_LENGTH = 200
+
+# Must match the expression of the GIN index ix_support_messages_search
+# (Postgres only), or the planner cannot use it.
+SEARCH_VECTOR = "to_tsvector('english', subject || ' ' || message)"
+
+
+def adjust_status_count(db, status: str, delta: int):
+    """Add delta to a status counter (in the caller's transaction)."""
+    stmt = dialect_insert(db)(SupportStatusCount).values(status=status, count=delta)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[SupportStatusCount.status],
+        set_={"count": SupportStatusCount.count + delta},
+    ))
+
+
+def status_counts(db) -> dict:
+    """Return {status: count} for every known status, plus "all"."""
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(db.execute(select(SupportStatusCount.status, SupportStatusCount.count)).all())
+    counts["all"] = sum(counts.values())
+    return counts
+
+
+def create_message(db, *, name, email, subject, message) -> int:
+    """Insert a pending message and bump its counter in one transaction."""
+    message_id = db.execute(
+        SupportMessage.__table__.insert()
+        .values(name=name, email=email, subject=subject, message=message, status="pending")
+        .returning(SupportMessage.id)
+    ).scalar_one()
+    adjust_status_count(db, "pending", 1)
+    db.commit()
+    return message_id
+
+
+def set_message_status(db, message_id: int, status: str):
+    """Change a message's status and move it between counters.
+
+    Returns the message's status afterwards, or None if it does not exist.
+    """
+    current = db.execute(
+        select(SupportMessage.status).where(SupportMessage.id == message_id)
+    ).first()
+    if current is None:
+        return None
+    old_status = current.status or "pending"
+    if status == old_status:
+        return status
+
+    # Conditional on the status we read, so two admins changing the same
+    # message at once cannot move it between counters twice
+    result = db.execute(
+        update(SupportMessage)
+        .where(SupportMessage.id == message_id, func.coalesce(SupportMessage.status, "pending") == old_status)
+        .values(status=status)
+    )
+    if result.rowcount:
+        adjust_status_count(db, old_status, -1)
+        adjust_status_count(db, status, 1)
+        db.commit()
+        return status
+    db.commit()
+    return db.execute(select(SupportMessage.status).where(SupportMessage.id == message_id)).scalar()
+
+
+def _search_clause(db, q: str):
+    if db.get_bind().dialect.name == "postgresql":
+        return text(f"{SEARCH_VECTOR} @@ websearch_to_tsquery('english', :q)").bindparams(q=q)
+    pattern = "%" + escape_like(q) + "%"
+    return or_(
+        SupportMessage.subject.ilike(pattern, escape="\\"),
+        SupportMessage.message.ilike(pattern, escape="\\"),
+    )
+
+
+def list_messages(db, *, status=None, q=None, cursor=None, limit=50) -> dict:
+    """Return one page of the inbox, newest first.
+
+    Rows carry at most PREVIEW_LENGTH characters of the body (``truncated``
+    says whether there is more). Pass the returned ``next_cursor`` back to
+    get the following page. Raises ValueError for a malformed cursor.
+    """
+    query = select(
+        SupportMessage.id,
+        SupportMessage.name,
+        SupportMessage.email,
+        SupportMessage.subject,
+        # One extra character tells us whether the body was cut
+        func.substr(SupportMessage.message, 1, PREVIEW_LENGTH + 1).label("preview"),
+        SupportMessage.status,
+        SupportMessage.created_at,
+        timestamp_key(db, SupportMessage.created_at).label("sort_key"),
+    ).order_by(SupportMessage.created_at.desc(), SupportMessage.id.desc()).limit(limit + 1)
+
+    if status:
+        query = query.where(SupportMessage.status == status)
+    if q:
+        query = query.where(_search_clause(db, q))
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, 2)
+        try:
+            after = tuple_(parse_timestamp_key(db, created_at), int(last_id))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        query = query.where(tuple_(timestamp_key(db, SupportMessage.created_at), SupportMessage.id) < after)
+
+    rows = db.execute(query).all()
+    page = rows[:limit]
+    items = [{
+        "id": row.id,
+        "name": row.name,
+        "email": row.email,
+        "subject": row.subject,
+        "message": row.preview[:PREVIEW_LENGTH],
+        "truncated": len(row.preview) > PREVIEW_LENGTH,
+        "status": row.status,
+        "created_at": row.created_at,
+    } for row in page]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(page[-1].sort_key, page[-1].id)
+    return {"items": items, "next_cursor": next_cursor, "counts": status_counts(db)}
@@ -0,0 +1,73 @@
+"""
+Background tasks run by worker.py (see app/services/job_queue.py).
+
+Web requests queue these with Task.enqueue(db, ...) in their own
+transaction and return; the worker does the slow part.
+"""
+import os
+import logging
+from app.models import Order
+from app.services import image_service
+from app.services.blob_storage import get_storage
+from app.services.job_queue import purge_finished_jobs, task
+from app.services.payment_reconciler import reconcile_pending_payments
+from app.services.recommendation_service import refresh_related_products
+from app.utils.email import mail_configured, send_invoice_email
+from app.utils.invoice import cleanup_invoices, generate_invoice_pdf, invoice_key
+
+logger = logging.getLogger(__name__)
+
+RELATED_REFRESH_SECONDS = float(os.getenv("RELATED_REFRESH_SECONDS", 600))
+PAYMENT_RECONCILE_INTERVAL_SECONDS = float(os.getenv("PAYMENT_RECONCILE_INTERVAL_SECONDS", 300))
+
+
+def render_invoice(order) -> str:
+    """Render the order's invoice PDF unless it is stored already. Returns its key."""
+    key = invoice_key(order.invoice_number)
+    if not get_storage().exists(key):
+        generate_invoice_pdf(order.invoice_number, order.total_amount,
+                             (order.get_customer() or {}).get("email"), order.get_items(),
+                             order.created_at)
+    return key
+
+
+@task("send_invoice")
+def send_invoice(db, order_id: int):
+    """Render an order's invoice and email it to the customer."""
+    order = db.get(Order, order_id)
+    if order is None or not order.invoice_number:
+        logger.warning(f"Invoice for order {order_id} skipped: no such order or invoice number")
+        return
+    pdf_key = render_invoice(order)
+    email = (order.get_customer() or {}).get("email")
+    if not email or not mail_configured():
+        # Nothing a retry would change
+        logger.info(f"Invoice {order.invoice_number} rendered; email skipped (no recipient or mail settings)")
+        return
+    if not send_invoice_email(recipient_email=email, invoice_no=order.invoice_number, pdf_key=pdf_key):
+        raise RuntimeError(f"Invoice {order.invoice_number} email not sent")
+
+
+@task("generate_image_variants")
+def generate_image_variants(db, image_hash: str):
+    image_service.generate_variants(image_hash)
+
+
+@task("cleanup_invoices", every=86400)
+def cleanup_invoices_task(db):
+    logger.info(f"Removed {cleanup_invoices()} expired invoice PDFs")
+
+
+@task("refresh_related_products", every=RELATED_REFRESH_SECONDS)
+def refresh_related_products_task(db):
+    refresh_related_products(db)
+
+
+@task("reconcile_payments", every=PAYMENT_RECONCILE_INTERVAL_SECONDS)
+def reconcile_payments_task(db):
+    reconcile_pending_payments(db)
+
+
+@task("purge_finished_jobs", every=86400)
+def purge_finished_jobs_task(db):
+    logger.info(f"Purged {purge_finished_jobs(db)} finished jobs")
@@ -0,0 +1,64 @@
+"""
+Admin user listing.
+
+Users are paged by id with a keyset cursor. Search on email uses a prefix
+match for short terms and a substring match from three characters on; on
+Postgres these are served by ix_users_email_lower_pattern and the trigram
+index ix_users_email_trgm. Order aggregates come from
+user_order_summaries (one primary-key join per row), never from a
+GROUP BY over orders.
+"""
+from sqlalchemy import func, select
+from app.models import User, UserOrderSummary
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.search import MIN_SUBSTRING_SEARCH, escape_like
+
+
+def _email_search(db, q: str):
+    term = escape_like(q.lower())
+    if len(q) < MIN_SUBSTRING_SEARCH:
+        return func.lower(User.email).like(term + "%", escape="\\")
+    if db.get_bind().dialect.name == "postgresql":
+        return User.email.ilike("%" + term + "%", escape="\\")
+    return func.lower(User.email).like("%" + term + "%", escape="\\")
+
+
+def list_users(db, *, q=None, is_admin=None, include_summary=False, cursor=None, limit=50) -> dict:
+    """Return one page of users ordered by id.
+
+    With include_summary, rows also carry order_count, lifetime_spend and
+    last_order_at. Raises ValueError for a malformed cursor.
+    """
+    columns = [User.id, User.email, User.is_admin]
+    if include_summary:
+        columns += [UserOrderSummary.order_count, UserOrderSummary.lifetime_spend, UserOrderSummary.last_order_at]
+    query = select(*columns).order_by(User.id).limit(limit + 1)
+    if include_summary:
+        query = query.outerjoin(UserOrderSummary, UserOrderSummary.user_id == User.id)
+
+    if q:
+        query = query.where(_email_search(db, q))
+    if is_admin is not None:
+        query = query.where(User.is_admin == is_admin)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        if not isinstance(last_id, int):
+            raise ValueError("Invalid cursor")
+        query = query.where(User.id > last_id)
+
+    rows = db.execute(query).all()
+    page = rows[:limit]
+    items = []
+    for row in page:
+        item = {"id": row.id, "email": row.email, "is_admin": row.is_admin}
+        if include_summary:
+            item["order_count"] = row.order_count or 0
+            item["lifetime_spend"] = row.lifetime_spend or 0
+            item["last_order_at"] = row.last_order_at
+        items.append(item)
+    next_cursor = encode_cursor(page[-1].id) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def count_users(db) -> int:
+    return db.execute(select(func.count(User.id))).scalar()
@@ -0,0 +1,135 @@
+"""
+Circuit breaker and bulkhead for calls to external services.
+
+A CircuitBreaker watches the outcomes of the last `window` calls. Once at
+least `min_calls` of them are in and the share of failures reaches
+`failure_rate`, it opens: calls are refused straight away instead of each
+waiting out the service's timeouts. After `open_seconds` it lets
+`half_open_calls` trial calls through (half-open); a successful trial
+closes it again, a failed one reopens it.
+
+A Bulkhead caps how many calls are in flight at once, so a slow service
+can hold at most that many threads of the sync-endpoint threadpool.
+
+A RateLimiter spaces calls out to at most `rate` per second, for batch
+jobs that would otherwise hit a service's request quota.
+
+All three are per process: every worker trips on its own observations.
+"""
+import time
+import threading
+from collections import deque
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+
+class CircuitBreaker:
+    def __init__(self, name, *, window=20, min_calls=5, failure_rate=0.5, open_seconds=30,
+                 half_open_calls=1, on_state_change=None, clock=time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.on_state_change = on_state_change
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._outcomes = deque(maxlen=self.window)  # True for failures
+            self._opened_at = None
+            self._trials = 0
+            self._set_state(CLOSED)
+
+    def _set_state(self, state):
+        self._state = state
+        if self.on_state_change is not None:
+            self.on_state_change(self.name, state)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._trials = 0
+            self._set_state(HALF_OPEN)
+
+    def retry_after(self) -> float:
+        """Seconds until calls are let through again (0 unless open)."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (self.clock() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now. Every allowed call must be followed by record()."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return True
+            return False
+
+    def record(self, success: bool):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if success:
+                    self._outcomes.clear()
+                    self._set_state(CLOSED)
+                else:
+                    self._trip()
+                return
+            if self._state == OPEN:
+                return  # a call that started before the breaker opened
+            self._outcomes.append(not success)
+            if len(self._outcomes) >= self.min_calls and \
+                    sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                self._trip()
+
+    def _trip(self):
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+        self._set_state(OPEN)
+
+
+class Bulkhead:
+    def __init__(self, max_concurrent, wait_seconds=0.0):
+        self.max_concurrent = max_concurrent
+        self.wait_seconds = wait_seconds
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self) -> bool:
+        """Take a slot, waiting up to wait_seconds. False if none came free."""
+        if self.wait_seconds > 0:
+            return self._slots.acquire(timeout=self.wait_seconds)
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+
+class RateLimiter:
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        """Block until the next call may go ahead."""
+        with self._lock:
+            now = self.clock()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            self.sleep(start - now)
@@ -0,0 +1,137 @@
+"""
+HTTP response compression.
+
+CompressionMiddleware compresses complete (single-body) responses of at
+least COMPRESSION_MIN_SIZE bytes with brotli or gzip, whichever the client
+prefers in Accept-Encoding. Streaming responses (file downloads, event
+streams) and already-encoded bodies pass through untouched.
+
+For responses that are identical for every client, such as the product
+catalog, PrecompressedBody compresses once at a high ratio and is then
+served per request without further CPU work.
+"""
+import os
+import gzip
+import hashlib
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str):
+    """Pick "br", "gzip" or None from an Accept-Encoding header."""
+    preferences = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        preferences[token.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in ("br", "gzip"):  # br wins ties: smaller for JSON
+        if encoding == "br" and brotli is None:
+            continue
+        quality = preferences.get(encoding, preferences.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str, high_ratio: bool = False) -> bytes:
+    """Compress with a fast level per request, or a high ratio for bodies cached once."""
+    if encoding == "br":
+        return brotli.compress(body, quality=9 if high_ratio else 4)
+    return gzip.compress(body, compresslevel=9 if high_ratio else 6)
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing whole responses above a size threshold."""
+
+    def __init__(self, app, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Hold the headers until we know the body is a single chunk
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            if "content-encoding" in headers or not _is_compressible(headers.get("content-type", "")):
+                await send(start)
+                await send(message)
+                return
+            headers.add_vary_header("Accept-Encoding")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class PrecompressedBody:
+    """A response body compressed once, up front, in every supported encoding."""
+
+    def __init__(self, body: bytes, media_type: str = "application/json"):
+        self.media_type = media_type
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.variants = {None: body}
+        if len(body) >= MIN_SIZE:
+            self.variants["gzip"] = compress(body, "gzip", high_ratio=True)
+            if brotli is not None:
+                self.variants["br"] = compress(body, "br", high_ratio=True)
+
+    def response(self, request) -> Response:
+        """Serve the variant the client accepts, or 304 if it has this version."""
+        headers = {"ETag": self.etag, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if self.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding not in self.variants:
+            encoding = None
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
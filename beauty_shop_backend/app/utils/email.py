@@ -1,34 +1,41 @@
-import smtplib
 import os
 from email.message import EmailMessage
-from dotenv import load_dotenv
 import logging
-
-# Load .env to get your Gmail credentials
-load_dotenv()
+from app.services.blob_storage import get_storage
+from app.utils.metrics import SMTP_LATENCY, timed
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
 
-def send_invoice_email(recipient_email: str, invoice_no: str, pdf_path: str):
+MAIL_SETTINGS = ("MAIL_FROM", "MAIL_SERVER", "MAIL_PORT", "MAIL_USERNAME", "MAIL_PASSWORD")
+
+
+def mail_configured() -> bool:
+    return all(os.getenv(name) for name in MAIL_SETTINGS)
+
+
+@timed(SMTP_LATENCY)
+def send_invoice_email(recipient_email: str, invoice_no: str, pdf_key: str):
     """
     Send invoice email with PDF attachment.
     
     Args:
         recipient_email: Recipient's email address
         invoice_no: Invoice number
-        pdf_path: Path to the PDF invoice file
+        pdf_key: Blob storage key of the PDF invoice
         
     Returns:
         bool: True if email sent successfully, False otherwise
     """
+    import smtplib  # imported on first use to keep app startup fast
+
     # Validate inputs
     if not recipient_email:
         logger.error("Recipient email is None or empty")
         return False
         
-    if not pdf_path or not os.path.exists(pdf_path):
-        logger.error(f"PDF file not found at: {pdf_path}")
+    if not pdf_key or not get_storage().exists(pdf_key):
+        logger.error(f"PDF file not found at: {pdf_key}")
         return False
     
     # Get email configuration from environment
@@ -65,14 +72,12 @@ def send_invoice_email(recipient_email: str, invoice_no: str, pdf_path: str):
 
     # Attach the PDF file
     try:
-        with open(pdf_path, 'rb') as f:
-            file_data = f.read()
-            msg.add_attachment(
-                file_data,
-                maintype='application',
-                subtype='pdf',
-                filename=f"Invoice_{invoice_no}.pdf"
-            )
+        msg.add_attachment(
+            get_storage().read_bytes(pdf_key),
+            maintype='application',
+            subtype='pdf',
+            filename=f"Invoice_{invoice_no}.pdf"
+        )
 
         # Login and Send
         with smtplib.SMTP(mail_server, int(mail_port)) as smtp:
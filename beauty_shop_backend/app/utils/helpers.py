@@ -18,4 +18,14 @@ def generate_simulated_invoice(user_email: str, total_price: float, items: list)
         "order_items": items,
         "total": total_price,
         "message": "Thank you for shopping at Beauty Shop!"
-    }
\ No newline at end of file
+    }
+
+
+def normalize_phone(phone):
+    """Put a Kenyan phone number (07..., +254...) in the 2547... form M-Pesa uses. None if empty."""
+    if not phone:
+        return None
+    clean = str(phone).strip().replace("+", "")
+    if clean.startswith("0"):
+        clean = "254" + clean[1:]
+    return clean or None
@@ -0,0 +1,167 @@
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from anyio.to_thread import current_default_thread_limiter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Warn when a single request issues more SQL statements than this
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 25))
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class RequestStats:
+    """SQL activity of the request currently being served."""
+    __slots__ = ("queries", "db_time", "rows")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+
+
+class RouteStats:
+    """Aggregated latency histogram and SQL totals for one route."""
+    __slots__ = ("buckets", "requests", "latency_ms", "db_time_ms", "queries", "rows")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.requests = 0
+        self.latency_ms = 0.0
+        self.db_time_ms = 0.0
+        self.queries = 0
+        self.rows = 0
+
+
+_current_request: ContextVar = ContextVar("perf_request_stats", default=None)
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_request.get() is not None:
+        conn.info.setdefault("perf_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_request.get()
+    if stats is None:
+        return
+    starts = conn.info.get("perf_query_start")
+    if starts:
+        stats.db_time += time.perf_counter() - starts.pop()
+    stats.queries += 1
+    # DBAPI rowcount is -1 when the driver does not know (e.g. SQLite SELECT)
+    stats.rows += max(cursor.rowcount, 0)
+
+
+def install_query_hooks():
+    """Attach the SQL counting hooks to every engine (idempotent)."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def record_request(route: str, latency_ms: float, stats: RequestStats):
+    with _routes_lock:
+        route_stats = _routes.get(route)
+        if route_stats is None:
+            route_stats = _routes[route] = RouteStats()
+        route_stats.buckets[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        route_stats.requests += 1
+        route_stats.latency_ms += latency_ms
+        route_stats.db_time_ms += stats.db_time * 1000
+        route_stats.queries += stats.queries
+        route_stats.rows += stats.rows
+
+
+def route_snapshot():
+    """Return a copy of the per-route stats, keyed by "METHOD /path"."""
+    with _routes_lock:
+        return {
+            route: {
+                "buckets": dict(zip(LATENCY_BUCKETS_MS + (float("inf"),), s.buckets)),
+                "requests": s.requests,
+                "latency_ms_sum": s.latency_ms,
+                "db_time_ms_sum": s.db_time_ms,
+                "queries_sum": s.queries,
+                "rows_sum": s.rows,
+            }
+            for route, s in _routes.items()
+        }
+
+
+class PerformanceMiddleware:
+    """
+    Pure ASGI middleware measuring latency and SQL usage per request.
+
+    Adds a Server-Timing header (total and db time) to every HTTP response,
+    aggregates per-route stats (in process and in Prometheus) and logs a
+    warning when a request goes over QUERY_BUDGET statements. Requires
+    install_query_hooks() to have run.
+    """
+
+    def __init__(self, app, query_budget: int = QUERY_BUDGET):
+        self.app = app
+        self.query_budget = query_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+        self._sample_threadpool()
+        metrics.HTTP_IN_PROGRESS.inc()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - start) * 1000
+                timing = (
+                    f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                    f"total;dur={total_ms:.1f}"
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_request.reset(token)
+            metrics.HTTP_IN_PROGRESS.dec()
+            self._sample_threadpool()
+            latency_ms = (time.perf_counter() - start) * 1000
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            name = f"{scope['method']} {path}"
+            record_request(name, latency_ms, stats)
+            metrics.observe_request(
+                scope["method"], path, status, latency_ms / 1000, stats.queries, stats.db_time
+            )
+            if stats.queries > self.query_budget:
+                logger.warning(
+                    f"{name} issued {stats.queries} SQL queries "
+                    f"(budget {self.query_budget}, db {stats.db_time * 1000:.1f} ms)"
+                )
+
+    @staticmethod
+    def _sample_threadpool():
+        limiter = current_default_thread_limiter()
+        metrics.THREADPOOL_IN_USE.set(limiter.borrowed_tokens)
+        metrics.THREADPOOL_SIZE.set(limiter.total_tokens)
@@ -1,16 +1,56 @@
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
 from datetime import datetime
 import os
+from app.services.blob_storage import get_storage
+from app.utils.metrics import PDF_RENDER_LATENCY, timed
+
+INVOICE_PREFIX = "invoices/"
+# Stored PDFs older than this are removed by cleanup_invoices(); they are
+# re-rendered from the order if downloaded again
+INVOICE_RETENTION_DAYS = float(os.getenv("INVOICE_RETENTION_DAYS", 90))
+
+
+def invoice_key(invoice_number: str) -> str:
+    return f"{INVOICE_PREFIX}invoice_{invoice_number}.pdf"
+
+
+def cleanup_invoices(max_age_days: float = None) -> int:
+    """Delete stored invoice PDFs past the retention period. Returns the count."""
+    days = INVOICE_RETENTION_DAYS if max_age_days is None else max_age_days
+    return get_storage().cleanup(INVOICE_PREFIX, days * 86400)
+
+
+def warm_up_renderer():
+    """Load ReportLab and its fonts by rendering a throwaway page in memory."""
+    from io import BytesIO
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    c = canvas.Canvas(BytesIO(), pagesize=letter)
+    for font in ("Helvetica", "Helvetica-Bold"):
+        c.setFont(font, 12)
+        c.drawString(50, 50, "Beauty Shop")
+    c.save()
+
+
+@timed(PDF_RENDER_LATENCY)
+def generate_invoice_pdf(invoice_number: str, amount: float, email: str, items: list,
+                         created_at: datetime):
+    # ReportLab is heavy; import it on first render rather than at app startup
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    key = invoice_key(invoice_number)
+    with get_storage().open_write(key) as pdf_file:
+        _draw_invoice(canvas.Canvas(pdf_file, pagesize=letter), amount, email, items,
+                      created_at)
+    return key
+
+
+def _draw_invoice(c, amount, email, items, created_at):
+    """Draw the invoice onto a ReportLab canvas and save it."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
 
-def generate_invoice_pdf(invoice_number: str, amount: float, email: str, items: list):
-    os.makedirs("invoices", exist_ok=True)
-    
-    file_name = f"invoice_{invoice_number}.pdf"
-    file_path = os.path.join("invoices", file_name)
-    
-    c = canvas.Canvas(file_path, pagesize=letter)
     width, height = letter
     brand_color = colors.HexColor("#d63384") 
 
@@ -27,7 +67,7 @@ def generate_invoice_pdf(invoice_number: str, amount: float, email: str, items:
     c.drawString(50, height - 120, "BILL TO:")
     c.setFont("Helvetica", 11)
     c.drawString(50, height - 135, f"{email}")
-    c.drawRightString(width - 50, height - 120, datetime.now().strftime('%Y-%m-%d'))
+    c.drawRightString(width - 50, height - 120, created_at.strftime('%Y-%m-%d'))
 
     # Table Header
     c.setStrokeColor(brand_color)
@@ -69,5 +109,4 @@ def generate_invoice_pdf(invoice_number: str, amount: float, email: str, items:
     c.drawString(50, footer_y + 10, "Thank you for shopping with Beauty Shop Ltd!")
     c.drawString(50, footer_y - 5, "If you have any questions, please contact muiathomas.mt@gmail.com")
 
-    c.save()
-    return file_path
\ No newline at end of file
+    c.save()
\ No newline at end of file
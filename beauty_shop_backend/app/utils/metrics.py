@@ -0,0 +1,193 @@
+"""
+Prometheus metrics for the API.
+
+When PROMETHEUS_MULTIPROC_DIR is set (it must be set before any worker
+imports this module) every worker writes its samples to that directory and
+/metrics aggregates all of them, so the numbers are correct no matter which
+uvicorn/gunicorn worker answers the scrape.
+"""
+import os
+import time
+import functools
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+HTTP_REQUESTS = Counter(
+    "beauty_shop_http_requests_total",
+    "HTTP requests served",
+    ["method", "route", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "beauty_shop_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+HTTP_DB_QUERIES = Histogram(
+    "beauty_shop_http_request_db_queries",
+    "SQL statements issued per HTTP request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100),
+)
+HTTP_DB_SECONDS = Counter(
+    "beauty_shop_http_request_db_seconds_total",
+    "Time spent in SQL statements while serving HTTP requests",
+    ["method", "route"],
+)
+HTTP_IN_PROGRESS = Gauge(
+    "beauty_shop_http_requests_in_progress",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+THREADPOOL_IN_USE = Gauge(
+    "beauty_shop_threadpool_threads_in_use",
+    "Worker threads borrowed from the sync-endpoint threadpool",
+    multiprocess_mode="livesum",
+)
+THREADPOOL_SIZE = Gauge(
+    "beauty_shop_threadpool_threads_total",
+    "Size of the sync-endpoint threadpool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "beauty_shop_db_pool_checked_out",
+    "SQLAlchemy connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter(
+    "beauty_shop_db_pool_checkouts_total",
+    "SQLAlchemy pool checkouts",
+)
+DB_POOL_CONNECTS = Counter(
+    "beauty_shop_db_pool_connections_opened_total",
+    "New DBAPI connections opened by the pool",
+)
+MPESA_LATENCY = Histogram(
+    "beauty_shop_mpesa_request_duration_seconds",
+    "Latency of calls to the M-Pesa Daraja API",
+    ["endpoint", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+MPESA_CIRCUIT_STATE = Gauge(
+    "beauty_shop_mpesa_circuit_state",
+    "M-Pesa circuit breaker state: 0 closed, 1 half-open, 2 open (worst worker)",
+    multiprocess_mode="livemax",
+)
+MPESA_IN_FLIGHT = Gauge(
+    "beauty_shop_mpesa_requests_in_flight",
+    "Calls to the M-Pesa Daraja API currently waiting for a response",
+    multiprocess_mode="livesum",
+)
+MPESA_REJECTED = Counter(
+    "beauty_shop_mpesa_rejected_total",
+    "M-Pesa calls refused without reaching Daraja",
+    ["reason"],
+)
+PAYMENTS_RECONCILED = Counter(
+    "beauty_shop_payments_reconciled_total",
+    "Pending M-Pesa payments checked by the reconciler, by result",
+    ["outcome"],
+)
+SMTP_LATENCY = Histogram(
+    "beauty_shop_smtp_send_duration_seconds",
+    "Time to deliver an invoice email over SMTP",
+    ["outcome"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+PDF_RENDER_LATENCY = Histogram(
+    "beauty_shop_invoice_pdf_render_duration_seconds",
+    "Time to render an invoice PDF",
+    ["outcome"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+JOB_LATENCY = Histogram(
+    "beauty_shop_job_duration_seconds",
+    "Time to run a background job, by task and resulting status",
+    ["task", "outcome"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+
+
+def _outcome(result):
+    # The integrations report failures by return value rather than raising,
+    # some as the last item of a tuple (the M-Pesa token fetch)
+    if isinstance(result, tuple) and result:
+        result = result[-1]
+    if result is False or (isinstance(result, dict) and "errorCode" in result):
+        return "error"
+    return "ok"
+
+
+def timed(histogram, **labels):
+    """Decorator observing a call's duration, labelled with its outcome."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = _outcome(result)
+                return result
+            finally:
+                histogram.labels(outcome=outcome, **labels).observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def observe_request(method: str, route: str, status: int, latency: float, queries: int, db_time: float):
+    HTTP_REQUESTS.labels(method, route, str(status)).inc()
+    HTTP_LATENCY.labels(method, route).observe(latency)
+    HTTP_DB_QUERIES.labels(method, route).observe(queries)
+    HTTP_DB_SECONDS.labels(method, route).inc(db_time)
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKED_OUT.inc()
+    DB_POOL_CHECKOUTS.inc()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    DB_POOL_CHECKED_OUT.dec()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    DB_POOL_CONNECTS.inc()
+
+
+def install_pool_hooks():
+    """Track checkouts on every SQLAlchemy pool (idempotent)."""
+    if not event.contains(Pool, "checkout", _on_checkout):
+        event.listen(Pool, "checkout", _on_checkout)
+        event.listen(Pool, "checkin", _on_checkin)
+        event.listen(Pool, "connect", _on_connect)
+
+
+def metrics_payload():
+    """Return (body, content type) for the /metrics endpoint."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: int):
+    """Drop a dead worker's live gauges (call from the process manager)."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -1,12 +1,13 @@
-import requests
 import base64
 from datetime import datetime
 import os
-from dotenv import load_dotenv
+import time
 import logging
-
-# Load environment variables
-load_dotenv()
+import functools
+import threading
+from app.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, Bulkhead, CircuitBreaker
+from app.utils.helpers import normalize_phone
+from app.utils.metrics import MPESA_CIRCUIT_STATE, MPESA_IN_FLIGHT, MPESA_LATENCY, MPESA_REJECTED, timed
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
@@ -17,14 +18,151 @@ CONSUMER_SECRET = os.getenv("MPESA_CONSUMER_SECRET")
 BUSINESS_SHORTCODE = os.getenv("MPESA_SHORTCODE")
 PASSKEY = os.getenv("MPESA_PASSKEY")
 CALLBACK_URL = os.getenv("MPESA_CALLBACK_URL")
+BASE_URL = os.getenv("MPESA_BASE_URL", "https://sandbox.safaricom.co.ke").rstrip("/")
+
+# (connect, read) timeouts in seconds
+CONNECT_TIMEOUT = float(os.getenv("MPESA_CONNECT_TIMEOUT", 5))
+TOKEN_TIMEOUT = (CONNECT_TIMEOUT, float(os.getenv("MPESA_TOKEN_TIMEOUT", 10)))
+STK_TIMEOUT = (CONNECT_TIMEOUT, float(os.getenv("MPESA_STK_TIMEOUT", 30)))
+
+# Circuit breaker and bulkhead around every Daraja call (see
+# app/utils/circuit_breaker.py): trips when half of the last 20 calls failed
+# with a timeout, connection error, 5xx or 429, and refuses calls for 30 s
+BREAKER_WINDOW = int(os.getenv("MPESA_BREAKER_WINDOW", 20))
+BREAKER_MIN_CALLS = int(os.getenv("MPESA_BREAKER_MIN_CALLS", 5))
+BREAKER_FAILURE_RATE = float(os.getenv("MPESA_BREAKER_FAILURE_RATE", 0.5))
+BREAKER_OPEN_SECONDS = float(os.getenv("MPESA_BREAKER_OPEN_SECONDS", 30))
+# At most this many threads per worker wait on Daraja at once
+MAX_CONCURRENT = int(os.getenv("MPESA_MAX_CONCURRENT", 8))
+BULKHEAD_WAIT_SECONDS = float(os.getenv("MPESA_BULKHEAD_WAIT_SECONDS", 0.5))
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _on_state_change(name, state):
+    MPESA_CIRCUIT_STATE.set(_STATE_VALUES[state])
+    if state != CLOSED:
+        logger.warning(f"Circuit breaker {name} is {state}")
+
+
+breaker = CircuitBreaker(
+    "mpesa", window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS, failure_rate=BREAKER_FAILURE_RATE,
+    open_seconds=BREAKER_OPEN_SECONDS, on_state_change=_on_state_change,
+)
+bulkhead = Bulkhead(MAX_CONCURRENT, BULKHEAD_WAIT_SECONDS)
+
+# Access tokens are valid for an hour; reused until shortly before expiry
+_token_lock = threading.Lock()
+_token = {"value": None, "expires_at": 0.0}
+
+
+_OUTAGE = "_outage"
+
+
+def _outage(error):
+    """Mark an error dict as Daraja itself failing (timeout, connection error, HTTP 5xx or 429)."""
+    error[_OUTAGE] = True
+    return error
+
+
+def _is_outage(result) -> bool:
+    """Whether a result was marked by _outage. Errors raised locally, such as
+    missing credentials or configuration, never are: they say nothing about
+    Daraja."""
+    return isinstance(result, dict) and bool(result.get(_OUTAGE))
+
+
+def _unavailable(message, retry_after=None):
+    error = {"errorCode": "503", "errorMessage": message}
+    if retry_after is not None:
+        error["retryAfter"] = retry_after
+    return error
+
+
+def guarded(fn):
+    """Run a Daraja call inside the bulkhead and the circuit breaker.
+
+    Refused calls return a 503 error dict straight away. Outages (see
+    _is_outage) count as failures for the breaker; anything else,
+    including Daraja rejecting the request, counts as a success.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not bulkhead.acquire():
+            MPESA_REJECTED.labels(reason="bulkhead").inc()
+            logger.warning("M-Pesa call refused: too many calls in flight")
+            return _unavailable("M-Pesa is busy. Please try again.")
+        try:
+            if not breaker.allow():
+                MPESA_REJECTED.labels(reason="open").inc()
+                return _unavailable("M-Pesa is temporarily unavailable. Please try again shortly.",
+                                    retry_after=round(breaker.retry_after()))
+            MPESA_IN_FLIGHT.inc()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                MPESA_IN_FLIGHT.dec()
+                breaker.record(result is not None and not _is_outage(result))
+                if isinstance(result, dict):
+                    result.pop(_OUTAGE, None)  # for the breaker only, not callers
+        finally:
+            bulkhead.release()
+    return wrapper
+
+
+def daraja_retry_after() -> float:
+    """Seconds until the breaker lets calls through again (0 if it does now),
+    so callers can fail before doing any work."""
+    return breaker.retry_after()
+
+
+def _http_error(e, what):
+    """Error dict for an HTTP error response, Daraja's own body when it sent one."""
+    response = e.response
+    if response is None:
+        return _outage({"errorCode": "500", "errorMessage": f"{what} failed: {str(e)}"})
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    status = response.status_code
+    if isinstance(body, dict) and body.get("errorCode"):
+        error = body
+    else:
+        error = {"errorCode": str(status), "errorMessage": f"{what} failed: {str(e)}"}
+    return _outage(error) if status >= 500 or status == 429 else error
+
 
 def get_access_token():
     """
-    Get M-Pesa access token for API authentication.
+    Get M-Pesa access token for API authentication, reusing the cached
+    one until shortly before it expires.
     
     Returns:
         tuple: (access_token, error_dict) - One will be None if there's an error
     """
+    with _token_lock:
+        if _token["value"] and time.monotonic() < _token["expires_at"]:
+            return _token["value"], None
+        access_token, expires_in, error = _fetch_access_token()
+        if access_token:
+            _token["value"] = access_token
+            _token["expires_at"] = time.monotonic() + max(expires_in - 60, 0)
+        return access_token, error
+
+
+def forget_access_token():
+    """Drop the cached token, e.g. after Daraja rejected it."""
+    with _token_lock:
+        _token["value"] = None
+
+
+@timed(MPESA_LATENCY, endpoint="oauth")
+def _fetch_access_token():
+    import requests  # imported on first use to keep app startup fast
+
     # Validate credentials
     if not all([CONSUMER_KEY, CONSUMER_SECRET]):
         error = {
@@ -32,39 +170,44 @@ def get_access_token():
             "errorMessage": "M-Pesa credentials not configured. Check MPESA_CONSUMER_KEY and MPESA_CONSUMER_SECRET in .env"
         }
         logger.error(error["errorMessage"])
-        return None, error
+        return None, 0, error
     
-    url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
+    url = f"{BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
     
     try:
-        response = requests.get(url, auth=(CONSUMER_KEY, CONSUMER_SECRET), timeout=10)
+        response = requests.get(url, auth=(CONSUMER_KEY, CONSUMER_SECRET), timeout=TOKEN_TIMEOUT)
         response.raise_for_status()
         
-        access_token = response.json().get("access_token")
+        data = response.json()
+        access_token = data.get("access_token")
         if not access_token:
             error = {"errorCode": "500", "errorMessage": "No access token in M-Pesa response"}
             logger.error(error["errorMessage"])
-            return None, error
+            return None, 0, error
             
         logger.info("Successfully obtained M-Pesa access token")
-        return access_token, None
+        return access_token, float(data.get("expires_in") or 3599), None
         
     except requests.exceptions.Timeout:
-        error = {"errorCode": "504", "errorMessage": "M-Pesa authentication request timed out"}
+        error = _outage({"errorCode": "504", "errorMessage": "M-Pesa authentication request timed out"})
         logger.error(error["errorMessage"])
-        return None, error
+        return None, 0, error
     except requests.exceptions.ConnectionError as e:
-        error = {"errorCode": "500", "errorMessage": f"Cannot connect to M-Pesa service: {str(e)}"}
+        error = _outage({"errorCode": "500", "errorMessage": f"Cannot connect to M-Pesa service: {str(e)}"})
         logger.error(error["errorMessage"])
-        return None, error
+        return None, 0, error
     except requests.exceptions.HTTPError as e:
-        error = {"errorCode": "500", "errorMessage": f"M-Pesa authentication failed: {str(e)}"}
+        error = _http_error(e, "M-Pesa authentication")
         logger.error(error["errorMessage"])
-        return None, error
+        return None, 0, error
     except Exception as e:
         error = {"errorCode": "500", "errorMessage": f"Unexpected error getting M-Pesa token: {str(e)}"}
         logger.error(error["errorMessage"])
-        return None, error
+        return None, 0, error
+
+def _password(timestamp):
+    return base64.b64encode((BUSINESS_SHORTCODE + PASSKEY + timestamp).encode()).decode('utf-8')
+
 
 def initiate_stk_push(phone: str, amount: int, invoice_no: str):
     """
@@ -76,7 +219,8 @@ def initiate_stk_push(phone: str, amount: int, invoice_no: str):
         invoice_no: Invoice/order reference number
         
     Returns:
-        dict: Response from M-Pesa API
+        dict: Response from M-Pesa API, or an error dict (errorCode "503"
+        while the circuit breaker or the bulkhead refuses the call)
     """
     # Validate required configuration
     if not all([BUSINESS_SHORTCODE, PASSKEY, CALLBACK_URL]):
@@ -91,21 +235,14 @@ def initiate_stk_push(phone: str, amount: int, invoice_no: str):
             "errorMessage": error_msg
         }
     
-    # 1. Get Access Token
-    access_token, token_error = get_access_token()
-    if token_error:
-        return token_error
-    
     timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
     
-    # 2. Format Phone Number (Handle None, 07..., +254...)
+    # 1. Format Phone Number (Handle None, 07..., +254...)
     if not phone:
         logger.error("Phone number is None or empty")
         return {"errorCode": "400", "errorMessage": "PhoneNumber is None"}
         
-    clean_phone = str(phone).strip().replace("+", "")
-    if clean_phone.startswith("0"):
-        clean_phone = "254" + clean_phone[1:]
+    clean_phone = normalize_phone(phone) or ""
     
     # Validate phone number format
     if not clean_phone.startswith("254") or len(clean_phone) != 12:
@@ -116,16 +253,25 @@ def initiate_stk_push(phone: str, amount: int, invoice_no: str):
         }
     
     logger.info(f"Initiating STK push for phone: {clean_phone}, amount: {amount}, invoice: {invoice_no}")
-    
+    return _send_stk_push(clean_phone, amount, invoice_no, timestamp)
+
+
+@guarded
+@timed(MPESA_LATENCY, endpoint="stkpush")
+def _send_stk_push(clean_phone, amount, invoice_no, timestamp):
+    import requests  # imported on first use to keep app startup fast
+
+    # 2. Get Access Token
+    access_token, token_error = get_access_token()
+    if token_error:
+        return token_error
+
     # 3. Security Credentials
-    password_str = BUSINESS_SHORTCODE + PASSKEY + timestamp
-    password = base64.b64encode(password_str.encode()).decode('utf-8')
-    
     headers = {"Authorization": f"Bearer {access_token}"}
     
     payload = {
         "BusinessShortCode": BUSINESS_SHORTCODE,
-        "Password": password,
+        "Password": _password(timestamp),
         "Timestamp": timestamp,
         "TransactionType": "CustomerPayBillOnline",
         "Amount": int(amount),
@@ -139,10 +285,10 @@ def initiate_stk_push(phone: str, amount: int, invoice_no: str):
 
     try:
         response = requests.post(
-            "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest",
+            f"{BASE_URL}/mpesa/stkpush/v1/processrequest",
             json=payload,
             headers=headers,
-            timeout=30
+            timeout=STK_TIMEOUT
         )
         response.raise_for_status()
         
@@ -152,19 +298,85 @@ def initiate_stk_push(phone: str, amount: int, invoice_no: str):
         
     except requests.exceptions.Timeout:
         logger.error("M-Pesa API request timed out")
-        return {
+        return _outage({
             "errorCode": "504",
             "errorMessage": "Request timed out. Please try again."
-        }
+        })
+    except requests.exceptions.HTTPError as e:
+        logger.error(f"STK push rejected: {e}")
+        if e.response is not None and e.response.status_code == 401:
+            forget_access_token()
+        return _http_error(e, "STK push")
     except requests.exceptions.RequestException as e:
         logger.error(f"Network error during STK push: {e}")
-        return {
+        return _outage({
             "errorCode": "500",
             "errorMessage": f"Network error: {str(e)}"
-        }
+        })
     except Exception as e:
         logger.error(f"Unexpected error during STK push: {e}")
         return {
             "errorCode": "500",
             "errorMessage": f"Unexpected error: {str(e)}"
-        }
\ No newline at end of file
+        }
+
+
+def query_stk_push(checkout_request_id: str):
+    """
+    Ask Daraja for the outcome of an STK Push (STK Push Query API).
+
+    Returns:
+        dict: Daraja's answer, with ResultCode "0" once paid and another
+        ResultCode once the payment failed or was cancelled; or an error
+        dict. While the customer has not answered the prompt yet, the
+        result has no ResultCode and "processing" is True; when Daraja
+        does not know the CheckoutRequestID, "unknown_request" is True.
+    """
+    if not all([BUSINESS_SHORTCODE, PASSKEY]):
+        return {"errorCode": "500", "errorMessage": "M-Pesa configuration incomplete"}
+    return _send_stk_query(checkout_request_id, datetime.now().strftime('%Y%m%d%H%M%S'))
+
+
+@guarded
+@timed(MPESA_LATENCY, endpoint="stkpushquery")
+def _send_stk_query(checkout_request_id, timestamp):
+    import requests  # imported on first use to keep app startup fast
+
+    access_token, token_error = get_access_token()
+    if token_error:
+        return token_error
+
+    payload = {
+        "BusinessShortCode": BUSINESS_SHORTCODE,
+        "Password": _password(timestamp),
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_request_id,
+    }
+    try:
+        response = requests.post(
+            f"{BASE_URL}/mpesa/stkpushquery/v1/query",
+            json=payload,
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=STK_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.Timeout:
+        return _outage({"errorCode": "504", "errorMessage": "STK query timed out"})
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 401:
+            forget_access_token()
+        error = _http_error(e, "STK query")
+        # Daraja answers a payment still in progress with an HTTP 500
+        message = str(error.get("errorMessage", ""))
+        if "being processed" in message.lower():
+            return {"processing": True, "ResultDesc": message}
+        if "invalid checkoutrequestid" in message.lower():
+            return {"unknown_request": True, "ResultDesc": message}
+        logger.warning(f"STK query for {checkout_request_id} failed: {error}")
+        return error
+    except requests.exceptions.RequestException as e:
+        return _outage({"errorCode": "500", "errorMessage": f"Network error: {str(e)}"})
+    except Exception as e:
+        logger.error(f"Unexpected error during STK query: {e}")
+        return {"errorCode": "500", "errorMessage": f"Unexpected error: {str(e)}"}
@@ -0,0 +1,52 @@
+"""
+Opaque cursors for keyset ("seek") pagination.
+
+A cursor carries the sort key of the last row on a page; the next page is
+read with ``WHERE (sort_key) < (cursor values)`` against an index, so the
+cost of a page does not grow with how deep the admin has scrolled, unlike
+OFFSET.
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import String, type_coerce
+
+
+def encode_cursor(*values) -> str:
+    """Pack the last row's sort key (str, int or datetime values) into a cursor."""
+    packed = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(packed).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, count: int) -> list:
+    """Unpack a cursor made by encode_cursor. Raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != count:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def timestamp_key(db, column):
+    """Expression to select and compare a timestamp column as a cursor key.
+
+    SQLite stores timestamps as text in whatever format they were written
+    (CURRENT_TIMESTAMP has no fractional seconds, Python datetimes do), so
+    a bound datetime can miss rows with an equal timestamp. There the
+    stored text itself is the key; other databases use the timestamp.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return type_coerce(column, String)
+    return column
+
+
+def parse_timestamp_key(db, value):
+    """Turn a timestamp_key value taken from a cursor back into a bind value."""
+    if not isinstance(value, str):
+        raise ValueError("Invalid cursor")
+    if db.get_bind().dialect.name == "sqlite":
+        return value
+    return datetime.fromisoformat(value)
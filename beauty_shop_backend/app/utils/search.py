@@ -0,0 +1,14 @@
+"""
+Shared pieces of the admin LIKE searches (users, orders, support inbox).
+
+Terms are escaped so that %, _ and \\ typed by the admin match literally;
+the patterns are used with ``escape="\\\\"``.
+"""
+
+# Shorter search terms match the start of a column only; trigram
+# indexes cannot help below three characters.
+MIN_SUBSTRING_SEARCH = 3
+
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
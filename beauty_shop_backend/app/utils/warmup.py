@@ -0,0 +1,66 @@
+import os
+import time
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Connections opened ahead of the first request
+WARMUP_DB_CONNECTIONS = int(os.getenv("WARMUP_DB_CONNECTIONS", 2))
+
+_warmups = []
+
+
+def register_warmup(fn):
+    """Decorator adding a callable to the startup warm-up sequence."""
+    _warmups.append(fn)
+    return fn
+
+
+@register_warmup
+def prime_db_pool():
+    from app.database import engine
+
+    connections = [engine.connect() for _ in range(WARMUP_DB_CONNECTIONS)]
+    try:
+        for conn in connections:
+            conn.execute(text("SELECT 1"))
+    finally:
+        # Closing returns them to the pool, where they stay open
+        for conn in connections:
+            conn.close()
+
+
+@register_warmup
+def prime_pdf_renderer():
+    from app.utils.invoice import warm_up_renderer
+
+    warm_up_renderer()
+
+
+@register_warmup
+def prime_price_book():
+    from app.database import SessionLocal
+    from app.services.pricing import price_book
+
+    # Compiled here rather than by the first cart quote or checkout
+    with SessionLocal() as db:
+        price_book.current(db)
+
+
+def run_warmups():
+    """
+    Run every registered warm-up step in order.
+
+    A failing step is logged and skipped: a cold cache is slower, not broken,
+    so it should never keep the worker from starting.
+    """
+    for fn in _warmups:
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logger.warning(f"Warm-up step {fn.__name__} failed: {e}")
+            continue
+        logger.info(f"Warm-up step {fn.__name__} took {(time.perf_counter() - start) * 1000:.0f} ms")
@@ -0,0 +1,13 @@
+"""
+Fill orders.customer_email, customer_name and phone from customer_json for
+orders written before those columns existed. New orders get them from the
+write path. Runs in batches, committing each, so it can run against the
+live database and be stopped and restarted:
+
+    python backfill_order_customers.py
+"""
+from app.database import SessionLocal
+from app.services.order_service import backfill_customer_columns
+
+with SessionLocal() as db:
+    print(f"Filled customer columns of {backfill_customer_columns(db)} orders")
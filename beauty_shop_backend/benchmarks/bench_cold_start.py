@@ -0,0 +1,42 @@
+"""
+Cold start benchmark: how long it takes a fresh interpreter to import the app.
+Run: python -m benchmarks.bench_cold_start [runs]
+
+Each run imports app.main in a new process (what a Render scale-up or
+free-tier wakeup pays before it can serve) and reports the median wall time,
+plus which heavy modules were pulled in eagerly.
+"""
+import os
+import sys
+import json
+import subprocess
+import statistics
+
+HEAVY_MODULES = ["reportlab.pdfgen.canvas", "requests", "smtplib"]
+
+PROBE = (
+    "import sys, time, json; start = time.perf_counter(); import app.main; "
+    "elapsed = time.perf_counter() - start; "
+    f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))"
+)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples, loaded = [], []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=backend_dir, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        samples.append(result["seconds"] * 1000)
+        loaded = result["loaded"]
+    print(f"import app.main: median {statistics.median(samples):.0f} ms, "
+          f"min {min(samples):.0f} ms over {runs} runs")
+    print(f"heavy modules loaded at import: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark for the high-volume list endpoints.
+Run: python -m benchmarks.bench_list_endpoints [rows]
+
+Seeds an in-memory SQLite database with N rows (default 10,000) per table and
+compares, per request, the CPU time and peak Python memory of:
+  - before: ORM query -> dicts -> response_model validation -> JSON
+  - after:  Core column select -> dicts -> orjson bytes (current routes)
+"""
+import sys
+import time
+import json
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import User, Product, Category, Order, SupportMessage
+from app.schemas import ProductSchema
+from app.routes.products import _list_products
+from app.routes.orders import get_all_orders
+from app.routes.users import get_all_users, UserResponse
+from app.routes.support import get_all_support_messages
+
+
+def seed(db, rows):
+    db.add_all([Category(id=i, name=name) for i, name in ((1, 'Skincare'), (2, 'Haircare'), (3, 'Makeup'))])
+    now = datetime(2026, 1, 1)
+    db.bulk_insert_mappings(Product, [{
+        'name': f'Product {i}', 'description': 'A' * 80, 'price': 1000 + i,
+        'stock_quantity': 10, 'category_id': i % 3 + 1, 'image': f'https://img/{i}.jpg',
+        'rating': 4.5, 'is_new': i % 2 == 0,
+    } for i in range(rows)])
+    db.bulk_insert_mappings(User, [{
+        'email': f'user{i}@example.com', 'password': 'x', 'is_admin': False,
+    } for i in range(rows)])
+    items = json.dumps([{'name': 'Product 1', 'quantity': 2, 'price': 1001.0, 'totalPrice': 2002.0}])
+    customer = json.dumps({'firstName': 'A', 'lastName': 'B', 'email': 'a@b.co', 'address': '', 'city': '', 'zip': ''})
+    db.bulk_insert_mappings(Order, [{
+        'user_id': i % 100 + 1, 'total_amount': 2002.0, 'status': 'pending',
+        'created_at': now + timedelta(seconds=i), 'invoice_number': f'INV-{i}',
+        'public_id': f'ORD-{i}', 'customer_json': customer, 'items_json': items,
+    } for i in range(rows)])
+    db.bulk_insert_mappings(SupportMessage, [{
+        'name': 'A', 'email': 'a@b.co', 'subject': 'Hello', 'message': 'M' * 200,
+        'status': 'pending', 'created_at': now + timedelta(seconds=i),
+    } for i in range(rows)])
+    db.commit()
+
+
+def legacy_products(db):
+    category_map = {1: 'Skincare', 2: 'Haircare', 3: 'Makeup'}
+    products = db.query(Product).filter(
+        Product.name.isnot(None), Product.price.isnot(None), Product.category_id.isnot(None)
+    ).all()
+    result = [{
+        'id': p.id, 'name': p.name, 'description': p.description, 'price': p.price,
+        'category_id': p.category_id, 'category': category_map.get(p.category_id, 'Unknown'),
+        'stock_quantity': p.stock_quantity, 'stock': p.stock_quantity, 'image': p.image,
+        'rating': p.rating, 'is_new': p.is_new, 'isNew': p.is_new,
+    } for p in products]
+    validated = TypeAdapter(List[ProductSchema]).validate_python(result)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def legacy_orders(db):
+    orders = db.query(Order).order_by(Order.created_at.desc()).all()
+    result = [{
+        "id": o.public_id or o.id, "invoice_number": o.invoice_number or f"ORD-{o.id}",
+        "total_amount": o.total_amount, "status": o.status, "created_at": o.created_at,
+        "customer_json": o.customer_json, "items_json": o.items_json,
+    } for o in orders]
+    return json.dumps(jsonable_encoder(TypeAdapter(list).validate_python(result))).encode()
+
+
+def legacy_users(db):
+    users = db.query(User).all()
+    result = [{"id": u.id, "email": u.email, "is_admin": u.is_admin} for u in users]
+    validated = TypeAdapter(List[UserResponse]).validate_python(result)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def legacy_support(db):
+    messages = db.query(SupportMessage).order_by(SupportMessage.created_at.desc()).all()
+    result = [{
+        "id": m.id, "name": m.name, "email": m.email, "subject": m.subject,
+        "message": m.message, "status": m.status, "created_at": m.created_at,
+    } for m in messages]
+    return json.dumps(jsonable_encoder(result)).encode()
+
+
+def measure(session_factory, fn, repeat=5):
+    """Return (median CPU ms, peak KiB, body bytes) for one request."""
+    cpu, peak, size = [], 0, 0
+    for _ in range(repeat):
+        db = session_factory()
+        tracemalloc.start()
+        start = time.process_time()
+        body = fn(db)
+        cpu.append((time.process_time() - start) * 1000)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        db.close()
+        size = len(body)
+    cpu.sort()
+    return cpu[len(cpu) // 2], peak / 1024, size
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db = Session()
+    seed(db, rows)
+    db.close()
+    # The admin endpoints are called directly, so no token is involved
+    admin = User(email="admin@example.com", is_admin=True)
+
+    cases = [
+        # Catalog cache miss: what one request per catalog version pays
+        ("GET /api/products/", legacy_products, lambda db: orjson.dumps(_list_products(db, None, None))),
+        ("GET /api/orders/all", legacy_orders, lambda db: get_all_orders(db=db).body),
+        # First page of the paginated user listing
+        ("GET /api/users/", legacy_users,
+         lambda db: get_all_users(q=None, is_admin=None, include_summary=False, cursor=None, limit=50, db=db,
+                                 current_user=admin).body),
+        # First page of the paginated inbox (50 rows, truncated bodies)
+        ("GET /api/support/", legacy_support,
+         lambda db: get_all_support_messages(status=None, q=None, cursor=None, limit=50, db=db,
+                                            current_user=admin).body),
+    ]
+    print(f"{rows} rows per table")
+    print(f"{'endpoint':<22}{'before ms':>10}{'after ms':>10}{'before KiB':>12}{'after KiB':>11}")
+    for name, before_fn, after_fn in cases:
+        b_cpu, b_mem, _ = measure(Session, before_fn)
+        a_cpu, a_mem, _ = measure(Session, after_fn)
+        print(f"{name:<22}{b_cpu:>10.1f}{a_cpu:>10.1f}{b_mem:>12.0f}{a_mem:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Cart pricing benchmark.
+Run: python -m benchmarks.bench_pricing [products] [promotions]
+
+Compiles a price book over N synthetic products (default 100,000) and P
+promotions of every kind (default 5,000), then reports the compile time and
+the per-cart latency of pricing a 50-line cart with and without a coupon.
+"""
+import sys
+import time
+import random
+import statistics
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from app.services.pricing import BUNDLE, CATEGORY, COUPON, PERCENTAGE, PriceBook
+
+ProductRow = namedtuple("ProductRow", "id name price category_id")
+PromotionRow = namedtuple(
+    "PromotionRow",
+    "id name kind percent_off amount_off product_id category_id min_quantity bundle_price code "
+    "min_subtotal starts_at ends_at active",
+)
+
+CART_LINES = 50
+
+
+def synthetic_catalog(n, p):
+    rng = random.Random(42)
+    products = [ProductRow(i, f"Product {i}", float(rng.randint(100, 5000)), i % 3 + 1) for i in range(1, n + 1)]
+    promotions = []
+    for i in range(1, p + 1):
+        kind = (PERCENTAGE, BUNDLE, COUPON)[i % 3]
+        promotions.append(PromotionRow(
+            i, f"Promo {i}", kind, rng.choice((5, 10, 15, 25)) if kind != BUNDLE else None, None,
+            rng.randint(1, n) if kind != COUPON else None, None,
+            3 if kind == BUNDLE else None, 250.0 if kind == BUNDLE else None,
+            f"CODE{i}" if kind == COUPON else None, 1000.0 if kind == COUPON else None, None, None, True,
+        ))
+    promotions.append(PromotionRow(p + 1, "Makeup week", CATEGORY, 20, None, None, 3,
+                                   None, None, None, None, None, None, True))
+    return products, promotions
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return samples
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    p = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    products, promotions = synthetic_catalog(n, p)
+    book = PriceBook()
+
+    start = time.perf_counter()
+    book._compile(products, promotions, datetime.now(timezone.utc))
+    print(f"{n} products, {len(promotions)} promotions: compiled in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    rng = random.Random(7)
+    cart = [(rng.randint(1, n), rng.randint(1, 6)) for _ in range(CART_LINES)]
+    quote = book.price_cart(cart, "CODE2")
+    print(f"{CART_LINES}-line cart: subtotal {quote['subtotal']:.2f}, total {quote['total']:.2f}, "
+          f"coupon {quote['coupon'] or quote['couponError']}")
+
+    print(f"{'cart':<16}{'median us':>11}{'p99 us':>9}")
+    for label, coupon in (("no coupon", None), ("with coupon", "CODE2")):
+        samples = timed(lambda: book.price_cart(cart, coupon), 5000)
+        p99 = statistics.quantiles(samples, n=100)[98]
+        print(f"{label:<16}{statistics.median(samples):>11.1f}{p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
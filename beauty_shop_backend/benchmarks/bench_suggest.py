@@ -0,0 +1,86 @@
+"""
+Autocomplete benchmark.
+Run: python -m benchmarks.bench_suggest [products]
+
+Builds the suggest index over N synthetic products (default 100,000) and
+reports build time, per-query latency for short and long prefixes (first
+query and repeated), the cost of applying one product write, and, for
+comparison, the ILIKE scan behind /api/products/?search= on SQLite.
+"""
+import sys
+import time
+import random
+import statistics
+from collections import namedtuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import Category, Product
+from app.routes.products import _list_products
+from app.services.suggest_index import SuggestIndex
+
+Row = namedtuple("Row", "id name rating category price image")
+
+ADJECTIVES = ["Hydrating", "Radiant", "Velvet", "Matte", "Glow", "Gentle", "Intense", "Silky", "Pure", "Rose"]
+INGREDIENTS = ["Vitamin C", "Hyaluronic", "Retinol", "Argan", "Shea", "Aloe", "Collagen", "Niacinamide", "Charcoal", "Honey"]
+KINDS = ["Serum", "Moisturizer", "Cleanser", "Lipstick", "Mascara", "Shampoo", "Conditioner", "Toner", "Mask", "Oil"]
+CATEGORIES = ["Skincare", "Haircare", "Makeup"]
+QUERIES = ["v", "se", "ret", "hydra", "rose to", "vitamin c ser", "argan oil 12"]
+
+
+def synthetic_rows(n):
+    rng = random.Random(42)
+    return [
+        Row(i, f"{rng.choice(ADJECTIVES)} {rng.choice(INGREDIENTS)} {rng.choice(KINDS)} {i}",
+            round(rng.uniform(3, 5), 1), CATEGORIES[i % 3], 100.0 + i, None)
+        for i in range(1, n + 1)
+    ]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rows = synthetic_rows(n)
+    index = SuggestIndex()
+
+    start = time.perf_counter()
+    index.build(rows)
+    print(f"{n} products: index built in {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{len(index._keys)} terms")
+
+    print(f"{'query':<16}{'first ms':>10}{'median ms':>11}{'p99 ms':>9}")
+    for q in QUERIES:
+        first = timed(lambda: index.search(q, 8), 1)[0]
+        samples = timed(lambda: index.search(q, 8), 1000)
+        p99 = statistics.quantiles(samples, n=100)[98]
+        print(f"{q!r:<16}{first:>10.3f}{statistics.median(samples):>11.3f}{p99:>9.3f}")
+
+    updates = timed(lambda: index.add(Row(n + 1, "Rose Vitamin C Serum", 4.8, "Skincare", 100.0, None)) or index.remove(n + 1), 200)
+    print(f"product write (add + remove): median {statistics.median(updates):.3f} ms")
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([Category(id=i + 1, name=name) for i, name in enumerate(CATEGORIES)])
+        db.bulk_insert_mappings(Product, [
+            {"id": r.id, "name": r.name, "price": 100.0, "rating": r.rating, "category_id": r.id % 3 + 1}
+            for r in rows
+        ])
+        db.commit()
+        samples = timed(lambda: _list_products(db, None, "ser"), 5)
+        print(f"before: /api/products/?search=ser (ILIKE scan): median {statistics.median(samples):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Throughput of the production launcher at different worker counts.
+Run: python -m benchmarks.bench_workers [seconds] [worker counts...]
+e.g. python -m benchmarks.bench_workers 10 1 2 4
+
+For each worker count it starts `SERVER_MODE=multi python run.py` against a
+seeded SQLite file, drives GET /api/products/ from several load-generator
+processes over keep-alive connections, and prints requests per second.
+"""
+import os
+import sys
+import time
+import signal
+import tempfile
+import subprocess
+import http.client
+import multiprocessing
+
+PORT = 8765
+CLIENTS = 8
+
+
+def _client(deadline, results):
+    conn = http.client.HTTPConnection("127.0.0.1", PORT)
+    done = 0
+    while time.time() < deadline:
+        conn.request("GET", "/api/products/")
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            done += 1
+    results.put(done)
+
+
+def _wait_ready(timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def _seed(database_url):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.models import Base, Category, Product
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add_all([Category(id=i, name=n) for i, n in ((1, "Skincare"), (2, "Haircare"), (3, "Makeup"))])
+        db.add_all([
+            Product(name=f"Product {i}", description="Bench product", price=1000 + i,
+                    stock_quantity=10, category_id=i % 3 + 1)
+            for i in range(90)
+        ])
+        db.commit()
+
+
+def run(workers, seconds, env):
+    server = subprocess.Popen(
+        [sys.executable, "run.py"],
+        env=dict(env, WEB_CONCURRENCY=str(workers)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready()
+        results = multiprocessing.Queue()
+        deadline = time.time() + seconds
+        clients = [multiprocessing.Process(target=_client, args=(deadline, results)) for _ in range(CLIENTS)]
+        for c in clients:
+            c.start()
+        total = sum(results.get() for _ in clients)
+        for c in clients:
+            c.join()
+        return total / seconds
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    counts = [int(n) for n in sys.argv[2:]] or [1, 2, 4]
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    _seed(database_url)
+    env = dict(
+        os.environ, SERVER_MODE="multi", PORT=str(PORT), DATABASE_URL=database_url,
+        PERF_INSTRUMENTATION="1",
+    )
+    print(f"{multiprocessing.cpu_count()} CPUs, {CLIENTS} client processes, {seconds}s per run")
+    for workers in counts:
+        print(f"{workers} worker(s): {run(workers, seconds, env):,.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""
+Delete stored invoice PDFs older than the retention period.
+Run periodically, e.g. as a Render cron job:
+
+    python cleanup_invoices.py          # INVOICE_RETENTION_DAYS (default 90)
+    python cleanup_invoices.py 30       # explicit number of days
+
+Removed invoices are re-rendered from the order if someone downloads them.
+"""
+import sys
+from app.utils.invoice import cleanup_invoices
+
+days = float(sys.argv[1]) if len(sys.argv) > 1 else None
+print(f"Removed {cleanup_invoices(days)} expired invoice PDFs")
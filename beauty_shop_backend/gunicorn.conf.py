@@ -0,0 +1,52 @@
+"""
+Gunicorn settings for the production launcher (see run.py).
+
+The app is preloaded once in the master and forked into WEB_CONCURRENCY
+uvicorn workers. Send HUP to the master for a graceful restart of all
+workers; workers also recycle themselves after MAX_REQUESTS requests.
+"""
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+
+# One event-loop worker per core is the usual sweet spot for async workers
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# uvicorn's "auto" loop/http pick uvloop and httptools when installed
+worker_class = "uvicorn.workers.UvicornWorker"
+
+preload_app = True
+
+# Recycle workers to cap slow memory growth; jitter avoids restarting them all at once
+max_requests = int(os.getenv("MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 200))
+
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+keepalive = 5
+
+accesslog = "-"
+
+# Prometheus multiprocess mode: every worker writes samples here and /metrics
+# aggregates them. It has to be set (and emptied) before the app is preloaded.
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "beauty_shop_metrics")
+)
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def post_fork(server, worker):
+    # Never share pooled connections inherited from the master across processes
+    from app.database import engine
+
+    engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    from app.utils.metrics import mark_worker_dead
+
+    mark_worker_dead(worker.pid)
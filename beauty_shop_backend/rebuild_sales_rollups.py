@@ -0,0 +1,12 @@
+"""
+Recompute the hourly and daily sales rollups from the orders table.
+The write path keeps them current; run this after loading orders directly
+into the database or moving products between categories:
+
+    python rebuild_sales_rollups.py
+"""
+from app.database import SessionLocal
+from app.services.rollup_service import rebuild_sales_rollups
+
+with SessionLocal() as db:
+    print(f"Rebuilt sales rollups from {rebuild_sales_rollups(db)} orders")
@@ -0,0 +1,17 @@
+"""
+Fold new orders into the "frequently bought together" index.
+Run periodically, e.g. as a Render cron job:
+
+    python refresh_related_products.py
+
+Only orders placed since the previous run are read, so frequent runs are
+cheap; the first run processes the whole order history in batches.
+"""
+import logging
+from app.database import SessionLocal
+from app.services.recommendation_service import refresh_related_products
+
+logging.basicConfig(level=logging.INFO)
+
+with SessionLocal() as db:
+    print(f"Processed {refresh_related_products(db)} orders")
@@ -1,9 +1,22 @@
 import uvicorn
 import os
+import sys
 
 if __name__ == "__main__":
-    # This looks inside the 'app' folder for 'main.py' and the 'app' variable
-    # Disable reload in production (when RENDER env var is set)
-    reload = not os.getenv("RENDER", False)
+    # SERVER_MODE=dev (default locally): one auto-reloading process.
+    # SERVER_MODE=single: one plain process.
+    # SERVER_MODE=multi (default when the RENDER env var is set): hand over
+    # to gunicorn, which preloads the app and forks WEB_CONCURRENCY uvicorn
+    # workers (see gunicorn.conf.py).
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=reload)
\ No newline at end of file
+    mode = os.getenv("SERVER_MODE", "multi" if os.getenv("RENDER") else "dev")
+
+    if mode == "multi" and os.name != "nt":
+        os.execvp(sys.executable, [
+            sys.executable, "-m", "gunicorn",
+            "-c", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py"),
+            "app.main:app",
+        ])
+
+    # This looks inside the 'app' folder for 'main.py' and the 'app' variable
+    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=(mode == "dev"))
@@ -0,0 +1,103 @@
+"""
+A local stand-in for Safaricom's Daraja API, for tests.
+
+FakeDaraja serves the OAuth, STK Push and STK Push Query endpoints on
+127.0.0.1 from a background thread and records every request path. STK
+Push Query answers from `results` ({CheckoutRequestID: (ResultCode,
+ResultDesc)}); requests in `unknown` get Daraja's HTTP 400 for an invalid
+CheckoutRequestID, and any other request is "being processed", as Daraja
+says until the customer answers the prompt. `mode` decides how it
+answers: "ok", "error" (HTTP 500), "reject" (HTTP 400 with a Daraja error
+body) or "slow" (waits `delay` seconds, then answers as "ok").
+"""
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeDaraja:
+    def __init__(self):
+        self.mode = "ok"
+        self.delay = 0.0
+        self.requests = []
+        self.results = {}
+        self.unknown = set()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, path_prefix) -> int:
+        with self._lock:
+            return sum(path.startswith(path_prefix) for path in self.requests)
+
+    def _answer(self, path, body):
+        with self._lock:
+            self.requests.append(path)
+            n = len(self.requests)
+        if self.mode == "slow":
+            time.sleep(self.delay)
+        if self.mode == "error":
+            return 500, {"requestId": str(n), "errorCode": "500.001.1001", "errorMessage": "Internal Server Error"}
+        if self.mode == "reject":
+            return 400, {"requestId": str(n), "errorCode": "400.002.02", "errorMessage": "Bad Request - Invalid PhoneNumber"}
+        if path.startswith("/oauth/v1/generate"):
+            return 200, {"access_token": f"token-{n}", "expires_in": "3599"}
+        if path == "/mpesa/stkpush/v1/processrequest":
+            return 200, {
+                "MerchantRequestID": f"29115-{n}", "CheckoutRequestID": f"ws_CO_{n}",
+                "ResponseCode": "0", "ResponseDescription": "Success. Request accepted for processing",
+                "CustomerMessage": "Success. Request accepted for processing",
+            }
+        if path == "/mpesa/stkpushquery/v1/query":
+            checkout_request_id = (body or {}).get("CheckoutRequestID")
+            if checkout_request_id in self.unknown:
+                return 400, {"requestId": str(n), "errorCode": "400.002.02",
+                             "errorMessage": "Bad Request - Invalid CheckoutRequestID"}
+            if checkout_request_id not in self.results:
+                return 500, {"requestId": str(n), "errorCode": "500.001.1001",
+                             "errorMessage": "The transaction is being processed"}
+            result_code, result_desc = self.results[checkout_request_id]
+            return 200, {
+                "ResponseCode": "0", "ResponseDescription": "The service request has been accepted successfully",
+                "MerchantRequestID": f"29115-{n}", "CheckoutRequestID": checkout_request_id,
+                "ResultCode": result_code, "ResultDesc": result_desc,
+            }
+        return 404, {"errorCode": "404.001.01", "errorMessage": "Resource not found"}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, body=None):
+                status, payload = fake._answer(self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client timed out and left
+
+            def do_GET(self):
+                self._reply()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self._reply(json.loads(self.rfile.read(length) or b"{}"))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
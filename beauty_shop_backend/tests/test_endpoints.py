@@ -10,6 +10,8 @@ from app.main import app
 from app.database import Base, get_db
 from app.models import User, Product, Category, CartItem, Order
 from app.services.auth_service import hash_password, create_access_token
+from app.services.catalog_cache import catalog_cache
+from app.utils import mpesa
 
 # Load environment variables
 load_dotenv()
@@ -43,6 +45,10 @@ client = TestClient(app)
 def setup_database():
     """Create tables before each test and drop after"""
     Base.metadata.create_all(bind=engine)
+    # Fixtures write the catalog directly, bypassing the version bump
+    catalog_cache.clear()
+    # Checkouts in earlier tests may have tripped the M-Pesa breaker
+    mpesa.breaker.reset()
     yield
     Base.metadata.drop_all(bind=engine)
 
@@ -128,6 +134,36 @@ def auth_headers(test_token):
     return {"Authorization": f"Bearer {test_token}"}
 
 
+@pytest.fixture
+def invoice_dir(tmp_path, monkeypatch):
+    """Keep generated invoice PDFs out of the working tree"""
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture
+def admin_headers():
+    """Auth headers of an admin committed for real, so it outlives any request's rollback"""
+    with TestingSessionLocal() as db:
+        db.add(User(email="staff@example.com", password=hash_password("x"), is_admin=True))
+        db.commit()
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': 'staff@example.com'})}"}
+
+
+@pytest.fixture
+def daraja(monkeypatch):
+    """Point the M-Pesa client at a local fake Daraja (tests/fake_daraja.py)"""
+    from tests.fake_daraja import FakeDaraja
+    with FakeDaraja() as fake:
+        for name, value in (("BASE_URL", fake.url), ("CONSUMER_KEY", "key"), ("CONSUMER_SECRET", "secret"),
+                            ("BUSINESS_SHORTCODE", "174379"), ("PASSKEY", "passkey"),
+                            ("CALLBACK_URL", "https://example.com/api/orders/mpesa-callback"),
+                            ("STK_TIMEOUT", (1, 0.5))):
+            monkeypatch.setattr(mpesa, name, value)
+        mpesa.forget_access_token()
+        yield fake
+        mpesa.forget_access_token()
+
+
 # ====== AUTH ENDPOINTS TESTS ======
 
 class TestAuthEndpoints:
@@ -255,6 +291,285 @@ class TestProductEndpoints:
         assert len(data) == 1
 
 
+class TestCatalogCache:
+    """Test the precompressed, versioned catalog responses"""
+
+    def _create_product(self, name, **extra):
+        payload = {"name": name, "price": 100.0, "stock_quantity": 5, "category_id": 1, **extra}
+        response = client.post("/api/products/", json=payload)
+        assert response.status_code == 200
+        return response.json()
+
+    def test_listing_is_compressed(self):
+        """Test gzip and brotli negotiation above the size threshold"""
+        for i in range(20):
+            self._create_product(f"Product {i}", description="A long description " * 10)
+        for encoding in ("br", "gzip"):
+            response = client.get("/api/products/", headers={"Accept-Encoding": encoding})
+            assert response.status_code == 200
+            assert response.headers["content-encoding"] == encoding
+            assert "Accept-Encoding" in response.headers["vary"]
+            assert len(response.json()) == 20
+        response = client.get("/api/products/", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        assert len(response.json()) == 20
+
+    def test_small_responses_not_compressed(self):
+        """Test that bodies below the threshold are sent as is"""
+        response = client.get("/api/products/", headers={"Accept-Encoding": "gzip"})
+        assert response.json() == []
+        assert "content-encoding" not in response.headers
+
+    def test_etag_not_modified(self):
+        """Test conditional requests against the catalog version"""
+        self._create_product("Serum")
+        etag = client.get("/api/products/").headers["etag"]
+        response = client.get("/api/products/", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_writes_invalidate_cache(self):
+        """Test that product writes are visible on the next request"""
+        first = self._create_product("Serum")
+        etag = client.get("/api/products/").headers["etag"]
+        self._create_product("Toner")
+        response = client.get("/api/products/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert {p["name"] for p in response.json()} == {"Serum", "Toner"}
+        client.put(f"/api/products/{first['id']}", json={"name": "Night Serum"})
+        assert "Night Serum" in [p["name"] for p in client.get("/api/products/?category_id=1").json()]
+        client.delete(f"/api/products/{first['id']}")
+        assert [p["name"] for p in client.get("/api/products/").json()] == ["Toner"]
+
+    def test_cache_hit_skips_database(self):
+        """Test that a warm listing only checks the catalog version"""
+        self._create_product("Serum")
+        client.get("/api/products/")
+        response = client.get("/api/products/")
+        assert 'desc="0 queries"' in response.headers["server-timing"]
+        assert response.json()[0]["name"] == "Serum"
+
+    def test_get_categories(self, test_category):
+        """Test listing categories"""
+        response = client.get("/api/products/categories")
+        assert response.status_code == 200
+        assert response.json() == [{"id": test_category.id, "name": "Beauty Products"}]
+
+
+class TestProductFacets:
+    """Test faceted filtering on the columnar catalog"""
+
+    @pytest.fixture(autouse=True)
+    def products(self):
+        for name, price, rating, category_id, stock, is_new in [
+            ("Serum", 800.0, 4.8, 1, 5, True),
+            ("Cleanser", 300.0, 4.1, 1, 0, False),
+            ("Shampoo", 1200.0, 3.5, 2, 10, True),
+            ("Lipstick", 6000.0, 4.6, 3, 2, False),
+        ]:
+            client.post("/api/products/", json={
+                "name": name, "price": price, "rating": rating, "category_id": category_id,
+                "stock_quantity": stock, "is_new": is_new,
+            })
+
+    def _names(self, **params):
+        response = client.get("/api/products/", params=params)
+        assert response.status_code == 200
+        return [p["name"] for p in response.json()]
+
+    def test_filters(self):
+        """Test each filter and a combination"""
+        assert self._names(min_price=500, max_price=2000) == ["Serum", "Shampoo"]
+        assert self._names(min_rating=4.5) == ["Serum", "Lipstick"]
+        assert self._names(is_new=True) == ["Serum", "Shampoo"]
+        assert self._names(in_stock=False) == ["Cleanser"]
+        assert self._names(category_id=1, in_stock=True) == ["Serum"]
+        assert self._names(search="sham", min_price=0) == ["Shampoo"]
+
+    def test_facet_counts(self):
+        """Test that each facet ignores its own filter"""
+        response = client.get("/api/products/", params={"facets": True, "category_id": 1, "min_rating": 4.5})
+        data = response.json()
+        assert [p["name"] for p in data["items"]] == ["Serum"]
+        facets = data["facets"]
+        assert facets["total"] == 1
+        assert facets["category"] == {"1": 1, "3": 1}
+        assert facets["rating"] == {"4.5": 1, "4.0": 2, "3.0": 2}
+        assert [b["count"] for b in facets["price"]] == [0, 1, 0, 0, 0]
+        assert facets["is_new"] == 1 and facets["in_stock"] == 1
+
+    def test_price_buckets_match_filter(self):
+        """Test a bucket's count is what filtering by its bounds returns, edges included"""
+        client.post("/api/products/", json={"name": "Toner", "price": 500.0, "category_id": 1})
+        buckets = client.get("/api/products/", params={"facets": True}).json()["facets"]["price"]
+        assert [b["count"] for b in buckets] == [2, 2, 1, 0, 1]
+        for bucket in buckets:
+            params = {"min_price": bucket["min"]}
+            if bucket["max"] is not None:
+                params["max_price"] = bucket["max"]
+            assert len(self._names(**params)) == bucket["count"]
+
+    def test_writes_refresh_snapshot(self):
+        """Test that product writes show up in filtered listings"""
+        assert self._names(max_price=500) == ["Cleanser"]
+        serum = next(p for p in client.get("/api/products/").json() if p["name"] == "Serum")
+        client.put(f"/api/products/{serum['id']}", json={"price": 450.0, "name": "Vitamin C Brightening Serum"})
+        assert self._names(max_price=500) == ["Vitamin C Brightening Serum", "Cleanser"]
+        client.delete(f"/api/products/{serum['id']}")
+        client.post("/api/products/", json={"name": "Toner", "price": 200.0, "category_id": 1})
+        assert self._names(max_price=500) == ["Cleanser", "Toner"]
+
+
+class TestProductBatch:
+    """Test looking up several products in one request"""
+
+    def _create(self, name):
+        return client.post("/api/products/", json={"name": name, "price": 10.0, "category_id": 1}).json()["id"]
+
+    def test_batch_get(self):
+        """Test request order, duplicates and missing ids"""
+        serum, toner = self._create("Serum"), self._create("Toner")
+        response = client.get("/api/products/batch", params={"ids": f"{toner},999,{serum},{toner}"})
+        assert response.status_code == 200
+        data = response.json()
+        assert [p["name"] for p in data["items"]] == ["Toner", "Serum"]
+        assert data["missing"] == [999]
+
+    def test_batch_uses_warm_snapshot(self):
+        """Test that a warm catalog snapshot answers without a products query"""
+        serum = self._create("Serum")
+        client.get("/api/products/", params={"in_stock": "false"})  # warms the snapshot
+        response = client.get("/api/products/batch", params={"ids": str(serum)})
+        assert 'desc="0 queries"' in response.headers["server-timing"]
+        assert response.json()["items"][0]["name"] == "Serum"
+        client.delete(f"/api/products/{serum}")
+        assert client.get("/api/products/batch", params={"ids": str(serum)}).json()["missing"] == [serum]
+
+    def test_batch_post_and_validation(self):
+        """Test the POST form and input limits"""
+        serum = self._create("Serum")
+        response = client.post("/api/products/batch", json={"ids": [serum, 42]})
+        assert response.json()["missing"] == [42]
+        assert client.get("/api/products/batch", params={"ids": "1,abc"}).status_code == 400
+        too_many = ",".join(str(i) for i in range(101))
+        assert client.get("/api/products/batch", params={"ids": too_many}).status_code == 400
+        assert client.post("/api/products/batch", json={"ids": list(range(1001))}).status_code == 400
+
+
+class TestProductSuggest:
+    """Test the in-memory autocomplete index"""
+
+    def _create(self, name, rating, category_id=1):
+        payload = {"name": name, "price": 10.0, "rating": rating, "category_id": category_id}
+        return client.post("/api/products/", json=payload).json()["id"]
+
+    def _suggest(self, q, **params):
+        response = client.get("/api/products/suggest", params={"q": q, **params})
+        assert response.status_code == 200
+        return [s["name"] for s in response.json()]
+
+    def test_prefix_matching(self):
+        """Test matching at word starts, normalization and rating order"""
+        self._create("Vitamin C Serum", 4.9)
+        self._create("Velvet Lipstick", 4.2, category_id=3)
+        self._create("Hair Serum", 4.5, category_id=2)
+        assert self._suggest("v") == ["Vitamin C Serum", "Velvet Lipstick"]
+        assert self._suggest("ser") == ["Vitamin C Serum", "Hair Serum"]
+        assert self._suggest("C  SER") == ["Vitamin C Serum"]
+        assert self._suggest("Vitámin") == ["Vitamin C Serum"]
+        assert self._suggest("v", limit=1) == ["Vitamin C Serum"]
+        assert self._suggest("lotion") == []
+        assert self._suggest("  ") == []
+
+    def test_writes_update_index_incrementally(self):
+        """Test that local writes are applied without a rebuild"""
+        self._create("Vitamin C Serum", 4.9)
+        lipstick = self._create("Velvet Lipstick", 4.2)
+        assert self._suggest("v") == ["Vitamin C Serum", "Velvet Lipstick"]
+
+        client.put(f"/api/products/{lipstick}", json={"rating": 5.0})
+        response = client.get("/api/products/suggest", params={"q": "v"})
+        # Only the catalog version check; the index was updated in place
+        assert 'desc="1 queries"' in response.headers["server-timing"]
+        assert [s["name"] for s in response.json()] == ["Velvet Lipstick", "Vitamin C Serum"]
+
+        client.delete(f"/api/products/{lipstick}")
+        assert self._suggest("v") == ["Vitamin C Serum"]
+        self._create("Volume Mascara", 4.0)
+        assert self._suggest("vo") == ["Volume Mascara"]
+
+    def test_external_writes_trigger_rebuild(self, monkeypatch):
+        """Test that a catalog change made elsewhere rebuilds the index"""
+        from app.services import catalog_cache as catalog_cache_module
+        from app.models import CacheVersion
+        self._create("Vitamin C Serum", 4.9)
+        assert self._suggest("to") == []
+        with TestingSessionLocal() as db:
+            db.add(Product(name="Rose Toner", price=10.0, rating=4.0, category_id=1))
+            db.query(CacheVersion).update({CacheVersion.version: CacheVersion.version + 1})
+            db.commit()
+        monkeypatch.setattr(catalog_cache_module, "VERSION_CHECK_INTERVAL", 0)
+        assert self._suggest("to") == ["Rose Toner"]
+
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestRelatedProducts:
+    """Test the frequently-bought-together index"""
+
+    def _order(self, headers, *items):
+        customer = {"firstName": "A", "lastName": "B", "email": "a@example.com",
+                    "address": "1 Lane", "city": "Nairobi", "zip": "00100"}
+        response = client.post("/api/orders/", json={
+            "customer": customer, "items": [dict(item, quantity=1, price=10.0) for item in items],
+            "total": 10.0 * len(items), "paymentMethod": "card",
+        }, headers=headers)
+        assert response.status_code == 200
+
+    def _refresh(self):
+        from app.services.recommendation_service import refresh_related_products
+        with TestingSessionLocal() as db:
+            return refresh_related_products(db, settle_seconds=0)
+
+    def _catalog_version(self):
+        from app.models import CacheVersion
+        with TestingSessionLocal() as db:
+            return db.query(CacheVersion.version).filter(CacheVersion.name == "catalog").scalar()
+
+    def test_cooccurrence_counts(self):
+        """Test pair counts from the sparse product"""
+        from app.services.recommendation_service import cooccurrence
+        rows, cols, counts = cooccurrence([{1, 2}, {1, 2, 3}, {4}])
+        pairs = {(int(r), int(c)): int(n) for r, c, n in zip(rows, cols, counts)}
+        assert pairs == {(1, 2): 2, (2, 1): 2, (1, 3): 1, (3, 1): 1, (2, 3): 1, (3, 2): 1}
+
+    def test_related_products_incremental(self, auth_headers):
+        """Test that refreshes only fold in new orders"""
+        ids = [client.post("/api/products/", json={"name": name, "price": 10.0, "category_id": 1}).json()["id"]
+               for name in ("Serum", "Toner", "Mask")]
+        serum, toner, mask = ids
+        self._order(auth_headers, {"id": serum, "name": "Serum"}, {"id": toner, "name": "Toner"})
+        # Older orders carry only the product name
+        self._order(auth_headers, {"name": "Serum"}, {"name": "Toner"}, {"name": "Mask"})
+        assert self._refresh() == 2
+
+        related = client.get(f"/api/products/{serum}/related").json()
+        assert [(p["id"], p["bought_together"]) for p in related] == [(toner, 2), (mask, 1)]
+        assert self._refresh() == 0
+
+        self._order(auth_headers, {"id": serum, "name": "Serum"}, {"id": mask, "name": "Mask"})
+        self._order(auth_headers, {"id": serum, "name": "Serum"}, {"id": mask, "name": "Mask"})
+        catalog_version = self._catalog_version()
+        assert self._refresh() == 2
+        related = client.get(f"/api/products/{serum}/related").json()
+        assert [(p["id"], p["bought_together"]) for p in related] == [(mask, 3), (toner, 2)]
+        # Catalog caches and indexes are left alone
+        assert self._catalog_version() == catalog_version
+
+    def test_related_products_not_found(self):
+        """Test related products of a missing product"""
+        assert client.get("/api/products/999/related").status_code == 404
+
+
 # ====== CART ENDPOINTS TESTS ======
 
 class TestCartEndpoints:
@@ -388,6 +703,118 @@ class TestCartEndpoints:
         assert data[0]["quantity"] == 1
 
 
+# ====== PRICING TESTS ======
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestPricing:
+    """Test server-side pricing and promotions"""
+    
+    @pytest.fixture
+    def admin_headers(self):
+        with TestingSessionLocal() as db:
+            db.add(User(email="marketing@example.com", password=hash_password("x"), is_admin=True))
+            db.commit()
+        return {"Authorization": f"Bearer {create_access_token(data={'sub': 'marketing@example.com'})}"}
+    
+    @pytest.fixture
+    def catalog(self, admin_headers):
+        self.admin_headers = admin_headers
+        with TestingSessionLocal() as db:
+            db.add_all([Category(id=1, name="Skincare"), Category(id=2, name="Haircare")])
+            db.commit()
+        return {
+            name: client.post("/api/products/", json={"name": name, "price": price, "category_id": category_id}).json()["id"]
+            for name, price, category_id in (("Serum", 100.0, 1), ("Toner", 200.0, 1), ("Shampoo", 50.0, 2))
+        }
+    
+    def _promote(self, **payload):
+        response = client.post("/api/promotions/", json=payload, headers=self.admin_headers)
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+    
+    def _quote(self, catalog, coupon=None, **quantities):
+        items = [{"id": catalog[name], "quantity": n} for name, n in quantities.items()]
+        return client.post("/api/cart/quote", json={"items": items, "coupon_code": coupon}).json()
+    
+    def test_promotions_and_coupons(self, catalog):
+        """Test each line gets its best promotion and coupons apply to the rest"""
+        self._promote(name="Serum week", kind="percentage", product_id=catalog["Serum"], percent_off=10)
+        self._promote(name="Skincare sale", kind="category", category_id=1, percent_off=20)
+        self._promote(name="3 for 120", kind="bundle", product_id=catalog["Shampoo"], min_quantity=3, bundle_price=120)
+        self._promote(name="Welcome", kind="coupon", code="save10", percent_off=10, min_subtotal=400)
+        
+        quote = self._quote(catalog, Serum=2, Toner=1, Shampoo=4)
+        assert [(i["name"], i["totalPrice"], i["promotion"]) for i in quote["items"]] == [
+            ("Serum", 160.0, "Skincare sale"), ("Toner", 160.0, "Skincare sale"), ("Shampoo", 170.0, "3 for 120"),
+        ]
+        assert (quote["subtotal"], quote["discount"], quote["total"]) == (600.0, 110.0, 490.0)
+        
+        quote = self._quote(catalog, "Save10 ", Serum=2, Toner=1, Shampoo=4)
+        assert (quote["coupon"], quote["couponDiscount"], quote["total"]) == ("SAVE10", 49.0, 441.0)
+        assert self._quote(catalog, "SAVE10", Serum=1)["couponError"]
+        assert self._quote(catalog, "BOGUS", Serum=1)["couponError"] == "Unknown or expired coupon"
+        
+        quote = client.post("/api/cart/quote", json={"items": [{"id": 999}, {"name": "Toner", "quantity": 0}]}).json()
+        assert (quote["items"], quote["unavailable"], quote["total"]) == ([], [catalog["Toner"], 999], 0)
+    
+    def test_orders_ignore_client_prices(self, catalog, auth_headers):
+        """Test orders and checkout are priced by the server"""
+        self._promote(name="Fixed", kind="coupon", code="TAKE50", amount_off=50)
+        customer = {"firstName": "A", "lastName": "B", "email": "a@example.com",
+                    "address": "1 Lane", "city": "Nairobi", "zip": "00100"}
+        response = client.post("/api/orders/", headers=auth_headers, json={
+            "customer": customer, "items": [{"name": "Toner", "quantity": 2, "price": 1.0}],
+            "total": 2.0, "paymentMethod": "card", "couponCode": "take50",
+        })
+        assert response.status_code == 200
+        assert (response.json()["items"][0]["totalPrice"], response.json()["total"]) == (400.0, 350.0)
+        
+        response = client.post("/api/orders/checkout", headers=auth_headers, json={
+            "phone_number": "0712345678",
+            "cart_items": [{"id": catalog["Serum"], "name": "Serum", "quantity": 3, "price": 0.01}],
+        })
+        assert response.json()["order_details"]["total"] == 300.0
+        
+        for items, coupon in (([{"id": 999, "name": "Ghost", "quantity": 1}], None),
+                              ([{"id": catalog["Serum"], "name": "Serum", "quantity": 1}], "BOGUS")):
+            response = client.post("/api/orders/checkout", headers=auth_headers, json={
+                "phone_number": "0712345678", "cart_items": items, "coupon_code": coupon,
+            })
+            assert response.status_code == 400
+    
+    def test_promotion_lifecycle(self, catalog):
+        """Test validation, scheduled promotions and deletes"""
+        from datetime import datetime, timedelta, timezone
+        assert client.post("/api/promotions/", headers=self.admin_headers, json={"name": "x", "kind": "bogus"}).status_code == 400
+        assert client.post("/api/promotions/", headers=self.admin_headers, json={"name": "x", "kind": "bundle", "product_id": catalog["Serum"]}).status_code == 400
+        assert client.post("/api/promotions/", headers=self.admin_headers, json={"name": "x", "kind": "coupon", "code": "A"}).status_code == 400
+        assert client.post("/api/promotions/", headers=self.admin_headers, json={"name": "x", "kind": "percentage", "product_id": 999, "percent_off": 5}).status_code == 404
+        
+        later = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+        self._promote(name="Tomorrow", kind="percentage", product_id=catalog["Serum"], percent_off=50, starts_at=later)
+        promo = self._promote(name="Today", kind="percentage", product_id=catalog["Serum"], percent_off=25)
+        assert self._quote(catalog, Serum=1)["total"] == 75.0
+        assert len(client.get("/api/promotions/", headers=self.admin_headers).json()) == 2
+        
+        assert client.delete(f"/api/promotions/{promo}", headers=self.admin_headers).status_code == 200
+        assert self._quote(catalog, Serum=1)["total"] == 100.0
+        assert client.delete(f"/api/promotions/{promo}", headers=self.admin_headers).status_code == 404
+        
+        # Product writes reach the book without a rebuild
+        client.delete(f"/api/products/{catalog['Serum']}")
+        assert self._quote(catalog, Serum=1)["unavailable"] == [catalog["Serum"]]
+    
+    def test_promotions_need_admin(self, catalog, auth_headers):
+        """Test only admins can list, create or delete promotions"""
+        promo = self._promote(name="Staff", kind="percentage", product_id=catalog["Serum"], percent_off=10)
+        free = {"name": "Free", "kind": "coupon", "code": "FREE", "percent_off": 100}
+        assert client.post("/api/promotions/", json=free).status_code == 401
+        assert client.post("/api/promotions/", json=free, headers=auth_headers).status_code == 403
+        assert client.delete(f"/api/promotions/{promo}", headers=auth_headers).status_code == 403
+        assert client.get("/api/promotions/", headers=auth_headers).status_code == 403
+        assert len(client.get("/api/promotions/", headers=self.admin_headers).json()) == 1
+
+
 # ====== ORDER/CHECKOUT ENDPOINTS TESTS ======
 
 class TestOrderEndpoints:
@@ -517,6 +944,1156 @@ class TestOrderEndpoints:
         assert response.json()["order_details"]["total"] == 5400.0
 
 
+# ====== ORDER WRITE PATH TESTS ======
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestOrderWritePath:
+    """Test single-transaction order creation"""
+    
+    def test_create_order_sets_owner(self, test_product, test_user, auth_headers):
+        """Test that the order is stored with its owner in one request"""
+        response = client.post(
+            "/api/orders/",
+            headers=auth_headers,
+            json={
+                "customer": {
+                    "firstName": "Test", "lastName": "User", "email": "testuser@example.com",
+                    "address": "1 Lane", "city": "Nairobi", "zip": "00100"
+                },
+                "items": [{"name": "Face Cream", "quantity": 2, "price": 1500.0}],
+                "total": 3000.0,
+                "paymentMethod": "card"
+            }
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["id"].startswith("ORD-")
+        assert data["status"] == "Processing"
+        assert data["items"][0]["totalPrice"] == 3000.0
+        assert data["createdAt"]
+        
+        mine = client.get("/api/orders/", headers=auth_headers).json()
+        assert [o["id"] for o in mine] == [data["id"]]
+    
+    def test_checkout_round_trips(self, test_product, test_user, auth_headers, db_session, monkeypatch):
+        """Test checkout reads the cart in one query and writes in one batch"""
+        from app.services import catalog_cache as catalog_cache_module
+        from app.services.pricing import price_book
+        db_session.add(CartItem(user_id=test_user.id, product_id=test_product.id, quantity=2))
+        db_session.commit()
+        # Load the price book first and keep its version check out of the count
+        monkeypatch.setattr(catalog_cache_module, "VERSION_CHECK_INTERVAL", 3600)
+        price_book.current(db_session)
+        
+        response = client.post(
+            "/api/orders/checkout",
+            headers=auth_headers,
+            json={"phone_number": "0712345678"}
+        )
+        assert response.status_code == 200
+        assert response.json()["order_details"]["total"] == 3000.0
+        # user lookup, cart lines (priced from memory), INSERT ... RETURNING,
+        # order summary upsert, sales rollup upsert, cart DELETE, invoice job
+        assert 'desc="7 queries"' in response.headers["server-timing"]
+        assert client.get("/api/cart/", headers=auth_headers).json() == []
+    
+    def test_invoice_download(self, test_product, test_user, auth_headers, tmp_path):
+        """Test the invoice PDF downloads for its owner with Range support and is re-rendered if missing"""
+        order = client.post(
+            "/api/orders/",
+            headers=auth_headers,
+            json={
+                "customer": {
+                    "firstName": "Test", "lastName": "User", "email": "testuser@example.com",
+                    "address": "1 Lane", "city": "Nairobi", "zip": "00100"
+                },
+                "items": [{"name": "Face Cream", "quantity": 1, "price": 1500.0}],
+                "total": 1500.0,
+                "paymentMethod": "card"
+            }
+        ).json()
+        
+        response = client.get(f"/api/orders/{order['id']}/invoice", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert response.content.startswith(b"%PDF")
+        
+        partial = client.get(f"/api/orders/{order['id']}/invoice", headers={**auth_headers, "Range": "bytes=0-3"})
+        assert partial.status_code == 206
+        assert partial.content == b"%PDF"
+        
+        # Lost to retention cleanup (or another node's disk): rendered again
+        for pdf in (tmp_path / "invoices").iterdir():
+            pdf.unlink()
+        assert client.get(f"/api/orders/{order['id']}/invoice", headers=auth_headers).status_code == 200
+        assert client.get("/api/orders/ORD-UNKNOWN/invoice", headers=auth_headers).status_code == 404
+    
+    def test_invoice_download_restricted_to_owner_and_admin(self, test_product, auth_headers, admin_headers):
+        """Test other customers cannot fetch (or trigger renders of) someone else's invoice"""
+        order = client.post(
+            "/api/orders/",
+            headers=auth_headers,
+            json={
+                "customer": {
+                    "firstName": "Test", "lastName": "User", "email": "testuser@example.com",
+                    "address": "1 Lane", "city": "Nairobi", "zip": "00100"
+                },
+                "items": [{"name": "Face Cream", "quantity": 1, "price": 1500.0}],
+                "total": 1500.0,
+                "paymentMethod": "card"
+            }
+        ).json()
+        with TestingSessionLocal() as db:
+            db.add(User(email="shopper@example.com", password=hash_password("x")))
+            db.commit()
+        shopper = {"Authorization": f"Bearer {create_access_token(data={'sub': 'shopper@example.com'})}"}
+        
+        assert client.get(f"/api/orders/{order['id']}/invoice").status_code == 401
+        assert client.get(f"/api/orders/{order['id']}/invoice", headers=shopper).status_code == 404
+        assert client.get(f"/api/orders/{order['id']}/invoice", headers=admin_headers).status_code == 200
+    
+    def test_invoice_shows_order_date(self, test_product, auth_headers, monkeypatch, tmp_path):
+        """Test a re-rendered invoice carries the order's date, not the render date"""
+        from datetime import datetime
+        from reportlab import rl_config
+        monkeypatch.setattr(rl_config, "pageCompression", 0)
+        order = client.post(
+            "/api/orders/",
+            headers=auth_headers,
+            json={
+                "customer": {
+                    "firstName": "Test", "lastName": "User", "email": "testuser@example.com",
+                    "address": "1 Lane", "city": "Nairobi", "zip": "00100"
+                },
+                "items": [{"name": "Face Cream", "quantity": 1, "price": 1500.0}],
+                "total": 1500.0,
+                "paymentMethod": "card"
+            }
+        ).json()
+        with TestingSessionLocal() as db:
+            db.query(Order).filter(Order.public_id == order["id"]).update({"created_at": datetime(2024, 1, 15, 9, 30)})
+            db.commit()
+        for pdf in (tmp_path / "invoices").glob("*.pdf"):
+            pdf.unlink()
+        
+        response = client.get(f"/api/orders/{order['id']}/invoice", headers=auth_headers)
+        assert response.status_code == 200
+        assert b"2024-01-15" in response.content
+
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestInvoiceExport:
+    """Test the streamed ZIP export of invoices"""
+    
+    @pytest.fixture
+    def admin_headers(self):
+        # Committed for real: the streamed response closes its session early
+        with TestingSessionLocal() as db:
+            db.add(User(email="finance@example.com", password=hash_password("x"), is_admin=True))
+            db.commit()
+        return {"Authorization": f"Bearer {create_access_token(data={'sub': 'finance@example.com'})}"}
+    
+    def _orders(self, specs):
+        """Orders of (status, total, days ago); returns their invoice numbers"""
+        from datetime import datetime, timedelta, timezone
+        from app.services.order_service import insert_order
+        now = datetime.now(timezone.utc)
+        invoices = []
+        with TestingSessionLocal() as db:
+            for status, total, days_ago in specs:
+                order = insert_order(db, user_id=None, total=total, status=status,
+                                     customer={"email": "buyer@example.com"},
+                                     items=[{"name": "Serum", "quantity": 1, "price": total, "totalPrice": total}])
+                db.query(Order).filter(Order.id == order["id"]).update(
+                    {"created_at": now - timedelta(days=days_ago)}
+                )
+                invoices.append(order["invoice_number"])
+            db.commit()
+        return invoices
+    
+    def _export(self, headers, **params):
+        import io, zipfile
+        with client.stream("GET", "/api/orders/invoices/export", headers=headers, params=params) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/zip"
+            archive = zipfile.ZipFile(io.BytesIO(response.read()))
+        assert archive.testzip() is None
+        return archive
+    
+    def test_export_streams_invoices_and_manifest(self, admin_headers, monkeypatch):
+        """Test every invoice in range is rendered and streamed, with a manifest of totals"""
+        import csv, io
+        from datetime import datetime, timedelta, timezone
+        from app.services import invoice_export
+        from app.services.tasks import render_invoice
+        monkeypatch.setattr(invoice_export, "EXPORT_PAGE_SIZE", 2)  # several keyset pages
+        first, second, broken, old = self._orders([("paid", 1500.0, 3), ("pending", 500.0, 2),
+                                                   ("paid", 250.0, 1), ("paid", 900.0, 45)])
+        
+        def render(order):
+            if order.invoice_number == broken:
+                raise RuntimeError("renderer crashed")
+            return render_invoice(order)
+        monkeypatch.setattr(invoice_export, "render_invoice", render)
+        
+        archive = self._export(admin_headers)
+        names = archive.namelist()
+        assert names == [f"Invoice_{first}.pdf", f"Invoice_{second}.pdf", "manifest.csv"]
+        assert archive.read(names[0]).startswith(b"%PDF")
+        rows = list(csv.reader(io.StringIO(archive.read("manifest.csv").decode())))
+        assert rows[0] == list(invoice_export.MANIFEST_COLUMNS)
+        assert [(row[0], row[3], row[5], row[6]) for row in rows[1:-1]] == [
+            (first, "paid", "1500.00", f"Invoice_{first}.pdf"),
+            (second, "pending", "500.00", f"Invoice_{second}.pdf"),
+            (broken, "paid", "250.00", ""),
+        ]
+        assert rows[-1] == ["TOTAL", "3 orders", "", "", "", "2250.00", "2 files"]
+        
+        archive = self._export(admin_headers, status="pending")
+        assert archive.namelist() == [f"Invoice_{second}.pdf", "manifest.csv"]
+        # The admin UI's filter values are capitalized ('Paid', 'Processing')
+        archive = self._export(admin_headers, status="Paid")
+        assert archive.namelist() == [f"Invoice_{first}.pdf", "manifest.csv"]
+        
+        # Sent entry by entry as it is built, not as one body
+        now = datetime.now(timezone.utc)
+        chunks = list(invoice_export.stream_invoice_zip(TestingSessionLocal(), now - timedelta(days=30), now))
+        assert len(chunks) >= 3
+    
+    def test_export_pages_through_same_second_orders(self, monkeypatch):
+        """Test keyset pages do not skip orders whose server-set created_at falls in the same second"""
+        import io, zipfile
+        from datetime import datetime, timedelta, timezone
+        from app.services import invoice_export
+        from app.services.order_service import insert_order
+        with TestingSessionLocal() as db:
+            invoices = [insert_order(db, user_id=None, total=100.0, status="paid", customer={}, items=[])["invoice_number"]
+                        for _ in range(3)]
+            db.commit()
+        monkeypatch.setattr(invoice_export, "EXPORT_PAGE_SIZE", 1)
+        now = datetime.now(timezone.utc)
+        body = b"".join(invoice_export.stream_invoice_zip(TestingSessionLocal(), now - timedelta(days=1), now + timedelta(days=1)))
+        names = zipfile.ZipFile(io.BytesIO(body)).namelist()
+        assert names == [invoice_export.invoice_filename(number) for number in invoices] + ["manifest.csv"]
+    
+    def test_export_requires_admin(self, admin_headers, auth_headers):
+        """Test regular users are refused and bad ranges rejected"""
+        assert client.get("/api/orders/invoices/export", headers=auth_headers).status_code == 403
+        response = client.get("/api/orders/invoices/export", headers=admin_headers,
+                              params={"start": "2026-02-01", "end": "2026-01-01"})
+        assert response.status_code == 400
+
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestOrderSearch:
+    """Test admin order search on the customer columns"""
+    
+    @pytest.fixture
+    def admin_headers(self):
+        with TestingSessionLocal() as db:
+            db.add(User(email="support@example.com", password=hash_password("x"), is_admin=True))
+            db.commit()
+        return {"Authorization": f"Bearer {create_access_token(data={'sub': 'support@example.com'})}"}
+    
+    def _search(self, headers, **params):
+        response = client.get("/api/orders/search", headers=headers, params=params)
+        assert response.status_code == 200
+        return response.json()
+    
+    def test_search_by_email_name_and_phone(self, admin_headers, auth_headers):
+        """Test the write path fills the columns, and search matches them with keyset pages"""
+        from app.services.order_service import insert_order
+        customers = [
+            {"firstName": "Jane", "lastName": "Wanjiru", "email": "Jane.W@Example.com", "phone": "0722000111"},
+            {"firstName": "John", "lastName": "Otieno", "email": "otieno@example.com", "mpesaPhone": "+254733000222"},
+            {"firstName": "Janet", "lastName": "Akinyi", "email": "janet@example.com"},
+        ]
+        with TestingSessionLocal() as db:
+            for status, customer in zip(("paid", "pending", "paid"), customers):
+                insert_order(db, user_id=None, total=100.0, status=status, customer=customer, items=[])
+            db.commit()
+            row = db.query(Order.customer_email, Order.customer_name, Order.phone).order_by(Order.id).first()
+        assert tuple(row) == ("jane.w@example.com", "Jane Wanjiru", "254722000111")
+        
+        def names(**params):
+            return [item["customer_name"] for item in self._search(admin_headers, **params)["items"]]
+        
+        assert names(q="jane") == ["Janet Akinyi", "Jane Wanjiru"]
+        assert names(q="JANE", status="paid") == ["Janet Akinyi", "Jane Wanjiru"]
+        assert names(q="JANE", status="Paid") == ["Janet Akinyi", "Jane Wanjiru"]
+        assert names(q="ja") == ["Janet Akinyi", "Jane Wanjiru"]  # email prefix only
+        assert names(q="ot") == ["John Otieno"]
+        assert names(q="0722000") == ["Jane Wanjiru"]
+        assert names(q="254733") == ["John Otieno"]
+        assert names(q="100%") == []
+        
+        # Created in the same second: the cursor must not skip or repeat orders
+        first = self._search(admin_headers, limit=2)
+        second = self._search(admin_headers, limit=2, cursor=first["next_cursor"])
+        assert [i["customer_name"] for i in first["items"] + second["items"]] == \
+            ["Janet Akinyi", "John Otieno", "Jane Wanjiru"]
+        assert second["next_cursor"] is None
+        
+        assert client.get("/api/orders/search", headers=auth_headers).status_code == 403
+        response = client.get("/api/orders/search", headers=admin_headers, params={"cursor": "bogus"})
+        assert response.status_code == 400
+    
+    def test_backfill_customer_columns(self):
+        """Test older orders are filled from customer_json in batches, and a rerun does nothing"""
+        import json
+        from app.services.order_service import backfill_customer_columns
+        with TestingSessionLocal() as db:
+            for i in range(5):
+                db.add(Order(total_amount=10.0, status="paid", customer_json=json.dumps(
+                    {"firstName": f"Old{i}", "lastName": "", "email": f"OLD{i}@example.com", "mpesaPhone": "0711000000"}
+                )))
+            db.add(Order(total_amount=10.0, status="paid"))  # no customer at all
+            db.commit()
+            assert backfill_customer_columns(db, batch_size=2) == 5
+            rows = db.query(Order.customer_email, Order.customer_name, Order.phone).order_by(Order.id).all()
+            assert [tuple(r) for r in rows[:2]] == [("old0@example.com", "Old0", "254711000000"),
+                                                    ("old1@example.com", "Old1", "254711000000")]
+            assert tuple(rows[-1]) == (None, None, None)
+            assert backfill_customer_columns(db) == 0
+
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestJobQueue:
+    """Test the durable background job queue"""
+    
+    def _jobs(self):
+        from app.models import Job
+        with TestingSessionLocal() as db:
+            return db.query(Job).order_by(Job.id).all()
+    
+    def test_order_queues_invoice(self, test_product, test_user, auth_headers, tmp_path, monkeypatch):
+        """Test the invoice job is committed with the order and run by the worker"""
+        from app.services.job_queue import run_pending
+        monkeypatch.delenv("MAIL_SERVER", raising=False)  # render only
+        order = client.post(
+            "/api/orders/",
+            headers=auth_headers,
+            json={
+                "customer": {
+                    "firstName": "Test", "lastName": "User", "email": "testuser@example.com",
+                    "address": "1 Lane", "city": "Nairobi", "zip": "00100"
+                },
+                "items": [{"name": "Face Cream", "quantity": 1, "price": 1500.0}],
+                "total": 1500.0,
+                "paymentMethod": "card"
+            }
+        ).json()
+        [job] = self._jobs()
+        assert (job.task, job.status) == ("send_invoice", "queued")
+        assert not (tmp_path / "invoices").exists()  # nothing rendered in the request
+        
+        assert run_pending(TestingSessionLocal) == 1
+        [job] = self._jobs()
+        assert (job.status, job.attempts) == ("done", 1)
+        [pdf] = (tmp_path / "invoices").iterdir()
+        assert order["id"] and pdf.read_bytes().startswith(b"%PDF")
+    
+    def test_retry_then_dead_letter(self, monkeypatch):
+        """Test failures retry with backoff and end up dead after max_attempts"""
+        from datetime import datetime, timezone
+        from app.models import Job
+        from app.services import job_queue
+        calls = []
+        def flaky(db, n):
+            calls.append(n)
+            raise ValueError("boom")
+        monkeypatch.setitem(job_queue.TASKS, "flaky", job_queue.Task(flaky, "flaky", 2, None))
+        with TestingSessionLocal() as db:
+            job_queue.TASKS["flaky"].enqueue(db, n=7)
+            db.commit()
+        
+        assert job_queue.run_pending(TestingSessionLocal) == 1
+        [job] = self._jobs()
+        assert (job.status, job.attempts, job.last_error) == ("queued", 1, "ValueError: boom")
+        assert job.run_at.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+        assert job_queue.run_pending(TestingSessionLocal) == 0  # backing off
+        
+        with TestingSessionLocal() as db:
+            db.query(Job).update({"run_at": datetime(2000, 1, 1, tzinfo=timezone.utc)})
+            db.commit()
+        assert job_queue.run_pending(TestingSessionLocal) == 1
+        [job] = self._jobs()
+        assert (job.status, job.attempts) == ("dead", 2)
+        assert calls == [7, 7]
+        
+        with TestingSessionLocal() as db:
+            assert job_queue.retry_dead_jobs(db) == 1
+        assert self._jobs()[0].status == "queued"
+    
+    def test_expired_lease_is_reclaimed(self):
+        """Test a job whose worker died is handed to another worker"""
+        from datetime import datetime, timezone
+        from app.models import Job
+        from app.services import job_queue
+        with TestingSessionLocal() as db:
+            job_queue.enqueue(db, "noop")
+            db.commit()
+            assert len(job_queue.claim(db, "a", 10)) == 1
+            assert job_queue.claim(db, "b", 10) == []
+            db.query(Job).update({"locked_at": datetime(2000, 1, 1, tzinfo=timezone.utc)})
+            db.commit()
+            [job] = job_queue.claim(db, "b", 10)
+        assert job.attempts == 2
+        assert self._jobs()[0].locked_by == "b"
+    
+    def test_periodic_jobs_queued_once_per_interval(self):
+        """Test every worker can schedule periodic tasks without duplicates"""
+        from app.services import job_queue, tasks  # noqa: F401
+        with TestingSessionLocal() as db:
+            job_queue.schedule_periodic(db)
+            job_queue.schedule_periodic(db)  # a second worker
+        names = [job.task for job in self._jobs()]
+        assert sorted(names) == [
+            "cleanup_invoices", "purge_finished_jobs", "reconcile_payments", "refresh_related_products",
+        ]
+
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestOrderEvents:
+    """Test the order status and payment event stream"""
+    
+    def _pending_order(self, user_id, checkout_request_id="ws_CO_1"):
+        with TestingSessionLocal() as db:
+            order = Order(user_id=user_id, total_amount=1500.0, status="pending", public_id="ORD-PENDING",
+                          invoice_number="INV-PENDING", items_json="[]", checkout_request_id=checkout_request_id)
+            db.add(order)
+            db.commit()
+            return order.id
+    
+    def _callback(self, result_code, checkout_request_id="ws_CO_1"):
+        return {"Body": {"stkCallback": {
+            "MerchantRequestID": "29115-1", "CheckoutRequestID": checkout_request_id,
+            "ResultCode": result_code, "ResultDesc": "Processed" if result_code == 0 else "Cancelled by user",
+            "CallbackMetadata": {"Item": [
+                {"Name": "Amount", "Value": 1500.0}, {"Name": "MpesaReceiptNumber", "Value": "NLJ7RT61SV"},
+            ]} if result_code == 0 else {},
+        }}}
+    
+    def test_stream_requires_auth(self, test_user, test_token, auth_headers):
+        """Test the stream needs a token, and admin rights for the admin channel"""
+        assert client.get("/api/orders/events").status_code == 401
+        assert client.get("/api/orders/events", params={"token": "bogus"}).status_code == 401
+        assert client.get("/api/orders/events", params={"scope": "admin"}, headers=auth_headers).status_code == 403
+        assert client.get("/api/orders/events", params={"scope": "all", "token": test_token}).status_code == 422
+    
+    def test_status_change_pushed_to_owner_and_admin(self, test_user, auth_headers):
+        """Test update_order_status reaches the owner's and the admin channel, not other users"""
+        import asyncio
+        from app.services.order_events import broker, user_channel
+        order_id = self._pending_order(test_user.id)
+        
+        async def scenario():
+            admin = broker.subscribe(["admin"])
+            owner = broker.subscribe([user_channel(test_user.id)])
+            other = broker.subscribe([user_channel(test_user.id + 1)])
+            try:
+                response = await asyncio.to_thread(
+                    client.put, "/api/orders/ORD-PENDING/status", json={"status": "shipped"}
+                )
+                assert response.status_code == 200
+                for subscription in (admin, owner):
+                    event = await subscription.get(2)
+                    assert (event["type"], event["id"], event["status"], event["previous_status"]) == \
+                        ("order_status", "ORD-PENDING", "shipped", "pending")
+                assert await other.get(0.05) is None
+                # No change, no event
+                await asyncio.to_thread(client.put, f"/api/orders/{order_id}/status", json={"status": "shipped"})
+                assert await admin.get(0.05) is None
+            finally:
+                for subscription in (admin, owner, other):
+                    broker.unsubscribe(subscription)
+            assert broker.subscriber_count() == 0
+        
+        asyncio.run(scenario())
+    
+    def test_payment_callback_settles_order(self, test_user):
+        """Test the M-Pesa callback marks the order paid once and pushes a payment event"""
+        import asyncio
+        from app.services.order_events import broker, user_channel
+        self._pending_order(test_user.id)
+        
+        async def scenario():
+            owner = broker.subscribe([user_channel(test_user.id)])
+            try:
+                response = await asyncio.to_thread(client.post, "/api/orders/mpesa-callback", json=self._callback(0))
+                assert response.json()["ResultCode"] == 0
+                event = await owner.get(2)
+                assert (event["type"], event["status"], event["result_code"]) == ("payment", "paid", 0)
+                # Safaricom may deliver the callback again
+                await asyncio.to_thread(client.post, "/api/orders/mpesa/callback", json=self._callback(1032))
+                assert await owner.get(0.05) is None
+            finally:
+                broker.unsubscribe(owner)
+        
+        asyncio.run(scenario())
+        with TestingSessionLocal() as db:
+            order = db.query(Order).filter(Order.public_id == "ORD-PENDING").one()
+            assert (order.status, order.payment_reference) == ("paid", "NLJ7RT61SV")
+    
+    def test_failed_payment_and_rollback(self, test_user):
+        """Test failed payments are recorded, and events of rolled-back transactions are dropped"""
+        import asyncio
+        from app.services import order_events
+        self._pending_order(test_user.id)
+        
+        async def scenario():
+            admin = order_events.broker.subscribe(["admin"])
+            try:
+                with TestingSessionLocal() as db:
+                    order_events.emit(db, {"type": "order_status", "id": "X", "user_id": None})
+                    db.rollback()
+                    db.commit()
+                await asyncio.to_thread(client.post, "/api/orders/mpesa/callback", json=self._callback(1032))
+                event = await admin.get(2)
+                assert (event["type"], event["status"]) == ("payment", "payment_failed")
+            finally:
+                order_events.broker.unsubscribe(admin)
+        
+        asyncio.run(scenario())
+    
+    def test_stream_format(self, monkeypatch):
+        """Test the SSE framing, keep-alives and that owner ids are not sent"""
+        import asyncio, importlib
+        from app.services.order_events import broker
+        orders_routes = importlib.import_module("app.routes.orders")
+        monkeypatch.setattr(orders_routes, "EVENTS_KEEPALIVE_SECONDS", 0.01)
+        
+        async def scenario():
+            stream = orders_routes._event_stream(["admin"])
+            assert await stream.__anext__() == b"retry: 3000\n\n"
+            assert await stream.__anext__() == b": keep-alive\n\n"
+            broker.publish({"type": "payment", "id": "ORD-1", "user_id": 7, "status": "paid"})
+            chunk = await stream.__anext__()
+            assert chunk == b'event: payment\ndata: {"type":"payment","id":"ORD-1","status":"paid"}\n\n'
+            await stream.aclose()
+            assert broker.subscriber_count() == 0
+        
+        asyncio.run(scenario())
+
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestDarajaResilience:
+    """Test the circuit breaker and bulkhead around M-Pesa, against a fake Daraja"""
+    
+    def _push(self):
+        return mpesa.initiate_stk_push("0712345678", 100, "INV-TEST")
+    
+    def test_breaker_state_machine(self):
+        """Test trip on failure rate, half-open trials and recovery"""
+        from app.utils.circuit_breaker import CircuitBreaker
+        now = [0.0]
+        breaker = CircuitBreaker("test", window=4, min_calls=4, failure_rate=0.5, open_seconds=10, clock=lambda: now[0])
+        for success in (True, False, True):
+            assert breaker.allow()
+            breaker.record(success)
+        assert breaker.state == "closed"  # too few calls to judge
+        breaker.record(False)
+        assert (breaker.state, breaker.allow(), breaker.retry_after()) == ("open", False, 10)
+        
+        now[0] = 10
+        assert breaker.allow() and not breaker.allow()  # one trial at a time
+        breaker.record(False)
+        assert breaker.state == "open"
+        now[0] = 20
+        assert breaker.allow()
+        breaker.record(True)
+        assert (breaker.state, breaker.retry_after()) == ("closed", 0)
+    
+    def test_stk_push_reuses_token(self, daraja):
+        """Test pushes through the guard, with one token fetch for several pushes"""
+        assert self._push()["ResponseCode"] == "0"
+        assert self._push()["CheckoutRequestID"]
+        assert (daraja.count("/oauth"), daraja.count("/mpesa/stkpush")) == (1, 2)
+        
+        daraja.mode = "reject"  # Daraja refusing a request is not an outage
+        for _ in range(6):
+            assert self._push()["errorCode"] == "400.002.02"
+        assert mpesa.breaker.state == "closed"
+    
+    def test_config_errors_do_not_trip_breaker(self, daraja, monkeypatch):
+        """Test missing credentials fail every push without counting as a Daraja outage"""
+        monkeypatch.setattr(mpesa, "CONSUMER_KEY", None)
+        for _ in range(mpesa.BREAKER_MIN_CALLS * 2):
+            assert self._push() == {
+                "errorCode": "500",
+                "errorMessage": "M-Pesa credentials not configured. Check MPESA_CONSUMER_KEY and MPESA_CONSUMER_SECRET in .env",
+            }
+        assert mpesa.breaker.state == "closed"
+        assert daraja.count("/oauth") == 0
+    
+    def test_open_breaker_fails_fast(self, daraja, monkeypatch):
+        """Test an outage opens the breaker, checkout then fails fast, and recovery closes it"""
+        # Committed for real: the refused checkout rolls back db_session's transaction
+        with TestingSessionLocal() as db:
+            db.add(User(email="buyer@example.com", password=hash_password("x")))
+            db.commit()
+        auth_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'buyer@example.com'})}"}
+        product_id = client.post("/api/products/", json={"name": "Serum", "price": 100.0, "category_id": 1}).json()["id"]
+        daraja.mode = "error"
+        for _ in range(mpesa.BREAKER_MIN_CALLS):
+            error = self._push()
+            assert error["errorCode"].startswith("500") and "_outage" not in error
+        calls = len(daraja.requests)
+        assert self._push()["errorCode"] == "503"
+        assert len(daraja.requests) == calls
+        assert "beauty_shop_mpesa_circuit_state 2.0" in client.get("/metrics").text
+        
+        response = client.post("/api/orders/checkout", headers=auth_headers, json={
+            "phone_number": "0712345678", "cart_items": [{"id": product_id, "quantity": 1}],
+        })
+        assert response.status_code == 503
+        assert int(response.headers["retry-after"]) > 0
+        assert client.get("/api/orders/", headers=auth_headers).json() == []
+        
+        daraja.mode = "ok"
+        monkeypatch.setattr(mpesa.breaker, "open_seconds", 0)  # as if the open period had passed
+        response = client.post("/api/orders/checkout", headers=auth_headers, json={
+            "phone_number": "0712345678", "cart_items": [{"id": product_id, "quantity": 1}],
+        })
+        assert response.json()["mpesa_status"]["ResponseCode"] == "0"
+        assert mpesa.breaker.state == "closed"
+        assert "beauty_shop_mpesa_circuit_state 0.0" in client.get("/metrics").text
+    
+    def test_bulkhead_caps_concurrent_calls(self, daraja, monkeypatch):
+        """Test calls beyond the bulkhead are refused while Daraja is slow, and timeouts count as failures"""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.utils.circuit_breaker import Bulkhead
+        monkeypatch.setattr(mpesa, "bulkhead", Bulkhead(2))
+        assert self._push()["ResponseCode"] == "0"  # token cached
+        daraja.mode, daraja.delay = "slow", 1.0
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda _: self._push(), range(4)))
+        codes = sorted(r["errorCode"] for r in results)
+        assert codes == ["503", "503", "504", "504"]
+        assert daraja.count("/mpesa/stkpush") == 3
+
+
+class TestPaymentReconciler:
+    """Test reconciling pending M-Pesa payments with STK Push Query"""
+    
+    def _orders(self, user_id, ages):
+        """Pending orders with CheckoutRequestIDs ws_CO_0, ws_CO_1, ..., created `ages` seconds ago"""
+        from datetime import datetime, timedelta, timezone
+        from app.services.order_service import insert_order
+        now = datetime.now(timezone.utc)
+        with TestingSessionLocal() as db:
+            for i, age in enumerate(ages):
+                order = insert_order(db, user_id=user_id, total=500.0, status="pending", customer={},
+                                     items=[{"id": 1, "name": "Lip Balm", "quantity": 1, "price": 500.0, "totalPrice": 500.0}])
+                db.query(Order).filter(Order.id == order["id"]).update(
+                    {"checkout_request_id": f"ws_CO_{i}", "created_at": now - timedelta(seconds=age)}
+                )
+            db.commit()
+    
+    def _statuses(self):
+        with TestingSessionLocal() as db:
+            return [status for status, in db.query(Order.status).order_by(Order.checkout_request_id)]
+    
+    def test_reconcile_settles_and_expires(self, daraja, test_user):
+        """Test paid, failed, still processing and abandoned orders, and that fresh orders are not queried"""
+        from app.services.payment_reconciler import reconcile_pending_payments
+        from sqlalchemy import func
+        from app.models import SalesRollup
+        self._orders(test_user.id, [600, 600, 600, 7200, 30])
+        daraja.results = {"ws_CO_0": ("0", "The service request is processed successfully."),
+                          "ws_CO_1": ("1032", "Request cancelled by user")}
+        with TestingSessionLocal() as db:
+            counts = reconcile_pending_payments(db)
+        assert counts == {"paid": 1, "payment_failed": 1, "pending": 1, "expired": 1}
+        assert self._statuses() == ["paid", "payment_failed", "pending", "expired", "pending"]
+        assert daraja.count("/mpesa/stkpushquery") == 4
+        
+        with TestingSessionLocal() as db:
+            by_status = dict(db.query(SalesRollup.status, func.sum(SalesRollup.order_count))
+                             .filter(SalesRollup.granularity == "day", SalesRollup.category_id == 0)
+                             .group_by(SalesRollup.status).all())
+        assert by_status == {"paid": 1, "payment_failed": 1, "pending": 2, "expired": 1}
+        
+        # Settled orders are not queried again
+        daraja.results["ws_CO_2"] = ("0", "The service request is processed successfully.")
+        with TestingSessionLocal() as db:
+            assert reconcile_pending_payments(db) == {"paid": 1}
+        assert daraja.count("/mpesa/stkpushquery") == 5
+    
+    def test_reconcile_stops_while_daraja_is_down(self, daraja, test_user):
+        """Test an outage opens the breaker, stops the run early and expires nothing"""
+        from app.services.payment_reconciler import reconcile_pending_payments
+        self._orders(test_user.id, [7200] * 12)
+        daraja.mode = "error"
+        with TestingSessionLocal() as db:
+            counts = reconcile_pending_payments(db)
+        assert counts == {"unavailable": 12}
+        assert set(self._statuses()) == {"pending"}
+        assert mpesa.breaker.state == "open"
+        assert daraja.count("/mpesa/stkpushquery") < 12
+    
+    def test_reconcile_never_expires_on_errors(self, daraja, test_user):
+        """Test rejected queries leave old orders pending, and unknown requests expire"""
+        from app.services.payment_reconciler import reconcile_pending_payments
+        self._orders(test_user.id, [7200, 7200])
+        daraja.mode = "reject"  # e.g. bad credentials: every call answers HTTP 400
+        with TestingSessionLocal() as db:
+            counts = reconcile_pending_payments(db)
+        assert counts == {"unavailable": 2}
+        assert self._statuses() == ["pending", "pending"]
+        assert mpesa.breaker.state == "closed"
+        
+        daraja.mode = "ok"
+        daraja.unknown = {"ws_CO_0"}
+        with TestingSessionLocal() as db:
+            assert reconcile_pending_payments(db) == {"expired": 2}
+        assert self._statuses() == ["expired", "expired"]
+    
+    def test_reconcile_expires_orders_never_sent_to_mpesa(self, daraja, test_user):
+        """Test orders whose STK Push failed expire once old enough, without asking Daraja"""
+        from datetime import datetime, timedelta, timezone
+        from app.services.payment_reconciler import reconcile_pending_payments
+        from app.services.order_service import insert_order
+        now = datetime.now(timezone.utc)
+        with TestingSessionLocal() as db:
+            ids = [insert_order(db, user_id=test_user.id, total=500.0, status="pending", customer={}, items=[])["id"]
+                   for _ in range(2)]
+            db.query(Order).filter(Order.id == ids[0]).update({"created_at": now - timedelta(seconds=7200)})
+            db.query(Order).filter(Order.id == ids[1]).update({"created_at": now - timedelta(seconds=600)})
+            db.commit()
+        daraja.mode = "error"  # not consulted, so an outage does not hold them back
+        with TestingSessionLocal() as db:
+            assert reconcile_pending_payments(db) == {"expired": 1}
+            assert [db.get(Order, order_id).status for order_id in ids] == ["expired", "pending"]
+        assert daraja.count("/mpesa/stkpushquery") == 0
+    
+    def test_reconcile_pages_through_same_second_orders(self, daraja, test_user, monkeypatch):
+        """Test batches do not skip orders whose server-set created_at falls in the same second"""
+        from datetime import datetime, timedelta, timezone
+        from app.services import payment_reconciler
+        from app.services.order_service import insert_order
+        with TestingSessionLocal() as db:
+            for i in range(3):
+                order = insert_order(db, user_id=test_user.id, total=500.0, status="pending", customer={}, items=[])
+                db.query(Order).filter(Order.id == order["id"]).update({"checkout_request_id": f"ws_CO_{i}"})
+            db.commit()
+        monkeypatch.setattr(payment_reconciler, "RECONCILE_BATCH_SIZE", 1)
+        later = datetime.now(timezone.utc) + timedelta(hours=2)
+        with TestingSessionLocal() as db:
+            assert payment_reconciler.reconcile_pending_payments(db, now=later) == {"expired": 3}
+    
+    def test_rate_limiter_spaces_calls(self):
+        """Test the limiter lets calls through at the configured rate"""
+        from app.utils.circuit_breaker import RateLimiter
+        now, waits = [0.0], []
+        limiter = RateLimiter(4, clock=lambda: now[0], sleep=waits.append)
+        for _ in range(3):
+            limiter.wait()
+        assert waits == [0.25, 0.5]
+        now[0] = 10
+        limiter.wait()
+        assert waits == [0.25, 0.5]
+
+
+# ====== SUPPORT INBOX TESTS ======
+
+class TestSupportInbox:
+    """Test the paginated admin support inbox"""
+    
+    @pytest.fixture(autouse=True)
+    def admin(self, admin_headers):
+        self.admin_headers = admin_headers
+    
+    def _send(self, subject, message="Hello there"):
+        response = client.post("/api/support/", json={
+            "name": "Jane", "email": "jane@example.com", "subject": subject, "message": message
+        })
+        assert response.status_code == 200
+        return response.json()["id"]
+    
+    def test_cursor_pagination_walks_every_message(self):
+        """Test that following next_cursor returns each message once, newest first"""
+        ids = [self._send(f"Question {i}") for i in range(5)]
+        seen, cursor = [], None
+        for _ in range(10):  # bounded, in case the cursor stops advancing
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = client.get("/api/support/", params=params, headers=self.admin_headers).json()
+            seen.extend(item["id"] for item in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert seen == list(reversed(ids))
+    
+    def test_list_truncates_bodies(self):
+        """Test that list rows carry a preview and the detail has the full body"""
+        message_id = self._send("Long", "x" * 500)
+        item = client.get("/api/support/", headers=self.admin_headers).json()["items"][0]
+        assert len(item["message"]) == 200
+        assert item["truncated"] is True
+        assert client.get(f"/api/support/{message_id}", headers=self.admin_headers).json()["message"] == "x" * 500
+    
+    def test_status_filter_and_counts(self):
+        """Test counters follow creates and status changes"""
+        first = self._send("One")
+        self._send("Two")
+        counts = client.get("/api/support/", headers=self.admin_headers).json()["counts"]
+        assert counts == {"pending": 2, "resolved": 0, "closed": 0, "all": 2}
+        
+        assert client.put(f"/api/support/{first}/status", json={"status": "resolved"}, headers=self.admin_headers).status_code == 200
+        # Same status again must not move the counters
+        client.put(f"/api/support/{first}/status", json={"status": "resolved"}, headers=self.admin_headers)
+        page = client.get("/api/support/", params={"status": "resolved"}, headers=self.admin_headers).json()
+        assert [item["id"] for item in page["items"]] == [first]
+        assert page["counts"] == {"pending": 1, "resolved": 1, "closed": 0, "all": 2}
+        assert client.put(f"/api/support/{first}/status", json={"status": "bogus"}, headers=self.admin_headers).status_code == 400
+        assert client.put("/api/support/999/status", json={"status": "closed"}, headers=self.admin_headers).status_code == 404
+    
+    def test_search(self):
+        """Test searching subject and message text"""
+        refund = self._send("Refund request", "My order arrived damaged")
+        self._send("Delivery", "When will 100% of it arrive?")
+        assert [i["id"] for i in client.get("/api/support/", params={"q": "damaged"}, headers=self.admin_headers).json()["items"]] == [refund]
+        assert [i["id"] for i in client.get("/api/support/", params={"q": "refund"}, headers=self.admin_headers).json()["items"]] == [refund]
+        assert len(client.get("/api/support/", params={"q": "100%"}, headers=self.admin_headers).json()["items"]) == 1
+    
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        assert client.get("/api/support/", params={"cursor": "not-a-cursor"}, headers=self.admin_headers).status_code == 400
+
+
+# ====== IMAGE ENDPOINTS TESTS ======
+    
+    def test_inbox_requires_admin(self, auth_headers):
+        """Test only the contact form is open; reading and updating messages needs an admin"""
+        message_id = self._send("Private", "My phone is 0712345678")
+        assert client.get("/api/support/", headers=auth_headers).status_code == 403
+        assert client.get(f"/api/support/{message_id}", headers=auth_headers).status_code == 403
+        assert client.put(f"/api/support/{message_id}/status", json={"status": "closed"},
+                          headers=auth_headers).status_code == 403
+        assert client.get(f"/api/support/{message_id}").status_code == 401
+
+
+class TestImageEndpoints:
+    """Test product image upload and variant serving"""
+    
+    @pytest.fixture(autouse=True)
+    def image_cache(self, tmp_path, monkeypatch):
+        from app.services import image_service
+        monkeypatch.setattr(image_service, "IMAGE_CACHE_DIR", str(tmp_path))
+    
+    def _png(self, width=1000, height=600):
+        from io import BytesIO
+        from PIL import Image
+        buf = BytesIO()
+        Image.new("RGB", (width, height), (214, 51, 132)).save(buf, "PNG")
+        return buf.getvalue()
+    
+    def test_upload_and_serve_variants(self, admin_headers):
+        """Test upload returns variant URLs served as resized, cacheable images"""
+        response = client.post("/api/images/", files={"file": ("p.png", self._png(), "image/png")}, headers=admin_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data["urls"]) == {"thumb", "card", "full"}
+        
+        webp = client.get(data["urls"]["thumb"], headers={"Accept": "image/avif,image/webp,*/*"})
+        assert webp.status_code == 200
+        assert webp.headers["content-type"] == "image/webp"
+        assert "immutable" in webp.headers["cache-control"]
+        
+        jpeg = client.get(data["urls"]["card"], headers={"Accept": "image/*"})
+        assert jpeg.headers["content-type"] == "image/jpeg"
+        from io import BytesIO
+        from PIL import Image
+        assert Image.open(BytesIO(jpeg.content)).width == 480
+    
+    def test_upload_same_content_same_hash(self, admin_headers):
+        """Test that identical uploads are stored once"""
+        first = client.post("/api/images/", files={"file": ("a.png", self._png(), "image/png")}, headers=admin_headers).json()
+        second = client.post("/api/images/", files={"file": ("b.png", self._png(), "image/png")}, headers=admin_headers).json()
+        assert first["hash"] == second["hash"]
+    
+    def test_upload_rejects_non_image(self, admin_headers):
+        """Test that non-image uploads are rejected"""
+        response = client.post("/api/images/", files={"file": ("x.png", b"not an image", "image/png")}, headers=admin_headers)
+        assert response.status_code == 400
+    
+    def test_unknown_image_or_size(self, admin_headers):
+        """Test 404 for unknown hashes, sizes and path tricks"""
+        assert client.get(f"/api/images/{'0' * 64}/thumb").status_code == 404
+        assert client.get("/api/images/..%2F..%2Fetc/thumb").status_code == 404
+        data = client.post("/api/images/", files={"file": ("p.png", self._png(), "image/png")}, headers=admin_headers).json()
+        assert client.get(f"/api/images/{data['hash']}/huge").status_code == 404
+
+
+# ====== LIST ENDPOINTS TESTS ======
+    
+    def test_image_writes_need_admin(self):
+        """Test uploads and ingest are refused to anyone but admins"""
+        with TestingSessionLocal() as db:
+            db.add(User(email="shopper@example.com", password=hash_password("x")))
+            db.commit()
+        auth_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'shopper@example.com'})}"}
+        files = {"file": ("p.png", self._png(), "image/png")}
+        assert client.post("/api/images/", files=files, headers=auth_headers).status_code == 403
+        response = client.post("/api/images/ingest", json={"url": "https://example.com/p.png"}, headers=auth_headers)
+        assert response.status_code == 403
+        assert client.post("/api/images/", files=files).status_code == 401
+    
+    def test_ingest_refuses_internal_hosts(self, admin_headers):
+        """Test ingest never fetches loopback, private or link-local addresses"""
+        for url in ("http://127.0.0.1:8000/api/products/", "http://localhost/x.png", "http://10.0.0.5/x.png",
+                    "http://169.254.169.254/latest/meta-data/", "http://[::ffff:127.0.0.1]/x.png", "file:///etc/passwd"):
+            response = client.post("/api/images/ingest", json={"url": url}, headers=admin_headers)
+            assert response.status_code == 400, url
+            assert response.json()["detail"] in ("Image URL must point to a public host",
+                                                 "Only http(s) image URLs can be ingested")
+
+
+class TestListEndpoints:
+    """Test the column-projected list endpoints"""
+    
+    def test_get_all_orders_shape(self, test_user, db_session):
+        """Test admin order listing keeps the legacy row shape"""
+        order = Order(user_id=test_user.id, total_amount=1500.0, status="pending")
+        db_session.add(order)
+        db_session.commit()
+        db_session.refresh(order)
+        order_id = order.id
+        
+        response = client.get("/api/orders/all")
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data) == 1
+        assert data[0]["id"] == order_id
+        assert data[0]["invoice_number"] == f"ORD-{order_id}"
+        assert data[0]["total_amount"] == 1500.0
+        assert isinstance(data[0]["created_at"], str)
+    
+    def test_get_user_orders_only_own(self, test_user, test_admin_user, auth_headers, db_session):
+        """Test that users only see their own orders"""
+        db_session.add_all([
+            Order(user_id=test_user.id, total_amount=100.0, public_id="ORD-MINE"),
+            Order(user_id=test_admin_user.id, total_amount=200.0, public_id="ORD-OTHER"),
+        ])
+        db_session.commit()
+        
+        response = client.get("/api/orders/", headers=auth_headers)
+        assert response.status_code == 200
+        assert [o["id"] for o in response.json()] == ["ORD-MINE"]
+    
+    def test_get_all_users(self, test_user, test_admin_user):
+        """Test user listing returns only the public fields"""
+        expected = [
+            {"id": test_user.id, "email": test_user.email, "is_admin": False},
+            {"id": test_admin_user.id, "email": test_admin_user.email, "is_admin": True},
+        ]
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': test_admin_user.email})}"}
+        response = client.get("/api/users/", headers=headers)
+        assert response.status_code == 200
+        assert response.json() == {"items": expected, "next_cursor": None}
+
+
+# ====== USER LISTING TESTS ======
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestUserListing:
+    """Test the paginated, searchable admin user listing"""
+    
+    @pytest.fixture
+    def many_users(self):
+        # Created through the API: rows committed via db_session do not
+        # survive the first request's session closing on the shared connection
+        for name in ("alice", "albert", "bob", "carol", "admin0"):
+            client.post("/api/users/", json={
+                "email": f"{name}@example.com", "password": "x", "is_admin": name == "admin0"
+            })
+        self.headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'admin0@example.com'})}"}
+    
+    def test_cursor_pagination(self, many_users):
+        """Test that following next_cursor visits every user once, by id"""
+        seen, cursor = [], None
+        for _ in range(10):  # bounded, in case the cursor stops advancing
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = client.get("/api/users/", params=params, headers=self.headers).json()
+            seen.extend(u["email"] for u in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert len(seen) == 5
+        assert client.get("/api/users/count", headers=self.headers).json() == {"count": 5}
+        assert client.get("/api/users/", params={"cursor": "bogus"}, headers=self.headers).status_code == 400
+    
+    def test_search_and_role_filter(self, many_users):
+        """Test short terms match email prefixes and longer ones substrings"""
+        def emails(**params):
+            return sorted(u["email"] for u in client.get("/api/users/", params=params, headers=self.headers).json()["items"])
+        assert emails(q="al") == ["albert@example.com", "alice@example.com"]
+        assert emails(q="ro") == []
+        assert emails(q="ROL") == ["carol@example.com"]
+        assert emails(q="%") == []
+        assert emails(is_admin="true") == ["admin0@example.com"]
+    
+    def test_listing_requires_admin(self, many_users):
+        """Test the listing and count are refused to anyone but admins"""
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'alice@example.com'})}"}
+        assert client.get("/api/users/", params={"include_summary": "true"}, headers=headers).status_code == 403
+        assert client.get("/api/users/count", headers=headers).status_code == 403
+        assert client.get("/api/users/").status_code == 401
+    
+    def test_order_summary_follows_orders(self, test_product, test_user, auth_headers, many_users):
+        """Test that placing orders updates the user's summary row"""
+        client.post("/api/products/", json={"name": "Lip Balm", "price": 500.0, "category_id": test_product.category_id})
+        for name, price in (("Face Cream", 1500.0), ("Lip Balm", 500.0)):
+            client.post("/api/orders/", headers=auth_headers, json={
+                "customer": {
+                    "firstName": "Test", "lastName": "User", "email": "testuser@example.com",
+                    "address": "1 Lane", "city": "Nairobi", "zip": "00100"
+                },
+                "items": [{"name": name, "quantity": 1, "price": price}],
+                "total": price,
+                "paymentMethod": "card"
+            })
+        user = client.get("/api/users/", params={"include_summary": "true"}, headers=self.headers).json()["items"][0]
+        assert user["order_count"] == 2
+        assert user["lifetime_spend"] == 2000.0
+        assert user["last_order_at"]
+        assert client.delete(f"/api/users/{user['id']}").status_code == 200
+
+
+@pytest.mark.usefixtures("invoice_dir")
+class TestSalesRollups:
+    """Test the hourly/daily sales rollups and the range endpoint"""
+
+    def _order(self, headers, items, total):
+        customer = {"firstName": "A", "lastName": "B", "email": "a@example.com",
+                    "address": "1 Lane", "city": "Nairobi", "zip": "00100"}
+        response = client.post("/api/orders/", headers=headers, json={
+            "customer": customer, "items": items, "total": total, "paymentMethod": "card",
+        })
+        assert response.status_code == 200
+        with TestingSessionLocal() as db:
+            return db.query(Order.id).filter(Order.public_id == response.json()["id"]).scalar()
+
+    @pytest.fixture(autouse=True)
+    def admin(self, admin_headers):
+        self.admin_headers = admin_headers
+
+    def _sales(self, **params):
+        response = client.get("/api/analytics/sales", params=params, headers=self.admin_headers)
+        assert response.status_code == 200
+        return response.json()["series"]
+
+    def test_sales_rollups(self, auth_headers):
+        """Test rollups follow order creation and status changes"""
+        serum = client.post("/api/products/", json={"name": "Serum", "price": 100.0, "category_id": 1}).json()["id"]
+        client.post("/api/products/", json={"name": "Shampoo", "price": 50.0, "category_id": 2})
+        first = self._order(auth_headers, [
+            {"id": serum, "name": "Serum", "quantity": 2, "price": 100.0},
+            {"name": "Shampoo", "quantity": 1, "price": 50.0},
+        ], 250.0)
+        self._order(auth_headers, [{"id": serum, "name": "Serum", "quantity": 1, "price": 100.0}], 100.0)
+
+        (day,) = self._sales()
+        assert (day["revenue"], day["orders"], day["units"], day["average_basket"]) == (350.0, 2, 4, 175.0)
+        by_category = {p["category_id"]: (p["revenue"], p["orders"]) for p in self._sales(group_by="category")}
+        assert by_category == {1: (300.0, 2), 2: (50.0, 1)}
+        assert [p["orders"] for p in self._sales(granularity="hour")] == [2]
+
+        assert client.put(f"/api/orders/{first}/status", json={"status": "Shipped"}).status_code == 200
+        by_status = {p["status"]: (p["revenue"], p["orders"]) for p in self._sales(group_by="status")}
+        assert by_status == {"Processing": (100.0, 1), "Shipped": (250.0, 1)}
+        assert self._sales(status="Shipped", category_id=2)[0]["revenue"] == 50.0
+
+        from app.services.rollup_service import rebuild_sales_rollups
+        with TestingSessionLocal() as db:
+            assert rebuild_sales_rollups(db) == 2
+        assert {p["status"]: (p["revenue"], p["orders"]) for p in self._sales(group_by="status")} == by_status
+
+    def test_sales_range_validation(self):
+        """Test invalid granularity, grouping and ranges"""
+        assert self._sales() == []
+        assert client.get("/api/analytics/sales", params={"granularity": "week"}, headers=self.admin_headers).status_code == 400
+        assert client.get("/api/analytics/sales", params={"group_by": "user"}, headers=self.admin_headers).status_code == 400
+        params = {"start": "2026-02-01T00:00:00", "end": "2026-01-01T00:00:00"}
+        assert client.get("/api/analytics/sales", params=params, headers=self.admin_headers).status_code == 400
+        params = {"start": "2020-01-01T00:00:00", "end": "2026-01-01T00:00:00", "granularity": "hour"}
+        assert client.get("/api/analytics/sales", params=params, headers=self.admin_headers).status_code == 400
+
+
+# ====== INSTRUMENTATION TESTS ======
+
+    def test_sales_require_admin(self, auth_headers):
+        """Test sales figures are refused to anyone but admins"""
+        assert client.get("/api/analytics/sales", headers=auth_headers).status_code == 403
+        assert client.get("/api/analytics/sales").status_code == 401
+
+
+class TestInstrumentation:
+    """Test per-request performance instrumentation"""
+    
+    def test_server_timing_header(self, test_product):
+        """Test that responses report db time and query count"""
+        response = client.get(f"/api/products/{test_product.id}")
+        assert response.status_code == 200
+        timing = response.headers["server-timing"]
+        assert "db;dur=" in timing
+        assert 'desc="1 queries"' in timing
+        assert "total;dur=" in timing
+    
+    def test_route_stats_recorded(self):
+        """Test that latency is aggregated under the route template"""
+        from app.utils.instrumentation import route_snapshot
+        client.get("/api/products/999")
+        stats = route_snapshot()["GET /api/products/{product_id}"]
+        assert stats["requests"] >= 1
+        assert stats["queries_sum"] >= 1
+        assert sum(stats["buckets"].values()) == stats["requests"]
+
+
+# ====== METRICS ENDPOINT TESTS ======
+
+class TestMetricsEndpoint:
+    """Test the Prometheus scrape endpoint"""
+    
+    def test_metrics_exposes_http_and_pool(self, test_product):
+        """Test that request and connection pool metrics are exported"""
+        client.get("/api/products/")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'beauty_shop_http_requests_total{method="GET",route="/api/products/",status="200"}' in body
+        assert "beauty_shop_db_pool_checkouts_total" in body
+        assert "beauty_shop_threadpool_threads_total" in body
+    
+    def test_failed_token_fetch_is_an_error(self, monkeypatch):
+        """Test an M-Pesa call returning (None, ..., error) is observed as an error"""
+        from prometheus_client import REGISTRY
+        name = "beauty_shop_mpesa_request_duration_seconds_count"
+        labels = {"endpoint": "oauth", "outcome": "error"}
+        before = REGISTRY.get_sample_value(name, labels) or 0
+        monkeypatch.setattr(mpesa, "CONSUMER_KEY", None)
+        access_token, _, error = mpesa._fetch_access_token()
+        assert access_token is None and error["errorCode"] == "500"
+        assert REGISTRY.get_sample_value(name, labels) == before + 1
+    
+    def test_metrics_aggregate_across_workers(self, tmp_path):
+        """Test multiprocess mode sums samples written by separate workers"""
+        import subprocess, sys
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+        worker = (
+            "from app.utils.metrics import PDF_RENDER_LATENCY; "
+            "PDF_RENDER_LATENCY.labels(outcome='ok').observe(0.01)"
+        )
+        for _ in range(3):
+            subprocess.run([sys.executable, "-c", worker], env=env, check=True)
+        scrape = subprocess.run(
+            [sys.executable, "-c", "from app.utils.metrics import metrics_payload; print(metrics_payload()[0].decode())"],
+            env=env, check=True, capture_output=True, text=True,
+        )
+        assert 'beauty_shop_invoice_pdf_render_duration_seconds_count{outcome="ok"} 3.0' in scrape.stdout
+
+
 # ====== ROOT ENDPOINT TEST ======
 
 class TestRootEndpoint:
@@ -529,6 +2106,13 @@ class TestRootEndpoint:
         data = response.json()
         assert "message" in data
         assert "Beauty Shop Backend is Active" in data["message"]
+    
+    def test_health_ready_after_warmup(self):
+        """Test that readiness is reported once the lifespan warm-up ran"""
+        with TestClient(app) as started:
+            response = started.get("/health")
+        assert response.status_code == 200
+        assert response.json() == {"status": "ready"}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+import threading
+
+from app.services.id_service import generate_id, new_order_ids, _ALPHABET
+
+
+def _worker_bits(uid):
+    value = 0
+    for ch in uid:
+        value = value * 32 + _ALPHABET.index(ch)
+    return (value >> 64) & 0xFFFF
+
+
+class TestIdService:
+    """Test the order/invoice ID generator"""
+
+    def test_ids_are_sortable_and_unique(self):
+        """Test that IDs from one worker strictly increase"""
+        ids = [generate_id() for _ in range(10000)]
+        assert all(len(i) == 26 for i in ids)
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+
+    def test_ids_unique_across_threads(self):
+        """Test concurrent generation never repeats an ID"""
+        results = []
+
+        def worker():
+            results.extend(generate_id() for _ in range(2000))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(set(results)) == len(results) == 16000
+
+    def test_ids_unique_across_forked_workers(self):
+        """Test that forked processes get their own worker component"""
+        script = (
+            "import os, sys\n"
+            "from app.services.id_service import generate_id\n"
+            "generate_id()\n"
+            "r, w = os.pipe()\n"
+            "if os.fork() == 0:\n"
+            "    os.write(w, generate_id().encode()); os._exit(0)\n"
+            "os.wait(); print(generate_id(), os.read(r, 26).decode())\n"
+        )
+        env = dict(os.environ)
+        env.pop("WORKER_ID", None)
+        out = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+        parent, child = out.stdout.split()
+        assert _worker_bits(parent) != _worker_bits(child)
+
+    def test_order_ids_share_suffix(self):
+        """Test that the order and invoice numbers come from one ID"""
+        public_id, invoice_number = new_order_ids()
+        assert public_id.startswith("ORD-")
+        assert invoice_number.startswith("INV-")
+        assert public_id[4:] == invoice_number[4:]
@@ -0,0 +1,32 @@
+"""
+Background job worker (see app/services/job_queue.py).
+Run it next to the web server, e.g. as a Render background worker:
+
+    python worker.py                  # JOB_WORKER_CONCURRENCY threads (default 4)
+    python worker.py --concurrency 8
+    python worker.py --once           # run the jobs due now, then exit
+    python worker.py --retry-dead [task]
+
+Any number of workers can run against the same database.
+"""
+import argparse
+import logging
+from app.database import SessionLocal
+from app.services import tasks  # noqa: F401 - registers the tasks
+from app.services.job_queue import JOB_WORKER_CONCURRENCY, Worker, retry_dead_jobs, run_pending
+
+logging.basicConfig(level=logging.INFO)
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY)
+parser.add_argument("--once", action="store_true")
+parser.add_argument("--retry-dead", nargs="?", const="", metavar="TASK")
+args = parser.parse_args()
+
+if args.retry_dead is not None:
+    with SessionLocal() as db:
+        print(f"Requeued {retry_dead_jobs(db, args.retry_dead or None)} dead jobs")
+elif args.once:
+    print(f"Ran {run_pending()} jobs")
+else:
+    Worker(concurrency=args.concurrency).run()